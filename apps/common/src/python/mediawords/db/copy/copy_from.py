@@ -1,4 +1,7 @@
-import tempfile
+import queue
+import struct
+import threading
+from typing import List, Union
 
 import psycopg2
 from psycopg2.extras import DictCursor
@@ -14,21 +17,104 @@ class McCopyFromException(McDatabaseHandlerException):
     pass
 
 
-# FIXME writes everything to a temporary file first, does the actual copying in end()
+class _CopyFromStream(object):
+    """File-like object that copy_expert() reads the chunks from while they're still being produced."""
+
+    # End of stream marker
+    __EOF = None
+
+    # Aborted stream marker
+    __ABORT = object()
+
+    __slots__ = [
+        '__chunks',
+        '__leftover',
+        '__empty',
+    ]
+
+    def __init__(self, max_queued_chunks: int, empty: Union[str, bytes]):
+        self.__chunks = queue.Queue(maxsize=max_queued_chunks)
+        self.__leftover = empty
+        self.__empty = empty
+
+    def put_chunk(self, chunk: Union[str, bytes], timeout: float) -> None:
+        """Add chunk to the stream; raises queue.Full on timeout."""
+        self.__chunks.put(chunk, timeout=timeout)
+
+    def close_stream(self, timeout: float) -> None:
+        """Mark the end of stream; raises queue.Full on timeout."""
+        self.__chunks.put(self.__EOF, timeout=timeout)
+
+    def abort_stream(self, timeout: float) -> None:
+        """Make the reader fail instead of reading the rest of the stream; raises queue.Full on timeout."""
+        self.__chunks.put(self.__ABORT, timeout=timeout)
+
+    def read(self, size: int = -1) -> Union[str, bytes]:
+        """Return up to "size" characters / bytes, block until there's something to return."""
+
+        if not self.__leftover:
+            chunk = self.__chunks.get()
+            if chunk is self.__EOF:
+                return self.__empty
+            if chunk is self.__ABORT:
+                # Makes copy_expert() cancel the COPY
+                raise McCopyFromException("COPY FROM got aborted.")
+            self.__leftover = chunk
+
+        if size is None or size < 0:
+            size = len(self.__leftover)
+
+        data = self.__leftover[:size]
+        self.__leftover = self.__leftover[size:]
+
+        return data
+
+    def readline(self, size: int = -1) -> Union[str, bytes]:
+        # Not used by copy_expert() but part of the file-like interface
+        return self.read(size)
+
+
 class CopyFrom(object):
-    """COPY FROM helper."""
+    """COPY FROM helper.
+
+    Lines get buffered in memory into chunks which are streamed to PostgreSQL by a background thread while the caller
+    is still writing; end() waits for the COPY to finish, and abort() cancels it without copying anything. The database
+    handler must not be used for anything else between creating the helper and calling end() or abort().
+
+    When used as a context manager, COPY gets ended on exit, or aborted if an exception got raised in the block."""
 
     # Chunk size to COPY FROM
     __COPY_CHUNK_SIZE = 100 * 1024
 
+    # Max. number of chunks waiting to be sent to PostgreSQL before put_line() blocks
+    __MAX_QUEUED_CHUNKS = 16
+
+    # How often to check whether COPY thread is still alive while waiting for space in the chunk queue (in seconds)
+    __QUEUE_POLL_TIMEOUT = 1
+
     # SQL to run
     __sql = None
 
     # Database cursor
     __cursor = None
 
-    # Temporary file buffer
-    __temp_file_buffer = None
+    # Stream that COPY thread reads from
+    __stream = None
+
+    # COPY thread
+    __copy_thread = None
+
+    # Exception raised by COPY thread
+    __copy_exception = None
+
+    # Lines (or binary rows) not yet added to the stream
+    __buffer = None
+
+    # Size of lines in the buffer
+    __buffer_size = 0
+
+    # True if COPY has been ended or aborted
+    __finished = False
 
     def __init__(self, cursor: DictCursor, sql: str):
 
@@ -36,6 +122,18 @@ class CopyFrom(object):
 
         self.__start_copy_from(cursor=cursor, sql=sql)
 
+    def _empty_chunk(self) -> Union[str, bytes]:
+        """Return empty chunk of the type that gets streamed to COPY."""
+        return ''
+
+    def _header(self) -> Union[str, bytes]:
+        """Return data to stream before the first line."""
+        return self._empty_chunk()
+
+    def _trailer(self) -> Union[str, bytes]:
+        """Return data to stream after the last line."""
+        return self._empty_chunk()
+
     def __start_copy_from(self, cursor: DictCursor, sql: str) -> None:
         """Start COPY FROM."""
 
@@ -48,7 +146,61 @@ class CopyFrom(object):
 
         self.__sql = sql
         self.__cursor = cursor
-        self.__temp_file_buffer = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+        self.__copy_exception = None
+        self.__buffer = []
+        self.__buffer_size = 0
+        self.__finished = False
+
+        self.__stream = _CopyFromStream(max_queued_chunks=self.__MAX_QUEUED_CHUNKS, empty=self._empty_chunk())
+
+        self.__copy_thread = threading.Thread(target=self.__run_copy, name='CopyFrom', daemon=True)
+        self.__copy_thread.start()
+
+        header = self._header()
+        if header:
+            self._put_data(header)
+
+    def __run_copy(self) -> None:
+        """Run COPY FROM in a background thread, reading chunks from the stream."""
+        try:
+            self.__cursor.copy_expert(sql=self.__sql, file=self.__stream, size=self.__COPY_CHUNK_SIZE)
+        except psycopg2.Warning as ex:
+            log.warning('Warning while running COPY FROM query: %s' % str(ex))
+        except Exception as ex:
+            self.__copy_exception = ex
+
+    def __raise_if_copy_failed(self) -> None:
+        if self.__copy_exception is not None:
+            raise McCopyFromException('COPY FROM query failed: %s' % str(self.__copy_exception))
+
+    def __enqueue(self, put) -> None:
+        """Run put(timeout=...) until it succeeds or COPY thread dies."""
+        while True:
+            self.__raise_if_copy_failed()
+            if not self.__copy_thread.is_alive():
+                raise McCopyFromException('COPY FROM query has stopped reading data.')
+            try:
+                put(timeout=self.__QUEUE_POLL_TIMEOUT)
+                return
+            except queue.Full:
+                pass
+
+    def __flush_buffer(self) -> None:
+        if not self.__buffer:
+            return
+
+        chunk = self._empty_chunk().join(self.__buffer)
+        self.__buffer = []
+        self.__buffer_size = 0
+
+        self.__enqueue(lambda timeout: self.__stream.put_chunk(chunk, timeout=timeout))
+
+    def _put_data(self, data: Union[str, bytes]) -> None:
+        """Add data to the buffer, stream the buffer to COPY if it's big enough."""
+        self.__buffer.append(data)
+        self.__buffer_size += len(data)
+        if self.__buffer_size >= self.__COPY_CHUNK_SIZE:
+            self.__flush_buffer()
 
     def put_line(self, line: str) -> None:
         """Write line."""
@@ -57,17 +209,97 @@ class CopyFrom(object):
 
         line = line.rstrip('\n')
         try:
-            self.__temp_file_buffer.write("%s\n" % line)
+            self._put_data("%s\n" % line)
+        except McCopyFromException:
+            raise
         except Exception as ex:
             raise McCopyFromException("Error write writing line '%s': %s" % (line, str(ex)))
 
+    def __enter__(self) -> 'CopyFrom':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:
+            if not self.__finished:
+                self.end()
+        else:
+            self.abort()
+
     def end(self) -> None:
-        """Stop writing (and run the actual COPY FROM)."""
+        """Stop writing (and wait for COPY FROM to finish)."""
+
+        if self.__finished:
+            raise McCopyFromException("COPY FROM has been ended or aborted already.")
+        self.__finished = True
+
+        trailer = self._trailer()
+        if trailer:
+            self._put_data(trailer)
+
+        self.__flush_buffer()
+        self.__enqueue(lambda timeout: self.__stream.close_stream(timeout=timeout))
+
+        self.__copy_thread.join()
+
+        self.__raise_if_copy_failed()
+
+    def abort(self) -> None:
+        """Cancel COPY FROM so that nothing gets copied (and wait for the COPY thread to exit)."""
+
+        self.__finished = True
+
+        self.__buffer = []
+        self.__buffer_size = 0
+
         try:
-            self.__temp_file_buffer.seek(0)
-            self.__cursor.copy_expert(sql=self.__sql, file=self.__temp_file_buffer, size=self.__COPY_CHUNK_SIZE)
-            self.__temp_file_buffer.close()
-        except psycopg2.Warning as ex:
-            log.warning('Warning while running COPY FROM query: %s' % str(ex))
+            self.__enqueue(lambda timeout: self.__stream.abort_stream(timeout=timeout))
+        except McCopyFromException as ex:
+            # COPY has either failed or finished already
+            log.debug("COPY FROM thread has stopped before abort: %s" % str(ex))
+
+        self.__copy_thread.join()
+
+
+class CopyFromBinaryBigints(CopyFrom):
+    """COPY FROM helper for streaming rows of BIGINT (or NULL) values in PostgreSQL's binary COPY format.
+
+    SQL has to be "COPY ... FROM STDIN WITH (FORMAT binary)", and the number of values in each row has to match the
+    number of columns being copied to."""
+
+    # Binary COPY signature, flags field and header extension length
+    __HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+
+    # File trailer
+    __TRAILER = struct.pack('!h', -1)
+
+    # NULL field
+    __NULL = struct.pack('!i', -1)
+
+    def _empty_chunk(self) -> bytes:
+        return b''
+
+    def _header(self) -> bytes:
+        return self.__HEADER
+
+    def _trailer(self) -> bytes:
+        return self.__TRAILER
+
+    def put_line(self, line: str) -> None:
+        raise McCopyFromException("Use put_row() to write to binary COPY FROM.")
+
+    def put_row(self, values: List[Union[int, None]]) -> None:
+        """Write a row of BIGINT (or NULL) values."""
+
+        values = decode_object_from_bytes_if_needed(values)
+
+        row = [struct.pack('!h', len(values))]
+        try:
+            for value in values:
+                if value is None:
+                    row.append(self.__NULL)
+                else:
+                    row.append(struct.pack('!iq', 8, int(value)))
         except Exception as ex:
-            raise McCopyFromException('COPY FROM query failed: %s' % str(ex))
+            raise McCopyFromException("Error while encoding row '%s': %s" % (str(values), str(ex)))
+
+        self._put_data(b''.join(row))
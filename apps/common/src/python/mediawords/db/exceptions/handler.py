@@ -18,6 +18,11 @@ class McQueryException(McDatabaseHandlerException):
     pass
 
 
+class McQueryStreamException(McDatabaseHandlerException):
+    """query_stream() exception."""
+    pass
+
+
 class McPrimaryKeyColumnException(McDatabaseHandlerException):
     """primary_key_column() exception."""
     pass
@@ -58,6 +63,16 @@ class McFindOrCreateException(McDatabaseHandlerException):
     pass
 
 
+class McInsertManyException(McDatabaseHandlerException):
+    """insert_many() exception."""
+    pass
+
+
+class McFindOrCreateManyException(McDatabaseHandlerException):
+    """find_or_create_many() exception."""
+    pass
+
+
 class McQuoteException(McDatabaseHandlerException):
     """quote() exception."""
     pass
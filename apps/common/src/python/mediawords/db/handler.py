@@ -1,19 +1,20 @@
 import os
 import re
 import socket
-from typing import Union, List, Dict, Any
+from typing import Union, List, Dict, Any, Iterator
 
 import psycopg2
 import psycopg2.extras
 from psycopg2.extensions import adapt as psycopg2_adapt
 
-from mediawords.db.copy.copy_from import CopyFrom
+from mediawords.db.copy.copy_from import CopyFrom, CopyFromBinaryBigints
 from mediawords.db.copy.copy_to import CopyTo
 from mediawords.db.exceptions.handler import (
-    McConnectException, McDatabaseHandlerException, McQueryException,
+    McConnectException, McDatabaseHandlerException, McQueryException, McQueryStreamException,
     McPrimaryKeyColumnException, McFindByIDException, McRequireByIDException, McUpdateByIDException,
     McDeleteByIDException, McCreateException, McFindOrCreateException, McBeginException,
-    McQuoteException, McUniqueConstraintException)
+    McQuoteException, McUniqueConstraintException, McInsertManyException, McFindOrCreateManyException)
+from mediawords.db.prepared_statements import PreparedStatements
 from mediawords.db.result.result import DatabaseResult
 
 from mediawords.util.log import create_logger
@@ -37,6 +38,9 @@ class DatabaseHandler(object):
     # Min. "deadlock_timeout" to not cause problems under load (in seconds)
     __MIN_DEADLOCK_TIMEOUT = 5
 
+    # Max. number of rows to INSERT / SELECT with a single multi-row query in insert_many() / find_or_create_many()
+    __MANY_ROWS_CHUNK_SIZE = 1000
+
     # "Double percentage sign" marker (see handler's quote() for explanation)
     __DOUBLE_PERCENTAGE_SIGN_MARKER = "<DOUBLE PERCENTAGE SIGN: " + random_string(length=16) + ">"
 
@@ -56,6 +60,9 @@ class DatabaseHandler(object):
         # Debugging variable to test whether we're in a transaction
         '__in_manual_transaction',
 
+        # Server-side prepared statement cache (None if statements are not to be prepared)
+        '__prepared_statements',
+
         # Pyscopg2 instance and cursor
         '__conn',
         '__db',
@@ -80,6 +87,7 @@ class DatabaseHandler(object):
         self.__primary_key_columns = {}
         self.__print_warnings = True
         self.__in_manual_transaction = False
+        self.__prepared_statements = None
         self.__conn = None
         self.__db = None
 
@@ -198,7 +206,82 @@ class DatabaseHandler(object):
         return DatabaseResult(cursor=self.__db,
                               query_args=query_params,
                               double_percentage_sign_marker=DatabaseHandler.__DOUBLE_PERCENTAGE_SIGN_MARKER,
-                              print_warnings=self.__print_warnings)
+                              print_warnings=self.__print_warnings,
+                              prepared_statements=self.__prepared_statements)
+
+    def query_stream(self, *query_params, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Run the query using a server-side cursor, yield rows one by one as dicts keyed by column name.
+
+        Rows get fetched from the server "batch_size" at a time so that huge result sets can be iterated over in
+        constant memory instead of getting fetched all at once by hashes(). Accepts the same query parameters as
+        query():
+
+            for story in db.query_stream('SELECT * FROM stories WHERE media_id = %(media_id)s', {'media_id': 1}):
+                ...
+
+        Server-side cursors only live within a transaction, so if there's no manually started transaction, one will
+        get started before the first row is fetched and committed after the last one (or after the caller stops
+        iterating early).
+        """
+
+        # noinspection PyTypeChecker
+        batch_size = int(decode_object_from_bytes_if_needed(batch_size))
+        if batch_size < 1:
+            raise McQueryStreamException("Batch size must be positive.")
+
+        # MC_REWRITE_TO_PYTHON: remove after porting queries to named parameter style
+        query_params = list(convert_dbd_pg_arguments_to_psycopg2_format(*query_params))
+
+        if len(query_params) == 0:
+            raise McQueryStreamException("Query is unset.")
+        if len(query_params) > 2:
+            raise McQueryStreamException("psycopg2's execute() accepts at most 2 parameters.")
+
+        cursor_name = '_stream_%s' % random_string(length=16).lower()
+
+        query_params[0] = "DECLARE %(cursor_name)s NO SCROLL CURSOR FOR %(query)s" % {
+            'cursor_name': cursor_name,
+            'query': query_params[0],
+        }
+
+        started_transaction = False
+        if not self.in_transaction():
+            self.begin()
+            started_transaction = True
+
+        try:
+
+            self.query(*query_params)
+
+            while True:
+                rows = self.query("FETCH FORWARD %(batch_size)d FROM %(cursor_name)s" % {
+                    'batch_size': batch_size,
+                    'cursor_name': cursor_name,
+                }).hashes()
+
+                for row in rows:
+                    yield row
+
+                if len(rows) < batch_size:
+                    break
+
+            self.query("CLOSE %s" % cursor_name)
+
+        except GeneratorExit:
+            # Caller stopped iterating early
+            self.query("CLOSE %s" % cursor_name)
+            if started_transaction:
+                self.commit()
+            raise
+
+        except Exception:
+            if started_transaction:
+                self.rollback()
+            raise
+
+        else:
+            if started_transaction:
+                self.commit()
 
     def primary_key_column(self, object_name: str) -> str:
         """Get INT / BIGINT primary key column name for a table or a view.
@@ -549,6 +632,164 @@ class DatabaseHandler(object):
             except McUniqueConstraintException:
                 return self.select(table=table, what_to_select='*', condition_hash=insert_hash).hash()
 
+    @staticmethod
+    def __prepare_many_rows(rows: List[dict], exception_class: type) -> List[dict]:
+        """Copy rows to be able to safely modify them, make sure that they all have the same columns."""
+
+        prepared_rows = []
+        columns = None
+
+        for row in rows:
+            row = dict(row)  # To be able to safely modify it
+
+            # MC_REWRITE_TO_PYTHON: remove after getting rid of Catalyst
+            if "submit" in row:
+                del row["submit"]
+
+            if len(row) == 0:
+                raise exception_class("Hash to INSERT is empty")
+
+            if columns is None:
+                columns = sorted(row.keys())
+            elif sorted(row.keys()) != columns:
+                raise exception_class("All rows must have the same columns; expected %s, got %s" % (
+                    str(columns), str(sorted(row.keys())),
+                ))
+
+            for key, value in row.items():
+                # Cast Inline::Python's booleans to Python's booleans
+                # MC_REWRITE_TO_PYTHON: remove after porting
+                if type(value).__name__ == '_perl_obj':
+                    row[key] = bool(value)
+
+            prepared_rows.append(row)
+
+        return prepared_rows
+
+    @staticmethod
+    def __many_rows_values(rows: List[dict], columns: List[str]) -> tuple:
+        """Return "VALUES" list of psycopg2 placeholders and a dictionary of parameters for a chunk of rows."""
+
+        values = []
+        params = {}
+        for row_number, row in enumerate(rows):
+            row_placeholders = []
+            for column_number, column in enumerate(columns):
+                param_name = 'r%d_c%d' % (row_number, column_number)
+                row_placeholders.append("%(" + param_name + ")s")  # "%(key)s" to be resolved by psycopg2, not Python
+                params[param_name] = row[column]
+            values.append("(%s)" % ", ".join(row_placeholders))
+
+        return ", ".join(values), params
+
+    def insert_many(self, table: str, rows: List[dict], on_conflict: str = None) -> List[Dict[str, Any]]:
+        """Insert multiple rows into the table with multi-row INSERTs and return the created rows in input order.
+
+        All rows must have the same columns. If "on_conflict" is set, it gets appended to every INSERT as the
+        "ON CONFLICT" clause, e.g. "(name) DO NOTHING"; rows that didn't get inserted due to such a clause are then
+        skipped in the returned list."""
+
+        table = decode_object_from_bytes_if_needed(table)
+        rows = decode_object_from_bytes_if_needed(rows)
+        on_conflict = decode_object_from_bytes_if_needed(on_conflict)
+
+        if rows is None:
+            raise McInsertManyException("Rows to INSERT are None.")
+
+        rows = self.__prepare_many_rows(rows=rows, exception_class=McInsertManyException)
+        if len(rows) == 0:
+            return []
+
+        columns = sorted(rows[0].keys())
+
+        inserted_rows = []
+
+        for chunk_start in range(0, len(rows), DatabaseHandler.__MANY_ROWS_CHUNK_SIZE):
+            chunk = rows[chunk_start:chunk_start + DatabaseHandler.__MANY_ROWS_CHUNK_SIZE]
+
+            values, params = self.__many_rows_values(rows=chunk, columns=columns)
+
+            sql = "INSERT INTO %s " % table
+            sql += "(%s) " % ", ".join(columns)
+            sql += "VALUES %s " % values
+            if on_conflict:
+                sql += "ON CONFLICT %s " % on_conflict
+            sql += "RETURNING *"
+
+            try:
+                inserted_rows.extend(self.query(sql, params).hashes())
+            except Exception as ex:
+                if 'duplicate key value violates unique constraint' in str(ex):
+                    raise McUniqueConstraintException("Unable to INSERT %d rows into '%s': %s" % (
+                        len(chunk), table, str(ex),
+                    ))
+                else:
+                    raise McInsertManyException("Unable to INSERT %d rows into '%s': %s" % (
+                        len(chunk), table, str(ex),
+                    ))
+
+        return inserted_rows
+
+    def find_or_create_many(self, table: str, insert_hashes: List[dict]) -> List[Dict[str, Any]]:
+        """find_or_create() for multiple rows; return found or created rows in input order.
+
+        All hashes must have the same columns. Existing rows get looked up with a single SELECT per chunk, missing
+        ones get inserted with insert_many(). Rows that can't be matched back to their input hash (e.g. because of a
+        concurrently created row or a value that gets returned from the database in a different form) are resolved
+        with find_or_create() one by one."""
+
+        table = decode_object_from_bytes_if_needed(table)
+        insert_hashes = decode_object_from_bytes_if_needed(insert_hashes)
+
+        if insert_hashes is None:
+            raise McFindOrCreateManyException("Hashes to INSERT or SELECT are None.")
+
+        insert_hashes = self.__prepare_many_rows(rows=insert_hashes, exception_class=McFindOrCreateManyException)
+        if len(insert_hashes) == 0:
+            return []
+
+        columns = sorted(insert_hashes[0].keys())
+
+        def _row_key(row_: dict) -> tuple:
+            return tuple(str(row_[column_]) for column_ in columns)
+
+        found_rows = {}
+
+        unique_hashes = list({_row_key(h): h for h in insert_hashes}.values())
+
+        for chunk_start in range(0, len(unique_hashes), DatabaseHandler.__MANY_ROWS_CHUNK_SIZE):
+            chunk = unique_hashes[chunk_start:chunk_start + DatabaseHandler.__MANY_ROWS_CHUNK_SIZE]
+
+            values, params = self.__many_rows_values(rows=chunk, columns=columns)
+
+            # Row constructor list instead of "VALUES" for the literals to get resolved to the column types
+            sql = "SELECT * FROM %s " % table
+            sql += "WHERE (%s) " % ", ".join(columns)
+            sql += "IN (%s)" % values
+
+            for row in self.query(sql, params).hashes():
+                found_rows.setdefault(_row_key(row), row)
+
+        missing_hashes = [h for h in unique_hashes if _row_key(h) not in found_rows]
+        if missing_hashes:
+            try:
+                created_rows = self.insert_many(table=table, rows=missing_hashes)
+            except McUniqueConstraintException:
+                # Some other process has created some of the rows because we don't have a lock
+                created_rows = []
+
+            for row in created_rows:
+                found_rows.setdefault(_row_key(row), row)
+
+        result = []
+        for insert_hash in insert_hashes:
+            row_key = _row_key(insert_hash)
+            if row_key not in found_rows:
+                found_rows[row_key] = self.find_or_create(table=table, insert_hash=insert_hash)
+            result.append(found_rows[row_key])
+
+        return result
+
     # noinspection PyMethodMayBeStatic
     def show_error_statement(self) -> bool:
         """Return whether failed SQL statement will be included into thrown exception."""
@@ -571,6 +812,23 @@ class DatabaseHandler(object):
         """Set whether PostgreSQL warnings will be printed."""
         self.__print_warnings = print_warn
 
+    def prepare_statements(self) -> bool:
+        """Return whether frequently run queries will be prepared server-side."""
+        return self.__prepared_statements is not None
+
+    def set_prepare_statements(self, prepare_statements: bool) -> None:
+        """Set whether frequently run queries will be prepared server-side.
+
+        Prepared statements are kept for the duration of the session, so this won't work through pgbouncer's
+        transaction pooling."""
+        if prepare_statements:
+            if self.__prepared_statements is None:
+                self.__prepared_statements = PreparedStatements()
+        else:
+            if self.__prepared_statements is not None:
+                self.query("DEALLOCATE ALL")
+            self.__prepared_statements = None
+
     def in_transaction(self) -> bool:
         """Return True if we're within a manually started transaction."""
         return self.__in_manual_transaction
@@ -705,6 +963,14 @@ class DatabaseHandler(object):
 
         return CopyFrom(cursor=self.__db, sql=sql)
 
+    def copy_from_binary_bigints(self, sql: str) -> CopyFromBinaryBigints:
+        """Return binary COPY FROM helper object for BIGINT columns.
+
+        SQL has to be "COPY ... FROM STDIN WITH (FORMAT binary)"."""
+        sql = decode_object_from_bytes_if_needed(sql)
+
+        return CopyFromBinaryBigints(cursor=self.__db, sql=sql)
+
     def copy_to(self, sql: str) -> CopyTo:
         """Return COPY TO helper object."""
         sql = decode_object_from_bytes_if_needed(sql)
@@ -730,10 +996,9 @@ class DatabaseHandler(object):
         sql += "id BIGINT)"
         self.query(sql)
 
-        copy = self.copy_from("COPY %s (id) FROM STDIN" % table_name)
-        for single_id in ids:
-            copy.put_line("%d\n" % int(single_id))
-        copy.end()
+        with self.copy_from_binary_bigints("COPY %s (id) FROM STDIN WITH (FORMAT binary)" % table_name) as copy:
+            for single_id in ids:
+                copy.put_row([single_id])
 
         self.query("ANALYZE %s" % table_name)
 
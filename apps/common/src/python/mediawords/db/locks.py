@@ -51,7 +51,7 @@ def get_session_lock(db: mediawords.db.DatabaseHandler, lock_type: str, lock_id:
         wait = decode_object_from_bytes_if_needed(wait)
     wait = bool(wait)
 
-    log.debug("trying for lock: %s, %d" % (lock_type, lock_id))
+    log.debug("trying for lock: %s, %d", lock_type, lock_id)
 
     if lock_type not in LOCK_TYPES:
         raise McDBLocksException("lock type not in LOCK_TYPES: %s" % lock_type)
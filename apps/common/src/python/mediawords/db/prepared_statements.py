@@ -0,0 +1,183 @@
+import re
+from collections import OrderedDict
+from typing import Union, Optional
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import DictCursor
+
+from mediawords.util.log import create_logger
+from mediawords.util.text import random_string
+
+log = create_logger(__name__)
+
+
+class PreparedStatements(object):
+    """Server-side prepared statement cache of a single database connection.
+
+    Queries that get run at least PREPARE_AFTER_CALLS times get PREPAREd and are then run with EXECUTE. Only queries
+    that are a single SELECT / INSERT / UPDATE / DELETE / WITH statement and don't have tuple parameters (which psycopg2
+    expands into lists of values) get prepared.
+
+    Prepared statements live for the duration of a session, so this doesn't work with pgbouncer's transaction pooling
+    mode, and is opt-in because of that."""
+
+    # How many times the query has to be run before it gets prepared
+    PREPARE_AFTER_CALLS = 2
+
+    # Max. number of prepared statements per connection; least recently used ones get DEALLOCATEd
+    MAX_PREPARED_STATEMENTS = 256
+
+    # Max. number of queries to keep call counts for
+    __MAX_CALL_COUNTS = 4096
+
+    # Statements that can be prepared
+    __PREPARABLE_REGEX = re.compile(r'^\s*(?:SELECT|INSERT|UPDATE|DELETE|WITH)\b', flags=re.I)
+
+    # psycopg2's placeholders and escaped percentage signs
+    __PLACEHOLDER_REGEX = re.compile(r'%%|%s|%\((\w+)\)s')
+
+    __slots__ = [
+        # Query -> statement name
+        '__statements',
+
+        # Query -> number of times it was run without being prepared
+        '__call_counts',
+
+        # Queries that couldn't be prepared
+        '__unpreparable',
+    ]
+
+    def __init__(self):
+        self.__statements = OrderedDict()
+        self.__call_counts = OrderedDict()
+        self.__unpreparable = set()
+
+    @staticmethod
+    def __has_tuple_params(params: Union[tuple, dict]) -> bool:
+        values = params.values() if isinstance(params, dict) else params
+        return any(isinstance(value, tuple) for value in values)
+
+    @classmethod
+    def __convert_placeholders(cls, query: str, params: Union[tuple, dict]) -> Optional[tuple]:
+        """Convert psycopg2's placeholders to "$1", "$2", ...
+
+        Return PREPARE's query and EXECUTE's parameter placeholders, or None if the query can't be converted."""
+
+        param_placeholders = []
+        param_indexes = {}
+
+        def __replace(match) -> str:
+            placeholder = match.group(0)
+
+            if placeholder == '%%':
+                return '%'
+
+            if placeholder == '%s':
+                param_placeholders.append('%s')
+                return '$%d' % len(param_placeholders)
+
+            name = match.group(1)
+            if name not in param_indexes:
+                param_placeholders.append(placeholder)
+                param_indexes[name] = len(param_placeholders)
+            return '$%d' % param_indexes[name]
+
+        prepared_query = cls.__PLACEHOLDER_REGEX.sub(__replace, query)
+
+        if isinstance(params, dict) and '%s' in param_placeholders:
+            return None
+        if isinstance(params, tuple) and param_indexes:
+            return None
+        if isinstance(params, tuple) and len(params) != len(param_placeholders):
+            return None
+
+        return prepared_query, param_placeholders
+
+    def __preparable(self, query: str, params: Union[tuple, dict]) -> bool:
+        if query in self.__unpreparable:
+            return False
+        if not self.__PREPARABLE_REGEX.match(query):
+            return False
+        if ';' in query:
+            # Might be multiple statements
+            return False
+        if self.__has_tuple_params(params):
+            return False
+        return True
+
+    def __should_prepare(self, query: str) -> bool:
+        """Count the call, return True if the query has been run enough times to be prepared."""
+        calls = self.__call_counts.pop(query, 0) + 1
+        if calls >= self.PREPARE_AFTER_CALLS:
+            return True
+
+        self.__call_counts[query] = calls
+        while len(self.__call_counts) > self.__MAX_CALL_COUNTS:
+            self.__call_counts.popitem(last=False)
+
+        return False
+
+    def __prepare(self, cursor: DictCursor, query: str, params: Union[tuple, dict]) -> Optional[tuple]:
+        """PREPARE the query, return statement name and EXECUTE's parameter placeholders, or None on failure."""
+
+        # Failed PREPARE would abort the current transaction, so prepare only outside of transactions
+        if cursor.connection.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return None
+
+        converted = self.__convert_placeholders(query=query, params=params)
+        if converted is None:
+            self.__unpreparable.add(query)
+            return None
+
+        prepared_query, param_placeholders = converted
+
+        statement_name = 'mc_%s' % random_string(length=16).lower()
+
+        try:
+            # No parameters so that psycopg2 doesn't try to interpolate
+            cursor.execute("PREPARE %s AS %s" % (statement_name, prepared_query))
+        except psycopg2.Error as ex:
+            log.debug("Unable to prepare query '%s': %s", query, ex)
+            self.__unpreparable.add(query)
+            return None
+
+        self.__statements[query] = (statement_name, param_placeholders)
+
+        while len(self.__statements) > self.MAX_PREPARED_STATEMENTS:
+            (_, (old_statement_name, _)) = self.__statements.popitem(last=False)
+            cursor.execute("DEALLOCATE %s" % old_statement_name)
+
+        return statement_name, param_placeholders
+
+    def execute(self, cursor: DictCursor, query: str, params: Union[tuple, dict]) -> bool:
+        """Run the query with EXECUTE if it's (or just got) prepared.
+
+        Return True if the query was run, False if it has to be run with a plain cursor.execute()."""
+
+        statement = self.__statements.get(query, None)
+
+        if statement is not None:
+            self.__statements.move_to_end(query)
+
+            if self.__has_tuple_params(params):
+                return False
+
+        else:
+            if not self.__preparable(query=query, params=params):
+                return False
+            if not self.__should_prepare(query=query):
+                return False
+
+            statement = self.__prepare(cursor=cursor, query=query, params=params)
+            if statement is None:
+                return False
+
+        statement_name, param_placeholders = statement
+
+        if param_placeholders:
+            cursor.execute("EXECUTE %s (%s)" % (statement_name, ', '.join(param_placeholders)), params)
+        else:
+            cursor.execute("EXECUTE %s" % statement_name)
+
+        return True
@@ -4,17 +4,49 @@ import pprint
 import re
 import textwrap
 import time
-from typing import Dict, List, Any
+from functools import lru_cache
+from typing import Dict, List, Any, Optional
 
 import psycopg2
 from psycopg2.extras import DictCursor
 
 from mediawords.db.exceptions.result import McDatabaseResultException, McDatabaseResultTextException
+from mediawords.db.prepared_statements import PreparedStatements
+from mediawords.db.stats import record_query
 from mediawords.util.log import create_logger
 from mediawords.util.perl import decode_object_from_bytes_if_needed
 
 log = create_logger(__name__)
 
+# Max. number of rewritten queries to cache
+__REWRITTEN_QUERY_CACHE_SIZE = 1024
+
+# Longer queries (usually one-offs with inlined values) don't get cached to not push hot queries out of the cache
+__MAX_CACHED_QUERY_LENGTH = 4 * 1024
+
+# Matches '%' everywhere except for psycopg2 parameter placeholders ('%s' and '%(...)s')
+__PERCENTAGE_SIGN_REGEX = re.compile(r'%(?!(s|\(.*?\)s?))')
+
+
+def __rewrite_query(query: str, double_percentage_sign_marker: str) -> str:
+    # Duplicate '%' everywhere except for psycopg2 parameter placeholders ('%s' and '%(...)s')
+    query = __PERCENTAGE_SIGN_REGEX.sub('%%', query)
+
+    # Replace percentage signs coming from quote()d strings with double percentage signs
+    query = query.replace(double_percentage_sign_marker, '%%')
+
+    return query
+
+
+__cached_rewrite_query = lru_cache(maxsize=__REWRITTEN_QUERY_CACHE_SIZE)(__rewrite_query)
+
+
+def _rewrite_query(query: str, double_percentage_sign_marker: str) -> str:
+    """Rewrite query for psycopg2's execute() (cached as hot queries get rewritten over and over again)."""
+    if len(query) > __MAX_CACHED_QUERY_LENGTH:
+        return __rewrite_query(query, double_percentage_sign_marker)
+    return __cached_rewrite_query(query, double_percentage_sign_marker)
+
 
 class DatabaseResult(object):
     """Wrapper around SQL query result."""
@@ -25,20 +57,23 @@ class DatabaseResult(object):
                  cursor: DictCursor,
                  query_args: tuple,
                  double_percentage_sign_marker: str,
-                 print_warnings: bool = True):
+                 print_warnings: bool = True,
+                 prepared_statements: Optional[PreparedStatements] = None):
 
         # MC_REWRITE_TO_PYTHON: 'query_args' should be decoded from 'bytes' at this point
 
         self.__execute(cursor=cursor,
                        query_args=query_args,
                        double_percentage_sign_marker=double_percentage_sign_marker,
-                       print_warnings=print_warnings)
+                       print_warnings=print_warnings,
+                       prepared_statements=prepared_statements)
 
     def __execute(self,
                   cursor: DictCursor,
                   query_args: tuple,
                   double_percentage_sign_marker: str,
-                  print_warnings: bool) -> None:
+                  print_warnings: bool,
+                  prepared_statements: Optional[PreparedStatements]) -> None:
         """Execute statement, set up cursor to results."""
 
         # MC_REWRITE_TO_PYTHON: 'query_args' should be decoded from 'bytes' at this point
@@ -58,35 +93,37 @@ class DatabaseResult(object):
                 # to execute().
                 query_args = (query_args[0], {},)
 
-            query = query_args[0]
-
-            # Duplicate '%' everywhere except for psycopg2 parameter placeholders ('%s' and '%(...)s')
-            query = re.sub(r'%(?!(s|\(.*?\)s?))', '%%', query)
-
-            # Replace percentage signs coming from quote()d strings with double percentage signs
-            query = query.replace(double_percentage_sign_marker, '%%')
+            query = _rewrite_query(query_args[0], double_percentage_sign_marker)
 
             query_args_list = list(query_args)
             query_args_list[0] = query
             query_args = tuple(query_args_list)
 
-            log.debug("Running query: %s" % str(query_args))
+            log.debug("Running query: %s", query_args)
 
             t = time.time()
 
-            cursor.execute(*query_args)
+            executed = False
+            if prepared_statements is not None:
+                executed = prepared_statements.execute(cursor=cursor, query=query_args[0], params=query_args[1])
+            if not executed:
+                cursor.execute(*query_args)
 
             query_time = time.time() - t
+
+            record_query(query=query_args[0], query_time=query_time, rows=cursor.rowcount)
             if query_time >= 1:
                 query_text = textwrap.shorten(str(query_args[0]), width=80)
                 query_params = textwrap.shorten(str(query_args[1:]), width=80)
-                log.info("Slow query (%d seconds): %s, %s" % (query_time, query_text, query_params))
+                log.info("Slow query (%d seconds): %s, %s", query_time, query_text, query_params, fields={
+                    'query_time': round(query_time, 3),
+                })
 
         except psycopg2.Warning as ex:
             if print_warnings:
                 log.warning('Warning while running query: %s' % str(ex))
             else:
-                log.debug('Warning while running query: %s' % str(ex))
+                log.debug('Warning while running query: %s', ex)
 
         except psycopg2.ProgrammingError as ex:
             message = (query_args[0][0:1024], query_args[1:])
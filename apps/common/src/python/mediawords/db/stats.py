@@ -0,0 +1,173 @@
+"""
+Per-process query statistics, grouped by query fingerprint.
+
+Fingerprint is a query with its literals (numbers, quoted strings, parameter placeholders) replaced with "?" and
+whitespace collapsed, so that queries differing only in values end up in the same bucket.
+"""
+
+import atexit
+import re
+import signal
+import threading
+from functools import lru_cache
+from typing import Dict, List
+
+from mediawords.util.log import create_logger
+
+log = create_logger(__name__)
+
+# Max. number of distinct fingerprints to keep counters for; queries with any other fingerprint get counted as
+# __OTHER_FINGERPRINT
+__MAX_FINGERPRINTS = 10000
+
+# Fingerprint to count the queries that didn't fit in the counters under
+__OTHER_FINGERPRINT = '(other)'
+
+# Quoted string literals
+__QUOTED_LITERAL_REGEX = re.compile(r"'(?:[^']|'')*'")
+
+# psycopg2 parameter placeholders
+__PLACEHOLDER_REGEX = re.compile(r'%(?:s|\(\w+\)s)')
+
+# Numeric literals that aren't part of an identifier
+__NUMBER_REGEX = re.compile(r'(?<![\w$])-?\d+(?:\.\d+)?\b')
+
+# Lists of placeholders, e.g. "IN (?, ?, ?)"
+__LIST_REGEX = re.compile(r'\?(?:\s*,\s*\?)+')
+
+# Whitespace (including newlines)
+__WHITESPACE_REGEX = re.compile(r'\s+')
+
+# Only this many first characters of the query get fingerprinted; longer queries (e.g. with inlined lists of IDs) get
+# fingerprinted by their prefix and don't take up space in the fingerprint cache
+__MAX_FINGERPRINTED_QUERY_LENGTH = 4 * 1024
+
+# Reentrant because the statistics might get logged from a signal handler while the lock is being held
+__stats_lock = threading.RLock()
+
+# Fingerprint -> [calls, total time, rows]
+__stats = {}  # type: Dict[str, List]
+
+# Whether to collect the statistics at all
+__stats_enabled = False
+
+
+def __query_fingerprint(query: str) -> str:
+    fingerprint = __QUOTED_LITERAL_REGEX.sub('?', query)
+    fingerprint = __PLACEHOLDER_REGEX.sub('?', fingerprint)
+    fingerprint = __NUMBER_REGEX.sub('?', fingerprint)
+    fingerprint = __LIST_REGEX.sub('?', fingerprint)
+    fingerprint = __WHITESPACE_REGEX.sub(' ', fingerprint).strip()
+    return fingerprint
+
+
+__cached_query_fingerprint = lru_cache(maxsize=1024)(__query_fingerprint)
+
+
+def query_fingerprint(query: str) -> str:
+    """Return query's fingerprint."""
+    if len(query) > __MAX_FINGERPRINTED_QUERY_LENGTH:
+        return __query_fingerprint(query[:__MAX_FINGERPRINTED_QUERY_LENGTH])
+    return __cached_query_fingerprint(query)
+
+
+def enable_query_stats(enable: bool = True) -> None:
+    """Enable (or disable) collecting query statistics in this process.
+
+    Statistics are not collected by default to not fingerprint every query for nobody to read them;
+    log_query_stats_on_exit() enables them, and log_query_stats_on_signal() lets them get enabled on demand."""
+    global __stats_enabled
+    __stats_enabled = enable
+
+
+def query_stats_enabled() -> bool:
+    """Return True if query statistics are being collected in this process."""
+    return __stats_enabled
+
+
+def record_query(query: str, query_time: float, rows: int) -> None:
+    """Add executed query to the statistics (if enabled)."""
+    if not __stats_enabled:
+        return
+
+    fingerprint = query_fingerprint(query)
+
+    with __stats_lock:
+        counters = __stats.get(fingerprint, None)
+        if counters is None:
+            if len(__stats) >= __MAX_FINGERPRINTS:
+                fingerprint = __OTHER_FINGERPRINT
+            counters = __stats.setdefault(fingerprint, [0, 0.0, 0])
+
+        counters[0] += 1
+        counters[1] += query_time
+        if rows > 0:
+            counters[2] += rows
+
+
+def query_stats() -> List[Dict]:
+    """Return query statistics sorted by total time spent, longest first.
+
+    Every item is a dict with "fingerprint", "calls", "total_time" (in seconds), "mean_time" and "rows" keys."""
+
+    with __stats_lock:
+        stats = [
+            {
+                'fingerprint': fingerprint,
+                'calls': calls,
+                'total_time': total_time,
+                'mean_time': total_time / calls if calls else 0.0,
+                'rows': rows,
+            } for fingerprint, (calls, total_time, rows) in __stats.items()
+        ]
+
+    return sorted(stats, key=lambda x: x['total_time'], reverse=True)
+
+
+def reset_query_stats() -> None:
+    """Reset query statistics."""
+    with __stats_lock:
+        __stats.clear()
+
+
+def log_query_stats(limit: int = 20) -> None:
+    """Log statistics of queries that took the longest in total."""
+    stats = query_stats()
+
+    log.info("Query statistics (top %d out of %d fingerprints):" % (min(limit, len(stats)), len(stats)))
+    for item in stats[:limit]:
+        log.info("%(calls)d calls, %(total_time).3f s total, %(mean_time).4f s mean, %(rows)d rows: %(query)s" % {
+            'calls': item['calls'],
+            'total_time': item['total_time'],
+            'mean_time': item['mean_time'],
+            'rows': item['rows'],
+            'query': item['fingerprint'][:1024],
+        })
+
+
+def log_query_stats_on_exit() -> None:
+    """Log query statistics on process exit."""
+    enable_query_stats()
+    atexit.register(log_query_stats)
+
+
+def log_query_stats_on_signal(signal_number: int = signal.SIGUSR2) -> None:
+    """Collect query statistics on demand, toggled by "signal_number" signal sent to the process.
+
+    First signal starts collecting the statistics, the next one logs the statistics collected since and stops
+    collecting them again.
+
+    Default is SIGUSR2 because Celery uses SIGUSR1 for dumping tracebacks."""
+
+    # noinspection PyUnusedLocal
+    def __signal_handler(signum, frame):
+        if query_stats_enabled():
+            log_query_stats()
+            enable_query_stats(False)
+            reset_query_stats()
+        else:
+            reset_query_stats()
+            enable_query_stats()
+            log.info("Collecting query statistics, send signal %d again to log them." % signum)
+
+    signal.signal(signal_number, __signal_handler)
@@ -13,13 +13,15 @@ The three choices are:
 The default is 'postgresql', and the production system uses Amazon S3.
 """
 import re
-from typing import Optional
+from functools import lru_cache
+from typing import Optional, List
 
 from mediawords.db import DatabaseHandler
 from mediawords.key_value_store import KeyValueStore
 from mediawords.key_value_store.amazon_s3 import AmazonS3Store
 from mediawords.key_value_store.cached_amazon_s3 import CachedAmazonS3Store
 from mediawords.key_value_store.database_inline import DatabaseInlineStore
+from mediawords.key_value_store.memory_cached import MemoryCachedStore
 from mediawords.key_value_store.multiple_stores import MultipleStoresStore
 from mediawords.key_value_store.postgresql import PostgreSQLStore
 from mediawords.util.config.common import CommonConfig, AmazonS3DownloadsConfig, DownloadStorageConfig
@@ -48,50 +50,73 @@ def _default_amazon_s3_downloads_config() -> AmazonS3DownloadsConfig:
     return CommonConfig.amazon_s3_downloads()
 
 
+def _compression_method(download_storage_config: DownloadStorageConfig) -> KeyValueStore.Compression:
+    """Return compression method to store new downloads with."""
+    return KeyValueStore.Compression('mc-kvs-compression-%s' % download_storage_config.compression_method())
+
+
+@lru_cache(maxsize=1)
 def _get_inline_store() -> KeyValueStore:
     """Get lazy initialized database inline store."""
     return DatabaseInlineStore()
 
 
-def _get_amazon_s3_store(
-        amazon_s3_downloads_config: AmazonS3DownloadsConfig,
-        download_storage_config: DownloadStorageConfig,
-) -> KeyValueStore:
-    """Get lazy initialized amazon s3 store, with credentials from configuration."""
-    if not amazon_s3_downloads_config.access_key_id():
-        raise McDBIDownloadsException("Amazon S3 download store is not configured.")
-
+# Stores get cached per process as initializing an Amazon S3 store involves creating S3 client and verifying that the
+# bucket exists
+@lru_cache(maxsize=16)
+def __amazon_s3_store_for_params(access_key_id: str,
+                                 secret_access_key: str,
+                                 bucket_name: str,
+                                 directory_name: str,
+                                 cache_table: Optional[str],
+                                 compression_method: KeyValueStore.Compression,
+                                 memory_cache_size: int) -> KeyValueStore:
+    """Return (cached) Amazon S3 store for the given parameters."""
     store_params = {
-        'access_key_id': amazon_s3_downloads_config.access_key_id(),
-        'secret_access_key': amazon_s3_downloads_config.secret_access_key(),
-        'bucket_name': amazon_s3_downloads_config.bucket_name(),
-        'directory_name': amazon_s3_downloads_config.directory_name(),
+        'access_key_id': access_key_id,
+        'secret_access_key': secret_access_key,
+        'bucket_name': bucket_name,
+        'directory_name': directory_name,
+        'compression_method': compression_method,
     }
 
-    if download_storage_config.cache_s3():
-        store_params['cache_table'] = S3_RAW_DOWNLOADS_CACHE_TABLE_NAME
+    if cache_table:
+        store_params['cache_table'] = cache_table
         amazon_s3_store = CachedAmazonS3Store(**store_params)
     else:
         amazon_s3_store = AmazonS3Store(**store_params)
 
+    if memory_cache_size:
+        amazon_s3_store = MemoryCachedStore(store=amazon_s3_store, max_size=memory_cache_size)
+
     return amazon_s3_store
 
 
-def _get_postgresql_store(
-        amazon_s3_downloads_config: AmazonS3DownloadsConfig,
-        download_storage_config: DownloadStorageConfig,
-) -> KeyValueStore:
-    """Get lazy initialized postgresql store, with credentials from mediawords.yml."""
-    postgresql_store = PostgreSQLStore(table=RAW_DOWNLOADS_POSTGRESQL_KVS_TABLE_NAME)
+# Same PostgreSQL store instance is used both for reading and writing so that writes would invalidate memory cache
+@lru_cache(maxsize=16)
+def __postgresql_store(compression_method: KeyValueStore.Compression, memory_cache_size: int) -> KeyValueStore:
+    """Return (cached) PostgreSQL store."""
+    postgresql_store = PostgreSQLStore(table=RAW_DOWNLOADS_POSTGRESQL_KVS_TABLE_NAME,
+                                       compression_method=compression_method)
 
-    if download_storage_config.fallback_postgresql_to_s3():
+    if memory_cache_size:
+        postgresql_store = MemoryCachedStore(store=postgresql_store, max_size=memory_cache_size)
+
+    return postgresql_store
+
+
+@lru_cache(maxsize=16)
+def __postgresql_store_for_fallback_store(fallback_store: Optional[KeyValueStore],
+                                          compression_method: KeyValueStore.Compression,
+                                          memory_cache_size: int) -> KeyValueStore:
+    """Return (cached) PostgreSQL store which optionally falls back to reading from a different store."""
+    postgresql_store = __postgresql_store(compression_method=compression_method, memory_cache_size=memory_cache_size)
+
+    if fallback_store is not None:
         postgresql_store = MultipleStoresStore(
             stores_for_reading=[
                 postgresql_store,
-                _get_amazon_s3_store(
-                    amazon_s3_downloads_config=amazon_s3_downloads_config,
-                    download_storage_config=download_storage_config,
-                ),
+                fallback_store,
             ],
             stores_for_writing=[
                 postgresql_store,
@@ -100,6 +125,45 @@ def _get_postgresql_store(
     return postgresql_store
 
 
+def _get_amazon_s3_store(
+        amazon_s3_downloads_config: AmazonS3DownloadsConfig,
+        download_storage_config: DownloadStorageConfig,
+) -> KeyValueStore:
+    """Get lazy initialized amazon s3 store, with credentials from configuration."""
+    if not amazon_s3_downloads_config.access_key_id():
+        raise McDBIDownloadsException("Amazon S3 download store is not configured.")
+
+    return __amazon_s3_store_for_params(
+        access_key_id=amazon_s3_downloads_config.access_key_id(),
+        secret_access_key=amazon_s3_downloads_config.secret_access_key(),
+        bucket_name=amazon_s3_downloads_config.bucket_name(),
+        directory_name=amazon_s3_downloads_config.directory_name(),
+        cache_table=S3_RAW_DOWNLOADS_CACHE_TABLE_NAME if download_storage_config.cache_s3() else None,
+        compression_method=_compression_method(download_storage_config),
+        memory_cache_size=download_storage_config.memory_cache_size(),
+    )
+
+
+def _get_postgresql_store(
+        amazon_s3_downloads_config: AmazonS3DownloadsConfig,
+        download_storage_config: DownloadStorageConfig,
+) -> KeyValueStore:
+    """Get lazy initialized postgresql store, with credentials from mediawords.yml."""
+    fallback_store = None
+
+    if download_storage_config.fallback_postgresql_to_s3():
+        fallback_store = _get_amazon_s3_store(
+            amazon_s3_downloads_config=amazon_s3_downloads_config,
+            download_storage_config=download_storage_config,
+        )
+
+    return __postgresql_store_for_fallback_store(
+        fallback_store=fallback_store,
+        compression_method=_compression_method(download_storage_config),
+        memory_cache_size=download_storage_config.memory_cache_size(),
+    )
+
+
 def _get_store_for_writing(
         amazon_s3_downloads_config: AmazonS3DownloadsConfig,
         download_storage_config: DownloadStorageConfig,
@@ -118,7 +182,11 @@ def _get_store_for_writing(
         if location == 'databaseinline':
             raise McDBIDownloadsException("databaseinline location is not valid for storage")
         elif location == 'postgresql':
-            store = PostgreSQLStore(table=RAW_DOWNLOADS_POSTGRESQL_KVS_TABLE_NAME)
+            store = __postgresql_store_for_fallback_store(
+                fallback_store=None,
+                compression_method=_compression_method(download_storage_config),
+                memory_cache_size=download_storage_config.memory_cache_size(),
+            )
         elif location in ('s3', 'amazon', 'amazon_s3'):
             store = _get_amazon_s3_store(
                 amazon_s3_downloads_config=amazon_s3_downloads_config,
@@ -219,6 +287,64 @@ def fetch_content(
     return content
 
 
+def fetch_contents(
+        db: DatabaseHandler,
+        downloads: List[dict],
+        amazon_s3_downloads_config: AmazonS3DownloadsConfig = None,
+        download_storage_config: DownloadStorageConfig = None,
+) -> List[str]:
+    """Fetch the content for multiple downloads, return a list of content in the same order as downloads.
+
+    Downloads get grouped by the store that they are to be read from, and each store then fetches all of its objects
+    in bulk (e.g. with a single query or concurrent Amazon S3 requests)."""
+
+    downloads = decode_object_from_bytes_if_needed(downloads)
+
+    for download in downloads:
+        if 'downloads_id' not in download:
+            raise McDBIDownloadsException("downloads_id not in download")
+
+        if not download_successful(download):
+            raise McDBIDownloadsException(
+                "attempt to fetch content for unsuccessful download: %d" % (download['downloads_id']))
+
+    if not amazon_s3_downloads_config:
+        amazon_s3_downloads_config = _default_amazon_s3_downloads_config()
+    if not download_storage_config:
+        download_storage_config = _default_download_storage_config()
+
+    # Store ID -> (store, downloads to be read from the store)
+    downloads_by_store = {}
+
+    for download in downloads:
+        store = _get_store_for_reading(
+            download=download,
+            amazon_s3_downloads_config=amazon_s3_downloads_config,
+            download_storage_config=download_storage_config,
+        )
+        downloads_by_store.setdefault(id(store), (store, []))[1].append(download)
+
+    contents = {}
+
+    for store, store_downloads in downloads_by_store.values():
+        object_ids = [download['downloads_id'] for download in store_downloads]
+        object_paths = {download['downloads_id']: download.get('path', None) for download in store_downloads}
+
+        # MC_REWRITE_TO_PYTHON: use named parameters after Python rewrite
+        store_contents = store.fetch_contents(db, object_ids, object_paths)
+
+        for downloads_id in object_ids:
+            content_bytes = store_contents[downloads_id]
+            if isinstance(content_bytes, Exception):
+                raise McDBIDownloadsException(
+                    "error while trying to fetch download %d: %s" % (downloads_id, str(content_bytes),)
+                )
+
+            contents[downloads_id] = content_bytes.decode()
+
+    return [contents[download['downloads_id']] for download in downloads]
+
+
 def store_content(
         db: DatabaseHandler,
         download: dict,
@@ -234,6 +360,8 @@ def store_content(
     download = decode_object_from_bytes_if_needed(download)
     content = decode_object_from_bytes_if_needed(content)
 
+    download = download.copy()  # To be able to safely modify it
+
     if not amazon_s3_downloads_config:
         amazon_s3_downloads_config = _default_amazon_s3_downloads_config()
     if not download_storage_config:
@@ -122,6 +122,8 @@ def add_story(db: DatabaseHandler, story: dict, feeds_id: int) -> Optional[dict]
         feeds_id = decode_object_from_bytes_if_needed(feeds_id)
     feeds_id = int(feeds_id)
 
+    story = story.copy()  # To be able to safely modify it
+
     if db.in_transaction():
         raise McAddStoryException("add_story() can't be run from within transaction.")
 
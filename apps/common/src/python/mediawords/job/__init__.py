@@ -1,17 +1,32 @@
 import abc
 import socket
-from typing import Callable, Type, Any
+import time
+from typing import Callable, Type, Any, List, Optional
 
 import celery
 from celery.result import AsyncResult
-from kombu import Exchange, Queue
+from celery.signals import worker_process_init, worker_process_shutdown
+from kombu import Connection, Consumer, Exchange, Queue
+from kombu.message import Message
 
+from mediawords.db.stats import log_query_stats, log_query_stats_on_signal, query_stats_enabled
+from mediawords.job.metrics import PUBLISHED_AT_HEADER, record_job, record_requeue, start_metrics_server
 from mediawords.util.config.common import CommonConfig
 from mediawords.util.log import create_logger
+from mediawords.util.perl import skip_decoding_containers
 
 log = create_logger(__name__)
 
 
+class McJobBrokerException(Exception):
+    """Job broker exception."""
+    pass
+
+
+# Number of jobs after which the worker process gets restarted (to reclaim leaked memory)
+_MAX_JOBS_PER_WORKER = 1000
+
+
 class _WorkerTask(celery.Task):
     """Wrapper for Celery tasks."""
 
@@ -36,9 +51,21 @@ class _WorkerTask(celery.Task):
         """(Celery) Task's name."""
         assert False, "Name is supposed to be constant."
 
+    def __queue_wait(self, start_time: float) -> Optional[float]:
+        """Return time that the job spent in the queue, or None if it's unknown."""
+        published_at = getattr(self.request, PUBLISHED_AT_HEADER, None)
+        if published_at is None:
+            # Some Celery versions nest custom headers
+            published_at = (getattr(self.request, 'headers', None) or {}).get(PUBLISHED_AT_HEADER, None)
+        if published_at is None:
+            return None
+        return start_time - float(published_at)
+
     def run(self, *args, **kwargs) -> Any:
         """(Celery) Run task."""
         return_value = None
+        start_time = time.time()
+        queue_wait = self.__queue_wait(start_time=start_time)
         try:
             log.info("Running job {job_name} with args: {args}, kwargs: {kwargs}...".format(
                 job_name=self.__queue_name,
@@ -54,9 +81,14 @@ class _WorkerTask(celery.Task):
                 kwargs=str(kwargs),
                 exception=str(ex),
             ))
+            record_job(queue_name=self.__queue_name,
+                       duration=time.time() - start_time,
+                       queue_wait=queue_wait,
+                       exception=ex)
             raise ex
 
         else:
+            record_job(queue_name=self.__queue_name, duration=time.time() - start_time, queue_wait=queue_wait)
             log.info("Finished running job {job_name} with args: {args}, kwargs: {kwargs}.".format(
                 job_name=self.__queue_name,
                 args=str(args),
@@ -66,6 +98,263 @@ class _WorkerTask(celery.Task):
         return return_value
 
 
+class BatchJob(object):
+    """Single job of a batch that gets passed to batch worker's handler."""
+
+    __slots__ = [
+        '__job_id',
+        '__args',
+        '__kwargs',
+    ]
+
+    def __init__(self, job_id: str, args: tuple, kwargs: dict):
+        self.__job_id = job_id
+        self.__args = tuple(args or ())
+        self.__kwargs = dict(kwargs or {})
+
+    def job_id(self) -> str:
+        """Job ID."""
+        return self.__job_id
+
+    def args(self) -> tuple:
+        """Job's positional arguments."""
+        return self.__args
+
+    def kwargs(self) -> dict:
+        """Job's keyword arguments."""
+        return self.__kwargs
+
+    def __repr__(self) -> str:
+        return 'BatchJob(job_id={}, args={}, kwargs={})'.format(self.__job_id, self.__args, self.__kwargs)
+
+
+class _BatchWorker(object):
+    """Consumes jobs from a queue in batches and passes every batch to a single handler call.
+
+    Up to "batch_size" jobs get prefetched; batch gets handled either when it's full or when "batch_timeout" seconds
+    have passed since its first job arrived. Every job gets acknowledged individually after its batch is handled, and
+    its result (or failure) gets stored to the result backend just like Celery would do it.
+
+    If "max_jobs" is set, run() returns after handling that many jobs so that the worker process can get restarted
+    (like Celery's "worker_max_tasks_per_child")."""
+
+    # How often to wake up when waiting for the first job of a batch (in seconds)
+    __IDLE_POLL_TIMEOUT = 1
+
+    # How long to wait before reconnecting to the broker after a connection error (in seconds)
+    __RECONNECT_DELAY = 5
+
+    __slots__ = [
+        '__app',
+        '__queue',
+        '__handler',
+        '__batch_size',
+        '__batch_timeout',
+        '__max_jobs',
+
+        # Messages of the batch that is being collected
+        '__messages',
+    ]
+
+    def __init__(self,
+                 app: celery.Celery,
+                 queue: Queue,
+                 handler: Callable,
+                 batch_size: int,
+                 batch_timeout: float,
+                 max_jobs: Optional[int] = None):
+        assert app, "App is unset."
+        assert queue, "Queue is unset."
+        assert handler, "Handler is unset."
+        assert batch_size > 0, "Batch size must be positive."
+        assert batch_timeout >= 0, "Batch timeout must not be negative."
+        assert max_jobs is None or max_jobs > 0, "Max. jobs must be positive."
+
+        self.__app = app
+        self.__queue = queue
+        self.__handler = handler
+        self.__batch_size = batch_size
+        self.__batch_timeout = batch_timeout
+        self.__max_jobs = max_jobs
+        self.__messages = []
+
+    # noinspection PyUnusedLocal
+    def __on_message(self, body: Any, message: Message) -> None:
+        self.__messages.append(message)
+
+    @staticmethod
+    def __job_for_message(message: Message) -> BatchJob:
+        """Parse Celery task message (either protocol version 1 or 2) into a job."""
+
+        body = message.decode()
+        headers = message.headers or {}
+
+        if 'task' in headers:
+            # Protocol version 2: (args, kwargs, embed) in body, task ID in headers
+            args, kwargs = body[0], body[1]
+            job_id = headers.get('id', None)
+        else:
+            # Protocol version 1: everything in body
+            args, kwargs = body.get('args', ()), body.get('kwargs', {})
+            job_id = body.get('id', None)
+
+        return BatchJob(job_id=job_id, args=args, kwargs=kwargs)
+
+    def __collect_batch(self, connection: Connection) -> List[Message]:
+        """Wait for up to "batch_size" messages, return them."""
+
+        self.__messages = []
+        batch_deadline = None
+
+        while len(self.__messages) < self.__batch_size:
+
+            if batch_deadline is None:
+                timeout = self.__IDLE_POLL_TIMEOUT
+            else:
+                timeout = batch_deadline - time.time()
+                if timeout <= 0:
+                    break
+
+            try:
+                connection.drain_events(timeout=timeout)
+            except socket.timeout:
+                pass
+
+            if self.__messages and batch_deadline is None:
+                batch_deadline = time.time() + self.__batch_timeout
+
+        messages = self.__messages
+        self.__messages = []
+
+        return messages
+
+    def __store_result(self, job: BatchJob, result: Any) -> None:
+        if not job.job_id():
+            return
+        try:
+            if isinstance(result, Exception):
+                self.__app.backend.mark_as_failure(job.job_id(), result)
+            else:
+                self.__app.backend.mark_as_done(job.job_id(), result)
+        except Exception as ex:
+            log.error("Unable to store result of job {job_id}: {exception}".format(
+                job_id=job.job_id(),
+                exception=str(ex),
+            ))
+
+    def __handle_batch(self, messages: List[Message]) -> None:
+        """Pass jobs to the handler, store their results and acknowledge them."""
+
+        jobs = []
+        job_messages = []
+        for message in messages:
+            try:
+                jobs.append(self.__job_for_message(message))
+                job_messages.append(message)
+            except Exception as ex:
+                log.error("Unable to parse job message, rejecting: {exception}".format(exception=str(ex)))
+                message.reject(requeue=False)
+
+        if not jobs:
+            return
+
+        queue_name = self.__queue.name
+
+        log.info("Running batch of {count} {job_name} jobs: {jobs}...".format(
+            count=len(jobs),
+            job_name=queue_name,
+            jobs=str(jobs),
+        ))
+
+        start_time = time.time()
+
+        try:
+            results = self.__handler(jobs)
+
+            if results is None or len(results) != len(jobs):
+                raise McJobBrokerException("Handler returned {} results for {} jobs.".format(
+                    'no' if results is None else len(results),
+                    len(jobs),
+                ))
+
+        except Exception as ex:
+            log.error("Failed running batch of {count} {job_name} jobs: {exception}".format(
+                count=len(jobs),
+                job_name=queue_name,
+                exception=str(ex),
+            ))
+            results = [ex] * len(jobs)
+
+        # Individual jobs' durations are unknown so every job gets the batch's average duration
+        average_duration = (time.time() - start_time) / len(jobs)
+
+        for job, message, result in zip(jobs, job_messages, results):
+            published_at = (message.headers or {}).get(PUBLISHED_AT_HEADER, None)
+            record_job(queue_name=queue_name,
+                       duration=average_duration,
+                       queue_wait=start_time - float(published_at) if published_at is not None else None,
+                       exception=result if isinstance(result, Exception) else None)
+
+            if isinstance(result, Exception):
+                log.error("Failed running job {job_name} with args: {args}, kwargs: {kwargs}: {exception}".format(
+                    job_name=queue_name,
+                    args=str(job.args()),
+                    kwargs=str(job.kwargs()),
+                    exception=str(result),
+                ))
+
+            self.__store_result(job=job, result=result)
+
+            # Failed jobs get acknowledged too, as Celery wouldn't retry them either
+            message.ack()
+
+        log.info("Finished running batch of {count} {job_name} jobs.".format(count=len(jobs), job_name=queue_name))
+
+    def consumer(self, connection: Connection) -> Consumer:
+        """Return consumer of the queue's jobs (to be used as a context manager around run_batch() calls)."""
+        return Consumer(connection,
+                        queues=[self.__queue],
+                        callbacks=[self.__on_message],
+                        accept=self.__app.conf.accept_content,
+                        prefetch_count=self.__batch_size)
+
+    def run_batch(self, connection: Connection) -> int:
+        """Collect and handle a single batch of jobs, return the number of jobs handled."""
+
+        messages = self.__collect_batch(connection=connection)
+        if messages:
+            self.__handle_batch(messages=messages)
+
+        return len(messages)
+
+    def run(self) -> None:
+        """Handle batches of jobs forever, or until "max_jobs" jobs have been handled."""
+
+        jobs_handled = 0
+
+        while True:
+            try:
+                with self.__app.connection_for_read() as connection:
+                    connection.ensure_connection()
+
+                    with self.consumer(connection=connection):
+                        while True:
+                            jobs_handled += self.run_batch(connection=connection)
+
+                            if self.__max_jobs is not None and jobs_handled >= self.__max_jobs:
+                                # Prefetched jobs that didn't make it into a batch will get redelivered
+                                log.info("Handled {count} jobs, stopping batch worker.".format(count=jobs_handled))
+                                return
+
+            except Exception as ex:
+                # Unacknowledged jobs of the current batch will get redelivered
+                log.error("Batch worker error, reconnecting in {delay} seconds: {exception}".format(
+                    delay=self.__RECONNECT_DELAY,
+                    exception=str(ex),
+                ))
+                time.sleep(self.__RECONNECT_DELAY)
+
+
 class JobBroker(object):
     """Job broker class."""
 
@@ -75,6 +364,9 @@ class JobBroker(object):
 
         # Queue name
         '__queue_name',
+
+        # kombu.Queue instance
+        '__queue',
     ]
 
     def __init__(self, queue_name: str):
@@ -123,7 +415,7 @@ class JobBroker(object):
         # Fetch only one job at a time
         self.__app.conf.worker_prefetch_multiplier = 1
 
-        self.__app.conf.worker_max_tasks_per_child = 1000
+        self.__app.conf.worker_max_tasks_per_child = _MAX_JOBS_PER_WORKER
 
         queue = Queue(
             name=queue_name,
@@ -135,6 +427,7 @@ class JobBroker(object):
             },
         )
         self.__app.conf.task_queues = [queue]
+        self.__queue = queue
 
         # noinspection PyUnusedLocal
         def __route_task(name, args_, kwargs_, options_, task_=None, **kw_):
@@ -147,7 +440,10 @@ class JobBroker(object):
         self.__app.conf.task_routes = (__route_task,)
 
     def __result_for_task(self, args: tuple, kwargs: dict) -> AsyncResult:
-        return self.__app.send_task(self.__queue_name, args=args, kwargs=kwargs)
+        return self.__app.send_task(self.__queue_name,
+                                    args=args,
+                                    kwargs=kwargs,
+                                    headers={PUBLISHED_AT_HEADER: time.time()})
 
     def run_remotely(self, *args, **kwargs) -> Any:
         """Run job remotely, return the result."""
@@ -169,15 +465,60 @@ class JobBroker(object):
         result = self.__result_for_task(args=args, kwargs=kwargs)
         return result.id
 
+    def requeue(self, *args, **kwargs) -> str:
+        """Add job that couldn't be run right now back to queue (and count it as requeued), return job ID."""
+        record_requeue(queue_name=self.__queue_name)
+        return self.add_to_queue(*args, **kwargs)
+
+    @staticmethod
+    def __prewarm_languages(freeze: bool) -> None:
+        """Load languages configured to be prewarmed (if any)."""
+        language_codes = CommonConfig.prewarm_languages()
+        if language_codes is not None and len(language_codes) == 0:
+            return
+
+        # Imported here to not have every job worker import the language factory
+        from mediawords.languages.factory import LanguageFactory
+
+        LanguageFactory.prewarm(language_codes=language_codes, freeze=freeze)
+
     def start_worker(self, handler: Callable):
         """Start handling jobs for the configured queue using a specified callable handler."""
 
+        # Python workers don't get called from Perl so there are no 'bytes' to look for in the arguments
+        skip_decoding_containers()
+
         task = self.__app.register_task(_WorkerTask(queue_name=self.__queue_name, handler=handler))
 
+        # Collect query statistics of a worker process after SIGUSR2, log them on the next SIGUSR2 or when it exits
+        # noinspection PyUnusedLocal
+        def __log_query_stats_on_signal(**kwargs):
+            log_query_stats_on_signal()
+
+        # noinspection PyUnusedLocal
+        def __log_query_stats(**kwargs):
+            if query_stats_enabled():
+                log_query_stats()
+
+        # Jobs get run (and their metrics collected) by the worker process
+        # noinspection PyUnusedLocal
+        def __start_metrics_server(**kwargs):
+            metrics_port = CommonConfig.job_metrics_port()
+            if metrics_port:
+                start_metrics_server(port=metrics_port)
+
+        worker_process_init.connect(__log_query_stats_on_signal, weak=False)
+        worker_process_init.connect(__start_metrics_server, weak=False)
+        worker_process_shutdown.connect(__log_query_stats, weak=False)
+
         node_name = '{name}@{hostname}'.format(
             name=self.__queue_name,
             hostname=socket.gethostname(),
         )
+
+        # Load language dictionaries before Celery forks off the worker process so that they get shared
+        self.__prewarm_languages(freeze=True)
+
         log.info(f"Starting worker {node_name}...")
         self.__app.worker_main(argv=[
             'worker',
@@ -196,3 +537,53 @@ class JobBroker(object):
             '--without-gossip',
             '--without-mingle',
         ])
+
+    def start_batch_worker(self,
+                           handler: Callable[[List[BatchJob]], List[Any]],
+                           batch_size: int = 100,
+                           batch_timeout: float = 1.0,
+                           max_jobs: Optional[int] = _MAX_JOBS_PER_WORKER):
+        """Start handling jobs for the configured queue in batches using a specified callable handler.
+
+        Handler gets a list of up to "batch_size" BatchJob objects and has to return a list of results in the same
+        order; a result that is an Exception marks the job as failed. If the handler raises, all jobs of the batch get
+        marked as failed. Batch gets passed to the handler either when it's full or "batch_timeout" seconds after its
+        first job arrived.
+
+        Just like start_worker()'s worker, the batch worker returns after handling "max_jobs" jobs (unless it's None)
+        for the process to get restarted by the supervisor to reclaim memory.
+
+        Opt-in alternative to start_worker() for handlers that can amortise per-job overhead (database connections,
+        models, HTTP sessions) over multiple jobs."""
+
+        # Python workers don't get called from Perl so there are no 'bytes' to look for in the arguments
+        skip_decoding_containers()
+
+        batch_worker = _BatchWorker(
+            app=self.__app,
+            queue=self.__queue,
+            handler=handler,
+            batch_size=batch_size,
+            batch_timeout=batch_timeout,
+            max_jobs=max_jobs,
+        )
+
+        # Collect query statistics after SIGUSR2, log them on the next SIGUSR2 or when the worker exits
+        log_query_stats_on_signal()
+
+        metrics_port = CommonConfig.job_metrics_port()
+        if metrics_port:
+            start_metrics_server(port=metrics_port)
+
+        self.__prewarm_languages(freeze=False)
+
+        log.info("Starting batch worker for {queue_name} (batch size: {batch_size})...".format(
+            queue_name=self.__queue_name,
+            batch_size=batch_size,
+        ))
+
+        try:
+            batch_worker.run()
+        finally:
+            if query_stats_enabled():
+                log_query_stats()
@@ -0,0 +1,199 @@
+"""
+Per-process, per-queue job metrics: number of jobs run, failures by exception type, requeues, and histograms of
+handler duration and queue wait time (time since the job was published until it started running).
+
+Metrics get exposed in Prometheus' text format by a lightweight HTTP server (see start_metrics_server()).
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Dict, List, Optional, Tuple  # noqa: F401
+
+from mediawords.util.log import create_logger
+
+log = create_logger(__name__)
+
+# Job message header with the publish timestamp
+PUBLISHED_AT_HEADER = 'mc_published_at'
+
+# Histogram bucket upper bounds (in seconds) for job handler durations
+__DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Histogram bucket upper bounds (in seconds) for job queue wait times
+__QUEUE_WAIT_BUCKETS = (0.1, 1, 10, 60, 300, 600, 1800, 3600, 3 * 3600, 12 * 3600, 24 * 3600)
+
+__metrics_lock = threading.Lock()
+
+# Queue name -> number of jobs run
+__runs = {}  # type: Dict[str, int]
+
+# (Queue name, exception type) -> number of failed jobs
+__failures = {}  # type: Dict[Tuple[str, str], int]
+
+# Queue name -> number of requeued jobs
+__requeues = {}  # type: Dict[str, int]
+
+# Queue name -> [bucket counts..., sum, count]
+__durations = {}  # type: Dict[str, List]
+__queue_waits = {}  # type: Dict[str, List]
+
+
+def __observe(histograms: Dict[str, List], buckets: tuple, queue_name: str, value: float) -> None:
+    histogram = histograms.get(queue_name, None)
+    if histogram is None:
+        histogram = histograms[queue_name] = [0] * len(buckets) + [0.0, 0]
+
+    for index, upper_bound in enumerate(buckets):
+        if value <= upper_bound:
+            histogram[index] += 1
+
+    histogram[-2] += value
+    histogram[-1] += 1
+
+
+def record_job(queue_name: str,
+               duration: float,
+               queue_wait: Optional[float] = None,
+               exception: Optional[Exception] = None) -> None:
+    """Record a job that was run.
+
+    "queue_wait" is None if job's publish time is unknown; "exception" is the exception that the job failed with."""
+
+    with __metrics_lock:
+        __runs[queue_name] = __runs.get(queue_name, 0) + 1
+
+        __observe(histograms=__durations, buckets=__DURATION_BUCKETS, queue_name=queue_name, value=max(duration, 0))
+
+        if queue_wait is not None:
+            __observe(histograms=__queue_waits,
+                      buckets=__QUEUE_WAIT_BUCKETS,
+                      queue_name=queue_name,
+                      value=max(queue_wait, 0))
+
+        if exception is not None:
+            key = (queue_name, type(exception).__name__)
+            __failures[key] = __failures.get(key, 0) + 1
+
+
+def record_requeue(queue_name: str) -> None:
+    """Record a job that got requeued."""
+    with __metrics_lock:
+        __requeues[queue_name] = __requeues.get(queue_name, 0) + 1
+
+
+def reset_metrics() -> None:
+    """Reset all metrics."""
+    with __metrics_lock:
+        __runs.clear()
+        __failures.clear()
+        __requeues.clear()
+        __durations.clear()
+        __queue_waits.clear()
+
+
+def __label_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def __labels(**labels) -> str:
+    return ','.join('%s="%s"' % (name, __label_value(str(value))) for name, value in sorted(labels.items()))
+
+
+def __histogram_lines(name: str, histograms: Dict[str, List], buckets: tuple) -> List[str]:
+    lines = []
+    for queue_name in sorted(histograms.keys()):
+        histogram = histograms[queue_name]
+        for index, upper_bound in enumerate(buckets):
+            lines.append('%s_bucket{%s} %d' % (name, __labels(queue=queue_name, le=repr(float(upper_bound))),
+                                               histogram[index]))
+        lines.append('%s_bucket{%s} %d' % (name, __labels(queue=queue_name, le='+Inf'), histogram[-1]))
+        lines.append('%s_sum{%s} %s' % (name, __labels(queue=queue_name), repr(float(histogram[-2]))))
+        lines.append('%s_count{%s} %d' % (name, __labels(queue=queue_name), histogram[-1]))
+    return lines
+
+
+def metrics_text() -> str:
+    """Return metrics in Prometheus' text exposition format."""
+
+    with __metrics_lock:
+        lines = [
+            '# HELP mc_job_runs_total Jobs run.',
+            '# TYPE mc_job_runs_total counter',
+        ]
+        for queue_name in sorted(__runs.keys()):
+            lines.append('mc_job_runs_total{%s} %d' % (__labels(queue=queue_name), __runs[queue_name]))
+
+        lines += [
+            '# HELP mc_job_failures_total Failed jobs by exception type.',
+            '# TYPE mc_job_failures_total counter',
+        ]
+        for (queue_name, exception_type) in sorted(__failures.keys()):
+            lines.append('mc_job_failures_total{%s} %d' % (
+                __labels(queue=queue_name, exception=exception_type),
+                __failures[(queue_name, exception_type)],
+            ))
+
+        lines += [
+            '# HELP mc_job_requeues_total Requeued jobs.',
+            '# TYPE mc_job_requeues_total counter',
+        ]
+        for queue_name in sorted(__requeues.keys()):
+            lines.append('mc_job_requeues_total{%s} %d' % (__labels(queue=queue_name), __requeues[queue_name]))
+
+        lines += [
+            '# HELP mc_job_duration_seconds Job handler duration.',
+            '# TYPE mc_job_duration_seconds histogram',
+        ]
+        lines += __histogram_lines(name='mc_job_duration_seconds', histograms=__durations, buckets=__DURATION_BUCKETS)
+
+        lines += [
+            '# HELP mc_job_queue_wait_seconds Time between publishing a job and starting to run it.',
+            '# TYPE mc_job_queue_wait_seconds histogram',
+        ]
+        lines += __histogram_lines(name='mc_job_queue_wait_seconds',
+                                   histograms=__queue_waits,
+                                   buckets=__QUEUE_WAIT_BUCKETS)
+
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Serves metrics on "/metrics" (and "/")."""
+
+    def do_GET(self) -> None:
+        if self.path.split('?')[0] not in {'/', '/metrics'}:
+            self.send_error(404)
+            return
+
+        body = metrics_text().encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # noinspection PyShadowingBuiltins
+    def log_message(self, format: str, *args) -> None:
+        # Don't spam worker's log with scrapes
+        pass
+
+
+def start_metrics_server(port: int, address: str = '') -> Optional[HTTPServer]:
+    """Start HTTP server that serves the metrics in a background thread, return the server.
+
+    Return None if the server couldn't be started (e.g. because the port is still held by a previous worker process),
+    as metrics are not important enough to stop the worker from running."""
+
+    try:
+        server = HTTPServer((address, int(port)), _MetricsRequestHandler)
+    except Exception as ex:
+        log.warning("Unable to start job metrics server on port %d: %s" % (int(port), str(ex)))
+        return None
+
+    thread = threading.Thread(target=server.serve_forever, name='JobMetricsServer', daemon=True)
+    thread.start()
+
+    log.info("Serving job metrics on port %d" % server.server_address[1])
+
+    return server
@@ -1,9 +1,9 @@
 import abc
 from enum import Enum
-from typing import Union
+from typing import Dict, List, Optional, Union
 
 from mediawords.db import DatabaseHandler
-from mediawords.util.compress import gzip, gunzip, bzip2, bunzip2
+from mediawords.util.compress import gzip, gunzip, bzip2, bunzip2, zstd, unzstd, lz4, unlz4
 from mediawords.util.perl import decode_object_from_bytes_if_needed
 
 
@@ -44,11 +44,70 @@ class KeyValueStore(metaclass=abc.ABCMeta):
         """Test if object exists. Returns true if it does, raises on error."""
         raise NotImplementedError("Abstract method.")
 
+    def fetch_contents(self,
+                       db: DatabaseHandler,
+                       object_ids: List[int],
+                       object_paths: Optional[Dict[int, str]] = None) -> Dict[int, Union[bytes, Exception]]:
+        """Read multiple objects.
+
+        Returns a dict of object ID to either content (in bytes) or an exception that was raised while fetching the
+        object, so that a single object failing doesn't fail the whole batch.
+
+        Default implementation calls fetch_content() for every object; stores that are able to fetch multiple objects
+        at once override it."""
+
+        object_ids = self._prepare_object_ids(object_ids)
+        object_paths = self._prepare_object_paths(object_paths)
+
+        contents = {}
+        for object_id in object_ids:
+            try:
+                # MC_REWRITE_TO_PYTHON: use named parameters after Python rewrite
+                contents[object_id] = self.fetch_content(db, object_id, object_paths.get(object_id, None))
+            except Exception as ex:
+                contents[object_id] = ex
+
+        return contents
+
+    def store_contents(self,
+                       db: DatabaseHandler,
+                       contents: Dict[int, Union[str, bytes]]) -> Dict[int, Union[str, Exception]]:
+        """Write multiple objects.
+
+        Returns a dict of object ID to either path to the object or an exception that was raised while storing the
+        object, so that a single object failing doesn't fail the whole batch.
+
+        Default implementation calls store_content() for every object; stores that are able to store multiple objects
+        at once override it."""
+
+        contents = self._prepare_object_contents(contents)
+
+        paths = {}
+        for object_id, content in contents.items():
+            try:
+                # MC_REWRITE_TO_PYTHON: use named parameters after Python rewrite
+                paths[object_id] = self.store_content(db, object_id, content)
+            except Exception as ex:
+                paths[object_id] = ex
+
+        return paths
+
     class Compression(Enum):
         """Available compression methods."""
         NONE = 'mc-kvs-compression-none'
         GZIP = 'mc-kvs-compression-gzip'
         BZIP2 = 'mc-kvs-compression-bzip2'
+        ZSTD = 'mc-kvs-compression-zstd'
+        LZ4 = 'mc-kvs-compression-lz4'
+
+    # Compressed data's magic numbers; used to uncompress objects that were stored using a different compression method
+    # than the one that the store is currently set up to use (e.g. Gzip objects after switching to Zstandard)
+    __COMPRESSION_MAGIC_NUMBERS = [
+        (b'\x1f\x8b', Compression.GZIP),
+        (b'BZh', Compression.BZIP2),
+        (b'\x28\xb5\x2f\xfd', Compression.ZSTD),
+        (b'\x04\x22\x4d\x18', Compression.LZ4),
+    ]
 
     @staticmethod
     def _compression_method_is_valid(compression_method: Compression) -> bool:
@@ -61,8 +120,21 @@ class KeyValueStore(metaclass=abc.ABCMeta):
         return False
 
     @staticmethod
-    def _compress_data_for_method(data: Union[bytes, str], compression_method: Compression) -> bytes:
-        """Compress data."""
+    def _compression_method_for_data(data: bytes) -> Optional[Compression]:
+        """Detect compression method from compressed data's magic number, return None if it's not recognized."""
+        for magic_number, compression_method in KeyValueStore.__COMPRESSION_MAGIC_NUMBERS:
+            if data.startswith(magic_number):
+                return compression_method
+        return None
+
+    @staticmethod
+    def _compress_data_for_method(data: Union[bytes, str],
+                                  compression_method: Compression,
+                                  zstd_dictionary: Optional[bytes] = None) -> bytes:
+        """Compress data.
+
+        If "zstd_dictionary" is set, Zstandard compression will use it (and the dictionary has to be registered with
+        register_zstd_dictionary() to uncompress the data afterwards)."""
 
         if data is None:
             raise McKeyValueStoreCompressionException("Data is None.")
@@ -79,6 +151,10 @@ class KeyValueStore(metaclass=abc.ABCMeta):
             data = gzip(data)
         elif compression_method == KeyValueStore.Compression.BZIP2:
             data = bzip2(data)
+        elif compression_method == KeyValueStore.Compression.ZSTD:
+            data = zstd(data, dictionary=zstd_dictionary)
+        elif compression_method == KeyValueStore.Compression.LZ4:
+            data = lz4(data)
         else:
             raise McKeyValueStoreCompressionException("Invalid compression method: %s" % compression_method)
 
@@ -86,7 +162,10 @@ class KeyValueStore(metaclass=abc.ABCMeta):
 
     @staticmethod
     def _uncompress_data_for_method(data: bytes, compression_method: Compression) -> bytes:
-        """Uncompress data."""
+        """Uncompress data.
+
+        Unless compression method is NONE, data compressed with any of the supported methods gets uncompressed as the
+        actual method is detected from the data's magic number."""
 
         if data is None:
             raise McKeyValueStoreCompressionException("Data is None.")
@@ -94,6 +173,11 @@ class KeyValueStore(metaclass=abc.ABCMeta):
         if not isinstance(data, bytes):
             raise McKeyValueStoreCompressionException("Compressed data is not str or bytes: %s" % str(data))
 
+        if compression_method != KeyValueStore.Compression.NONE:
+            detected_compression_method = KeyValueStore._compression_method_for_data(data)
+            if detected_compression_method is not None:
+                compression_method = detected_compression_method
+
         if compression_method == KeyValueStore.Compression.NONE:
             pass
 
@@ -101,6 +185,10 @@ class KeyValueStore(metaclass=abc.ABCMeta):
             data = gunzip(data)
         elif compression_method == KeyValueStore.Compression.BZIP2:
             data = bunzip2(data)
+        elif compression_method == KeyValueStore.Compression.ZSTD:
+            data = unzstd(data)
+        elif compression_method == KeyValueStore.Compression.LZ4:
+            data = unlz4(data)
         else:
             raise McKeyValueStoreCompressionException("Invalid compression method: %s" % compression_method)
 
@@ -123,6 +211,48 @@ class KeyValueStore(metaclass=abc.ABCMeta):
 
         return object_id
 
+    @staticmethod
+    def _prepare_object_ids(object_ids: List[int]) -> List[int]:
+        """Prepare a list of object IDs by validating, decoding and deduplicating them."""
+
+        if object_ids is None:
+            raise McKeyValueStoreException("Object IDs is None.")
+
+        object_ids = decode_object_from_bytes_if_needed(object_ids)
+
+        prepared_object_ids = []
+        seen_object_ids = set()
+        for object_id in object_ids:
+            object_id = KeyValueStore._prepare_object_id(object_id)
+            if object_id not in seen_object_ids:
+                seen_object_ids.add(object_id)
+                prepared_object_ids.append(object_id)
+
+        return prepared_object_ids
+
+    @staticmethod
+    def _prepare_object_paths(object_paths: Optional[Dict[int, str]]) -> Dict[int, str]:
+        """Prepare object ID -> object path dictionary by decoding it."""
+
+        if object_paths is None:
+            return {}
+
+        object_paths = decode_object_from_bytes_if_needed(object_paths)
+
+        return {int(object_id): object_path for object_id, object_path in object_paths.items()}
+
+    @staticmethod
+    def _prepare_object_contents(contents: Dict[int, Union[str, bytes]]) -> Dict[int, Union[str, bytes]]:
+        """Prepare object ID -> content dictionary by validating and decoding object IDs.
+
+        Content itself doesn't get validated here so that invalid content could be reported as a per-object error."""
+
+        if contents is None:
+            raise McKeyValueStoreException("Contents to store is None.")
+
+        # Content might be bytes so decode only the keys
+        return {KeyValueStore._prepare_object_id(object_id): content for object_id, content in contents.items()}
+
     @staticmethod
     def _prepare_content(content: Union[str, bytes]) -> bytes:
         """Prepare content to store by validating and decoding it."""
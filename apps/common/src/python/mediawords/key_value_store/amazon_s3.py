@@ -1,5 +1,6 @@
 import os
-from typing import Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
 
 import boto3
 # noinspection PyPackageRequirements
@@ -9,6 +10,7 @@ from botocore.exceptions import ClientError
 
 from mediawords.db import DatabaseHandler
 from mediawords.key_value_store import KeyValueStore, McKeyValueStoreException
+from mediawords.util.compress import register_zstd_dictionary
 from mediawords.util.log import create_logger
 from mediawords.util.perl import decode_object_from_bytes_if_needed
 
@@ -48,6 +50,10 @@ class AmazonS3Store(KeyValueStore):
     __READ_ATTEMPTS = 3
     __WRITE_ATTEMPTS = 3
 
+    # Max. number of objects to fetch / store concurrently in fetch_contents() / store_contents() (and the size of S3
+    # client's connection pool)
+    __CONCURRENT_REQUESTS = 16
+
     __slots__ = [
         '__access_key_id',
         '__secret_access_key',
@@ -55,6 +61,7 @@ class AmazonS3Store(KeyValueStore):
         '__directory_name',
 
         '__compression_method',
+        '__zstd_dictionary',
 
         # Boto3 objects
         '__s3',
@@ -68,8 +75,12 @@ class AmazonS3Store(KeyValueStore):
                  secret_access_key: str,
                  bucket_name: str,
                  directory_name: str,
-                 compression_method: KeyValueStore.Compression = _DEFAULT_COMPRESSION_METHOD):
-        """Constructor."""
+                 compression_method: KeyValueStore.Compression = _DEFAULT_COMPRESSION_METHOD,
+                 zstd_dictionary: Optional[bytes] = None):
+        """Constructor.
+
+        If "zstd_dictionary" is set (e.g. trained with train_zstd_dictionary()), it will be used to compress objects
+        with ZSTD compression method."""
 
         access_key_id = decode_object_from_bytes_if_needed(access_key_id)
         secret_access_key = decode_object_from_bytes_if_needed(secret_access_key)
@@ -99,7 +110,14 @@ class AmazonS3Store(KeyValueStore):
         self.__secret_access_key = secret_access_key
         self.__bucket_name = bucket_name
         self.__directory_name = directory_name
+        if zstd_dictionary is not None:
+            try:
+                register_zstd_dictionary(zstd_dictionary)
+            except Exception as ex:
+                raise McAmazonS3StoreException("Unable to register Zstandard dictionary: %s" % str(ex))
+
         self.__compression_method = compression_method
+        self.__zstd_dictionary = zstd_dictionary
 
         self.__pid = os.getpid()
         self.__s3 = None
@@ -118,7 +136,8 @@ class AmazonS3Store(KeyValueStore):
             raise McAmazonS3StoreException("Amazon S3 request timeout is too small: %d" % request_timeout)
 
         config = BotoCoreConfig(connect_timeout=request_timeout,
-                                read_timeout=request_timeout)
+                                read_timeout=request_timeout,
+                                max_pool_connections=self.__CONCURRENT_REQUESTS)
 
         try:
             self.__s3 = boto3.resource(service_name='s3',
@@ -151,16 +170,28 @@ class AmazonS3Store(KeyValueStore):
         return self.__s3.Object(bucket_name=self.__bucket_name,
                                 key=self.__s3_key_for_object_id(object_id=object_id))
 
-    def fetch_content(self, db: DatabaseHandler, object_id: int, object_path: str = None) -> bytes:
-        """Read object from Amazon S3."""
+    def __uncompress_content(self, object_id: int, content: bytes) -> bytes:
+        """Uncompress content fetched from S3."""
 
-        object_id = self._prepare_object_id(object_id)
+        if not isinstance(content, bytes):
+            raise McAmazonS3StoreException("Content is not bytes for object ID %d." % object_id)
 
-        self.__initialize_s3()
+        try:
+            content = self._uncompress_data_for_method(data=content, compression_method=self.__compression_method)
+        except Exception as ex:
+            raise McAmazonS3StoreException("Unable to uncompress data for object ID %d: %s" % (object_id, str(ex),))
 
-        if self.__CHECK_IF_EXISTS_BEFORE_FETCHING:
-            if not self.content_exists(db=db, object_id=object_id, object_path=object_path):
-                raise McAmazonS3StoreException("Object ID %d does not exist." % object_id)
+        if content is None:
+            raise McAmazonS3StoreException("Content is None after uncompression for object ID %d" % object_id)
+        if not isinstance(content, bytes):
+            raise McAmazonS3StoreException("Content is not bytes after uncompression for object ID %d" % object_id)
+
+        return content
+
+    def __fetch_object(self, object_id: int) -> bytes:
+        """Read and uncompress object from Amazon S3 using S3 client (which, unlike resources, is thread-safe)."""
+
+        client = self.__s3.meta.client
 
         content = None
 
@@ -171,10 +202,15 @@ class AmazonS3Store(KeyValueStore):
                 log.warning("Retrying (#%d)..." % retry)
 
             try:
-                o = self.__object_for_object_id(object_id)
-                o_get = o.get()
+                o_get = client.get_object(Bucket=self.__bucket_name,
+                                          Key=self.__s3_key_for_object_id(object_id=object_id))
                 content = o_get['Body'].read()
 
+            except ClientError as ex:
+                if ex.response['Error']['Code'] in {'404', 'NoSuchKey'}:
+                    raise McAmazonS3StoreException("Object ID %d does not exist." % object_id)
+                log.error("Attempt to read object ID %d didn't succeed because: %s" % (object_id, str(ex),))
+
             except Exception as ex:
                 log.error("Attempt to read object ID %d didn't succeed because: %s" % (object_id, str(ex),))
 
@@ -186,39 +222,60 @@ class AmazonS3Store(KeyValueStore):
                 "Unable to read object ID %d after %d retries." % (object_id, self.__READ_ATTEMPTS,)
             )
 
-        if not isinstance(content, bytes):
-            raise McAmazonS3StoreException("Content is not bytes for object ID %d." % object_id)
+        return self.__uncompress_content(object_id=object_id, content=content)
 
-        try:
-            content = self._uncompress_data_for_method(data=content, compression_method=self.__compression_method)
-        except Exception as ex:
-            raise McAmazonS3StoreException("Unable to uncompress data for object ID %d: %s" % (object_id, str(ex),))
+    def fetch_content(self, db: DatabaseHandler, object_id: int, object_path: str = None) -> bytes:
+        """Read object from Amazon S3."""
 
-        if content is None:
-            raise McAmazonS3StoreException("Content is None after uncompression for object ID %d" % object_id)
-        if not isinstance(content, bytes):
-            raise McAmazonS3StoreException("Content is not bytes after uncompression for object ID %d" % object_id)
+        object_id = self._prepare_object_id(object_id)
 
-        return content
+        self.__initialize_s3()
 
-    def store_content(self, db: DatabaseHandler, object_id: int, content: Union[str, bytes]) -> str:
-        """Write object to Amazon S3."""
+        if self.__CHECK_IF_EXISTS_BEFORE_FETCHING:
+            if not self.content_exists(db=db, object_id=object_id, object_path=object_path):
+                raise McAmazonS3StoreException("Object ID %d does not exist." % object_id)
 
-        object_id = self._prepare_object_id(object_id)
-        content = self._prepare_content(content)
+        return self.__fetch_object(object_id=object_id)
+
+    def fetch_contents(self,
+                       db: DatabaseHandler,
+                       object_ids: List[int],
+                       object_paths: Optional[Dict[int, str]] = None) -> Dict[int, Union[bytes, Exception]]:
+        """Read multiple objects from Amazon S3 concurrently.
+
+        Objects get fetched with a bounded thread pool over a single S3 client (and its connection pool). Object
+        existence doesn't get checked before fetching as nonexistent objects get reported as per-object errors
+        anyway."""
+
+        object_ids = self._prepare_object_ids(object_ids)
+
+        if len(object_ids) == 0:
+            return {}
 
         self.__initialize_s3()
 
-        if self.__CHECK_IF_EXISTS_BEFORE_FETCHING:
-            if not self.content_exists(db=db, object_id=object_id):
-                log.info(
-                    (
-                        "Object ID %d already exists, will store a new version or overwrite "
-                        "(depending on whether or not versioning is enabled)."
-                    ) % object_id)
+        contents = {}
+
+        with ThreadPoolExecutor(max_workers=min(self.__CONCURRENT_REQUESTS, len(object_ids))) as executor:
+            futures = {object_id: executor.submit(self.__fetch_object, object_id) for object_id in object_ids}
+
+            for object_id, future in futures.items():
+                try:
+                    contents[object_id] = future.result()
+                except Exception as ex:
+                    contents[object_id] = ex
+
+        return contents
+
+    def __store_object(self, object_id: int, content: Union[str, bytes]) -> str:
+        """Compress and write object to Amazon S3 using S3 client (which, unlike resources, is thread-safe)."""
+
+        content = self._prepare_content(content)
 
         try:
-            content = self._compress_data_for_method(data=content, compression_method=self.__compression_method)
+            content = self._compress_data_for_method(data=content,
+                                                     compression_method=self.__compression_method,
+                                                     zstd_dictionary=self.__zstd_dictionary)
         except Exception as ex:
             raise McAmazonS3StoreException("Unable to compress data for object ID %d: %s" % (object_id, str(ex),))
 
@@ -227,6 +284,8 @@ class AmazonS3Store(KeyValueStore):
         if not isinstance(content, bytes):
             raise McAmazonS3StoreException("Content is not bytes after compression for object ID %d" % object_id)
 
+        client = self.__s3.meta.client
+
         # S3 sometimes times out when writing, so we'll try to read several times
         write_was_successful = False
         for retry in range(self.__WRITE_ATTEMPTS):
@@ -235,8 +294,9 @@ class AmazonS3Store(KeyValueStore):
                 log.warning("Retrying (#%d)..." % retry)
 
             try:
-                o = self.__object_for_object_id(object_id)
-                o.put(Body=content)
+                client.put_object(Bucket=self.__bucket_name,
+                                  Key=self.__s3_key_for_object_id(object_id=object_id),
+                                  Body=content)
                 write_was_successful = True
 
             except Exception as ex:
@@ -253,6 +313,52 @@ class AmazonS3Store(KeyValueStore):
         path = 's3:%s' % self.__s3_key_for_object_id(object_id=object_id)
         return path
 
+    def store_content(self, db: DatabaseHandler, object_id: int, content: Union[str, bytes]) -> str:
+        """Write object to Amazon S3."""
+
+        object_id = self._prepare_object_id(object_id)
+        content = self._prepare_content(content)
+
+        self.__initialize_s3()
+
+        if self.__CHECK_IF_EXISTS_BEFORE_STORING:
+            if self.content_exists(db=db, object_id=object_id):
+                log.info(
+                    (
+                        "Object ID %d already exists, will store a new version or overwrite "
+                        "(depending on whether or not versioning is enabled)."
+                    ) % object_id)
+
+        return self.__store_object(object_id=object_id, content=content)
+
+    def store_contents(self,
+                       db: DatabaseHandler,
+                       contents: Dict[int, Union[str, bytes]]) -> Dict[int, Union[str, Exception]]:
+        """Write multiple objects to Amazon S3 concurrently."""
+
+        contents = self._prepare_object_contents(contents)
+
+        if len(contents) == 0:
+            return {}
+
+        self.__initialize_s3()
+
+        paths = {}
+
+        with ThreadPoolExecutor(max_workers=min(self.__CONCURRENT_REQUESTS, len(contents))) as executor:
+            futures = {
+                object_id: executor.submit(self.__store_object, object_id, content)
+                for object_id, content in contents.items()
+            }
+
+            for object_id, future in futures.items():
+                try:
+                    paths[object_id] = future.result()
+                except Exception as ex:
+                    paths[object_id] = ex
+
+        return paths
+
     def remove_content(self, db: DatabaseHandler, object_id: int, object_path: str = None) -> None:
         """Remove object from Amazon S3."""
 
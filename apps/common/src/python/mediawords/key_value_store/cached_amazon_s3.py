@@ -1,4 +1,4 @@
-from typing import Union
+from typing import Dict, List, Optional, Union
 
 from mediawords.db import DatabaseHandler
 from mediawords.key_value_store import KeyValueStore, McKeyValueStoreException
@@ -22,6 +22,9 @@ class CachedAmazonS3Store(AmazonS3Store):
     # Default cache compression method
     _DEFAULT_CACHE_COMPRESSION_METHOD = KeyValueStore.Compression.GZIP
 
+    # Max. number of objects to cache with a single query
+    __CACHE_CHUNK_SIZE = 100
+
     __slots__ = [
         '__cache_table',
         '__cache_compression_method',
@@ -34,13 +37,15 @@ class CachedAmazonS3Store(AmazonS3Store):
                  directory_name: str,
                  cache_table: str,
                  compression_method: KeyValueStore.Compression = AmazonS3Store._DEFAULT_COMPRESSION_METHOD,
-                 cache_compression_method: KeyValueStore.Compression = _DEFAULT_CACHE_COMPRESSION_METHOD):
+                 cache_compression_method: KeyValueStore.Compression = _DEFAULT_CACHE_COMPRESSION_METHOD,
+                 zstd_dictionary: Optional[bytes] = None):
         """Constructor."""
         super().__init__(access_key_id=access_key_id,
                          secret_access_key=secret_access_key,
                          bucket_name=bucket_name,
                          directory_name=directory_name,
-                         compression_method=compression_method)
+                         compression_method=compression_method,
+                         zstd_dictionary=zstd_dictionary)
 
         cache_table = decode_object_from_bytes_if_needed(cache_table)
         if cache_table is None or len(cache_table) == 0:
@@ -81,6 +86,64 @@ class CachedAmazonS3Store(AmazonS3Store):
         except Exception as ex:
             log.warning("Unable to cache object ID %d: %s" % (object_id, str(ex),))
 
+    def __try_storing_objects_in_cache(self, db: DatabaseHandler, contents: Dict[int, bytes]) -> None:
+        """Attempt to store multiple objects to cache with multi-row upserts, don't worry too much if it fails."""
+
+        object_ids = list(contents.keys())
+
+        for chunk_start in range(0, len(object_ids), self.__CACHE_CHUNK_SIZE):
+            chunk_object_ids = object_ids[chunk_start:chunk_start + self.__CACHE_CHUNK_SIZE]
+
+            try:
+                values = []
+                params = {}
+                for row_number, object_id in enumerate(chunk_object_ids):
+                    values.append("(%%(object_id_%d)s, %%(raw_data_%d)s)" % (row_number, row_number,))
+                    params['object_id_%d' % row_number] = object_id
+                    params['raw_data_%d' % row_number] = self._compress_data_for_method(
+                        data=contents[object_id],
+                        compression_method=self.__cache_compression_method,
+                    )
+
+                sql = "INSERT INTO %s " % self.__cache_table  # interpolated by Python
+                sql += "(object_id, raw_data) "
+                sql += "VALUES %s " % ", ".join(values)  # interpolated by psycopg2
+                sql += "ON CONFLICT (object_id) DO UPDATE "
+                sql += "    SET raw_data = EXCLUDED.raw_data"
+
+                db.query(sql, params)
+
+            except Exception as ex:
+                log.warning("Unable to cache %d objects: %s" % (len(chunk_object_ids), str(ex),))
+
+    def __uncompress_cached_content(self, object_id: int, content: Union[bytes, memoryview, list]) -> bytes:
+        """Uncompress "raw_data" column's value of the cache table."""
+
+        # MC_REWRITE_TO_PYTHON: Perl database handler returns value as array of bytes
+        if isinstance(content, list):
+            content = b''.join(content)
+
+        if isinstance(content, memoryview):
+            content = content.tobytes()
+
+        if not isinstance(content, bytes):
+            raise McCachedAmazonS3StoreException("Content is not bytes for object %d." % object_id)
+
+        try:
+            content = self._uncompress_data_for_method(data=content,
+                                                       compression_method=self.__cache_compression_method)
+        except Exception as ex:
+            raise McCachedAmazonS3StoreException(
+                "Unable to uncompress data for object ID %d: %s" % (object_id, str(ex),))
+
+        if content is None:
+            raise McCachedAmazonS3StoreException("Content is None after uncompression for object ID %d" % object_id)
+        if not isinstance(content, bytes):
+            raise McCachedAmazonS3StoreException(
+                "Content is not bytes after uncompression for object ID %d" % object_id)
+
+        return content
+
     def __try_retrieving_object_from_cache(self, db: DatabaseHandler, object_id: int) -> Union[bytes, None]:
         """Attempt to retrieve object from cache, don't worry too much if it fails."""
 
@@ -96,37 +159,38 @@ class CachedAmazonS3Store(AmazonS3Store):
             if content is None or len(content) == 0:
                 raise McCachedAmazonS3StoreException("Object with ID %d was not found." % object_id)
 
-            content = content['raw_data']
+            content = self.__uncompress_cached_content(object_id=object_id, content=content['raw_data'])
 
-            # MC_REWRITE_TO_PYTHON: Perl database handler returns value as array of bytes
-            if isinstance(content, list):
-                content = b''.join(content)
+        except Exception as ex:
+            log.debug("Unable to retrieve object ID %d from cache: %s" % (object_id, str(ex),))
+            return None
 
-            if isinstance(content, memoryview):
-                content = content.tobytes()
+        else:
+            return content
 
-            if not isinstance(content, bytes):
-                raise McCachedAmazonS3StoreException("Content is not bytes for object %d." % object_id)
+    def __try_retrieving_objects_from_cache(self, db: DatabaseHandler, object_ids: List[int]) -> Dict[int, bytes]:
+        """Attempt to retrieve multiple objects from cache with a single query, return the ones that were found."""
 
-            try:
-                content = self._uncompress_data_for_method(data=content,
-                                                           compression_method=self.__cache_compression_method)
-            except Exception as ex:
-                raise McCachedAmazonS3StoreException(
-                    "Unable to uncompress data for object ID %d: %s" % (object_id, str(ex),))
+        try:
+            sql = "SELECT object_id, raw_data "
+            sql += "FROM %s " % self.__cache_table  # interpolated by Python
+            sql += "WHERE object_id = ANY(%(object_ids)s)"  # interpolated by psycopg2
 
-            if content is None:
-                raise McCachedAmazonS3StoreException("Content is None after uncompression for object ID %d" % object_id)
-            if not isinstance(content, bytes):
-                raise McCachedAmazonS3StoreException(
-                    "Content is not bytes after uncompression for object ID %d" % object_id)
+            rows = db.query(sql, {'object_ids': object_ids}).hashes()
 
         except Exception as ex:
-            log.debug("Unable to retrieve object ID %d from cache: %s" % (object_id, str(ex),))
-            return None
+            log.debug("Unable to retrieve %d objects from cache: %s" % (len(object_ids), str(ex),))
+            return {}
 
-        else:
-            return content
+        contents = {}
+        for row in rows:
+            object_id = row['object_id']
+            try:
+                contents[object_id] = self.__uncompress_cached_content(object_id=object_id, content=row['raw_data'])
+            except Exception as ex:
+                log.debug("Unable to retrieve object ID %d from cache: %s" % (object_id, str(ex),))
+
+        return contents
 
     def __remove_object_from_cache(self, db: DatabaseHandler, object_id: int) -> None:
         """Attempt to remove object from cache.
@@ -156,6 +220,33 @@ class CachedAmazonS3Store(AmazonS3Store):
 
         return content
 
+    def fetch_contents(self,
+                       db: DatabaseHandler,
+                       object_ids: List[int],
+                       object_paths: Optional[Dict[int, str]] = None) -> Dict[int, Union[bytes, Exception]]:
+        """Read multiple objects from local cache with a single query, fetch the rest from Amazon S3."""
+
+        object_ids = self._prepare_object_ids(object_ids)
+
+        if len(object_ids) == 0:
+            return {}
+
+        contents = self.__try_retrieving_objects_from_cache(db=db, object_ids=object_ids)
+
+        uncached_object_ids = [object_id for object_id in object_ids if object_id not in contents]
+        if uncached_object_ids:
+            fetched_contents = super().fetch_contents(db=db, object_ids=uncached_object_ids, object_paths=object_paths)
+
+            # Cache the retrieved objects because we might need them soon
+            self.__try_storing_objects_in_cache(db=db, contents={
+                object_id: content for object_id, content in fetched_contents.items()
+                if not isinstance(content, Exception)
+            })
+
+            contents.update(fetched_contents)
+
+        return {object_id: contents[object_id] for object_id in object_ids}
+
     def store_content(self, db: DatabaseHandler, object_id: int, content: Union[str, bytes]) -> str:
         """Write object to Amazon S3, cache it locally too."""
 
@@ -170,6 +261,27 @@ class CachedAmazonS3Store(AmazonS3Store):
 
         return path
 
+    def store_contents(self,
+                       db: DatabaseHandler,
+                       contents: Dict[int, Union[str, bytes]]) -> Dict[int, Union[str, Exception]]:
+        """Write multiple objects to Amazon S3 concurrently, cache the successfully stored ones locally too."""
+
+        contents = self._prepare_object_contents(contents)
+
+        paths = super().store_contents(db=db, contents=contents)
+
+        stored_contents = {}
+        for object_id, path in paths.items():
+            if not isinstance(path, Exception):
+                content = contents[object_id]
+                if isinstance(content, str):
+                    content = content.encode('utf-8')
+                stored_contents[object_id] = content
+
+        self.__try_storing_objects_in_cache(db=db, contents=stored_contents)
+
+        return paths
+
     def remove_content(self, db: DatabaseHandler, object_id: int, object_path: str = None) -> None:
         """Remove object from Amazon S3 and local cache."""
 
@@ -0,0 +1,247 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Union
+
+from mediawords.db import DatabaseHandler
+from mediawords.key_value_store import KeyValueStore, McKeyValueStoreException
+from mediawords.util.log import create_logger
+from mediawords.util.perl import decode_object_from_bytes_if_needed
+
+log = create_logger(__name__)
+
+
+class McMemoryCachedStoreException(McKeyValueStoreException):
+    """Memory cached store exception."""
+    pass
+
+
+class MemoryCachedStore(KeyValueStore):
+    """Key-value store that keeps recently fetched objects of a different store in a per-process LRU memory cache.
+
+    Cache is bounded by the total size of the (uncompressed) objects in it. Objects get invalidated on store_content()
+    and remove_content() that go through this store, so writes to the same objects have to use the same instance."""
+
+    # Default max. size of all cached objects (in bytes)
+    _DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+    __slots__ = [
+        '__store',
+        '__max_size',
+
+        # Object ID -> content, least recently used first
+        '__cache',
+
+        # Total size of cached content
+        '__size',
+
+        '__hits',
+        '__misses',
+        '__evictions',
+
+        '__lock',
+
+        # Process PID (to not share cache with forks which might write to the same objects)
+        '__pid',
+    ]
+
+    def __init__(self, store: KeyValueStore, max_size: int = _DEFAULT_MAX_SIZE):
+        """Constructor."""
+
+        if store is None:
+            raise McMemoryCachedStoreException("Store to cache is unset.")
+
+        if max_size is None or int(max_size) < 1:
+            raise McMemoryCachedStoreException("Max. cache size must be positive.")
+
+        self.__store = store
+        self.__max_size = int(max_size)
+
+        self.__lock = threading.Lock()
+
+        self.__reset()
+
+    def __reset(self) -> None:
+        """(Re)initialize empty cache for the current process."""
+        self.__cache = OrderedDict()
+        self.__size = 0
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+        self.__pid = os.getpid()
+
+    def __reset_if_forked(self) -> None:
+        if self.__pid != os.getpid():
+            # Lock might have been held by some other thread at the time of fork so it's not usable anymore
+            self.__lock = threading.Lock()
+            self.__reset()
+
+    def __get(self, object_id: int) -> Optional[bytes]:
+        """Return cached content and count a hit, or count a miss and return None."""
+        with self.__lock:
+            content = self.__cache.get(object_id, None)
+            if content is None:
+                self.__misses += 1
+            else:
+                self.__cache.move_to_end(object_id)
+                self.__hits += 1
+            return content
+
+    def __put(self, object_id: int, content: bytes) -> None:
+        """Add content to cache, evict the least recently used objects if the cache gets too big."""
+
+        if not isinstance(content, bytes):
+            return
+
+        if len(content) > self.__max_size:
+            # Wouldn't fit anyway
+            return
+
+        with self.__lock:
+            old_content = self.__cache.pop(object_id, None)
+            if old_content is not None:
+                self.__size -= len(old_content)
+
+            self.__cache[object_id] = content
+            self.__size += len(content)
+
+            while self.__size > self.__max_size:
+                _, evicted_content = self.__cache.popitem(last=False)
+                self.__size -= len(evicted_content)
+                self.__evictions += 1
+
+    def __invalidate(self, object_id: int) -> None:
+        with self.__lock:
+            content = self.__cache.pop(object_id, None)
+            if content is not None:
+                self.__size -= len(content)
+
+    def store(self) -> KeyValueStore:
+        """Return store that is being cached."""
+        return self.__store
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Return cache statistics: "hits", "misses", "evictions", number of "objects" and their total "size"."""
+        self.__reset_if_forked()
+        with self.__lock:
+            return {
+                'hits': self.__hits,
+                'misses': self.__misses,
+                'evictions': self.__evictions,
+                'objects': len(self.__cache),
+                'size': self.__size,
+            }
+
+    def clear_cache(self) -> None:
+        """Remove all objects from cache and reset statistics."""
+        self.__reset_if_forked()
+        with self.__lock:
+            self.__reset()
+
+    def fetch_content(self, db: DatabaseHandler, object_id: int, object_path: str = None) -> bytes:
+        """Read object from memory cache, fall back to the cached store."""
+
+        object_id = self._prepare_object_id(object_id)
+        object_path = decode_object_from_bytes_if_needed(object_path)
+
+        self.__reset_if_forked()
+
+        content = self.__get(object_id)
+        if content is None:
+            # MC_REWRITE_TO_PYTHON: use named parameters after Python rewrite
+            content = self.__store.fetch_content(db, object_id, object_path)
+            self.__put(object_id, content)
+
+        return content
+
+    def fetch_contents(self,
+                       db: DatabaseHandler,
+                       object_ids: List[int],
+                       object_paths: Optional[Dict[int, str]] = None) -> Dict[int, Union[bytes, Exception]]:
+        """Read multiple objects from memory cache, fetch the rest from the cached store."""
+
+        object_ids = self._prepare_object_ids(object_ids)
+        object_paths = self._prepare_object_paths(object_paths)
+
+        self.__reset_if_forked()
+
+        contents = {}
+        uncached_object_ids = []
+        for object_id in object_ids:
+            content = self.__get(object_id)
+            if content is None:
+                uncached_object_ids.append(object_id)
+            else:
+                contents[object_id] = content
+
+        if uncached_object_ids:
+            # MC_REWRITE_TO_PYTHON: use named parameters after Python rewrite
+            fetched_contents = self.__store.fetch_contents(db, uncached_object_ids, object_paths)
+
+            for object_id in uncached_object_ids:
+                content = fetched_contents.get(object_id, None)
+                if content is None:
+                    content = McMemoryCachedStoreException(
+                        "Fetching object ID %d succeeded, but the returned content is undefined." % object_id
+                    )
+                if not isinstance(content, Exception):
+                    self.__put(object_id, content)
+                contents[object_id] = content
+
+        return {object_id: contents[object_id] for object_id in object_ids}
+
+    def store_content(self, db: DatabaseHandler, object_id: int, content: Union[str, bytes]) -> str:
+        """Write object to the cached store, invalidate it in memory cache."""
+
+        object_id = self._prepare_object_id(object_id)
+
+        self.__reset_if_forked()
+
+        # Invalidate before and not after writing so that a failed write doesn't leave a stale object behind
+        self.__invalidate(object_id)
+
+        # MC_REWRITE_TO_PYTHON: use named parameters after Python rewrite
+        return self.__store.store_content(db, object_id, content)
+
+    def store_contents(self,
+                       db: DatabaseHandler,
+                       contents: Dict[int, Union[str, bytes]]) -> Dict[int, Union[str, Exception]]:
+        """Write multiple objects to the cached store, invalidate them in memory cache."""
+
+        contents = self._prepare_object_contents(contents)
+
+        self.__reset_if_forked()
+
+        for object_id in contents.keys():
+            self.__invalidate(object_id)
+
+        # MC_REWRITE_TO_PYTHON: use named parameters after Python rewrite
+        return self.__store.store_contents(db, contents)
+
+    def remove_content(self, db: DatabaseHandler, object_id: int, object_path: str = None) -> None:
+        """Remove object from the cached store and memory cache."""
+
+        object_id = self._prepare_object_id(object_id)
+        object_path = decode_object_from_bytes_if_needed(object_path)
+
+        self.__reset_if_forked()
+
+        self.__invalidate(object_id)
+
+        # MC_REWRITE_TO_PYTHON: use named parameters after Python rewrite
+        self.__store.remove_content(db, object_id, object_path)
+
+    def content_exists(self, db: DatabaseHandler, object_id: int, object_path: str = None) -> bool:
+        """Test if object exists in memory cache or the cached store."""
+
+        object_id = self._prepare_object_id(object_id)
+        object_path = decode_object_from_bytes_if_needed(object_path)
+
+        self.__reset_if_forked()
+
+        with self.__lock:
+            if object_id in self.__cache:
+                return True
+
+        # MC_REWRITE_TO_PYTHON: use named parameters after Python rewrite
+        return self.__store.content_exists(db, object_id, object_path)
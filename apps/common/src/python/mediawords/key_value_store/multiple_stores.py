@@ -1,4 +1,4 @@
-from typing import List, Union
+from typing import Dict, List, Optional, Union
 
 from mediawords.db import DatabaseHandler
 from mediawords.key_value_store import KeyValueStore, McKeyValueStoreException
@@ -88,6 +88,69 @@ class MultipleStoresStore(KeyValueStore):
 
         return content
 
+    def fetch_contents(self,
+                       db: DatabaseHandler,
+                       object_ids: List[int],
+                       object_paths: Optional[Dict[int, str]] = None) -> Dict[int, Union[bytes, Exception]]:
+        """Fetch multiple objects from any of the stores that might have them.
+
+        Every store gets asked for the objects that previous stores failed to fetch; objects that none of the stores
+        were able to fetch get reported as per-object errors."""
+
+        object_ids = self._prepare_object_ids(object_ids)
+        object_paths = self._prepare_object_paths(object_paths)
+
+        if len(self.__stores_for_reading) == 0:
+            raise McMultipleStoresStoreException("List of stores for reading %d objects is empty." % len(object_ids))
+
+        contents = {}
+        errors = {object_id: [] for object_id in object_ids}
+
+        remaining_object_ids = object_ids
+        for store in self.__stores_for_reading:
+            if len(remaining_object_ids) == 0:
+                break
+
+            try:
+                # MC_REWRITE_TO_PYTHON: use named parameters after Python rewrite
+                store_contents = store.fetch_contents(db, remaining_object_ids, object_paths)
+            except Exception as ex:
+                # Store failed as a whole
+                store_contents = {object_id: ex for object_id in remaining_object_ids}
+
+            failed_object_ids = []
+            for object_id in remaining_object_ids:
+                content = store_contents.get(object_id, None)
+                if content is None:
+                    content = McMultipleStoresStoreException("Fetching object ID %d from store %s succeeded, "
+                                                             "but the returned content is undefined." % (
+                                                                 object_id, str(store),
+                                                             ))
+
+                if isinstance(content, Exception):
+                    errors[object_id].append(
+                        "Error fetching object ID %(object_id)d from store %(store)s: %(exception)s" % {
+                            'object_id': object_id,
+                            'store': store,
+                            'exception': str(content),
+                        }
+                    )
+                    failed_object_ids.append(object_id)
+                else:
+                    contents[object_id] = content
+
+            remaining_object_ids = failed_object_ids
+
+        for object_id in remaining_object_ids:
+            contents[object_id] = McMultipleStoresStoreException(
+                "All stores failed while fetching object ID %(object_id)d; errors: %(errors)s" % {
+                    'object_id': object_id,
+                    'errors': "\n".join(errors[object_id]),
+                }
+            )
+
+        return {object_id: contents[object_id] for object_id in object_ids}
+
     def store_content(self, db: DatabaseHandler, object_id: int, content: Union[str, bytes]) -> str:
         """Store content to all stores; raise if one of them fails."""
 
@@ -125,6 +188,57 @@ class MultipleStoresStore(KeyValueStore):
 
         return last_store_path
 
+    def store_contents(self,
+                       db: DatabaseHandler,
+                       contents: Dict[int, Union[str, bytes]]) -> Dict[int, Union[str, Exception]]:
+        """Store multiple objects to all stores.
+
+        Objects that one of the stores fails to store don't get stored in further stores and get reported as per-object
+        errors."""
+
+        contents = self._prepare_object_contents(contents)
+
+        if len(self.__stores_for_writing) == 0:
+            raise McMultipleStoresStoreException("List of stores for writing %d objects is empty." % len(contents))
+
+        paths = {}
+
+        remaining_contents = contents
+        for store in self.__stores_for_writing:
+            if len(remaining_contents) == 0:
+                break
+
+            try:
+                # MC_REWRITE_TO_PYTHON: use named parameters after Python rewrite
+                store_paths = store.store_contents(db, remaining_contents)
+            except Exception as ex:
+                # Store failed as a whole
+                store_paths = {object_id: ex for object_id in remaining_contents.keys()}
+
+            stored_contents = {}
+            for object_id, content in remaining_contents.items():
+                path = store_paths.get(object_id, None)
+                if path is None:
+                    path = McMultipleStoresStoreException(
+                        "Storing object ID %d to %s succeeded, but the returned path is empty." % (object_id, store,)
+                    )
+
+                if isinstance(path, Exception):
+                    paths[object_id] = McMultipleStoresStoreException(
+                        "Error while saving object ID %(object_id)d to store %(store)s: %(exception)s" % {
+                            'object_id': object_id,
+                            'store': str(store),
+                            'exception': str(path)
+                        }
+                    )
+                else:
+                    paths[object_id] = path
+                    stored_contents[object_id] = content
+
+            remaining_contents = stored_contents
+
+        return {object_id: paths[object_id] for object_id in contents.keys()}
+
     def remove_content(self, db: DatabaseHandler, object_id: int, object_path: str = None) -> None:
         """Remove content from all stores; raise if one of them fails."""
 
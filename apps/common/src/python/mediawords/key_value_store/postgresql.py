@@ -1,9 +1,13 @@
-from typing import Union
+from typing import Dict, List, Optional, Union
 
 from mediawords.db import DatabaseHandler
 from mediawords.key_value_store import KeyValueStore, McKeyValueStoreException
+from mediawords.util.compress import register_zstd_dictionary
+from mediawords.util.log import create_logger
 from mediawords.util.perl import decode_object_from_bytes_if_needed
 
+log = create_logger(__name__)
+
 
 class McPostgreSQLStoreException(McKeyValueStoreException):
     """PostgreSQL key-value store exception."""
@@ -16,13 +20,23 @@ class PostgreSQLStore(KeyValueStore):
     # Default object compression method
     _DEFAULT_COMPRESSION_METHOD = KeyValueStore.Compression.GZIP
 
+    # Max. number of objects to upsert with a single query in store_contents()
+    __STORE_CONTENTS_CHUNK_SIZE = 100
+
     __slots__ = [
         '__table',
         '__compression_method',
+        '__zstd_dictionary',
     ]
 
-    def __init__(self, table: str, compression_method: KeyValueStore.Compression = _DEFAULT_COMPRESSION_METHOD):
-        """Constructor."""
+    def __init__(self,
+                 table: str,
+                 compression_method: KeyValueStore.Compression = _DEFAULT_COMPRESSION_METHOD,
+                 zstd_dictionary: Optional[bytes] = None):
+        """Constructor.
+
+        If "zstd_dictionary" is set (e.g. trained with train_zstd_dictionary()), it will be used to compress objects
+        with ZSTD compression method."""
 
         table = decode_object_from_bytes_if_needed(table)
 
@@ -36,25 +50,20 @@ class PostgreSQLStore(KeyValueStore):
         if not self._compression_method_is_valid(compression_method):
             raise McPostgreSQLStoreException("Unsupported compression method: %s" % compression_method)
 
+        if zstd_dictionary is not None:
+            try:
+                register_zstd_dictionary(zstd_dictionary)
+            except Exception as ex:
+                raise McPostgreSQLStoreException("Unable to register Zstandard dictionary: %s" % str(ex))
+
         self.__table = table
         self.__compression_method = compression_method
+        self.__zstd_dictionary = zstd_dictionary
 
-    def fetch_content(self, db: DatabaseHandler, object_id: int, object_path: str = None) -> bytes:
-        """Read object from PostgreSQL table."""
+    def __content_from_raw_data(self, object_id: int, raw_data: Union[bytes, memoryview, list]) -> bytes:
+        """Convert "raw_data" column's value to uncompressed content."""
 
-        object_id = self._prepare_object_id(object_id)
-
-        sql = "SELECT raw_data "
-        sql += "FROM %s " % self.__table  # interpolated by Python
-        sql += "WHERE object_id = %(object_id)s"  # interpolated by psycopg2
-
-        content = db.query(sql, {'object_id': object_id}).hash()
-
-        if content is None or len(content) == 0:
-            # Clients are expected to do content_exists() before attempting to fetch content that might not exist
-            raise McPostgreSQLStoreException("Object with ID %d was not found." % object_id)
-
-        content = content['raw_data']
+        content = raw_data
 
         # MC_REWRITE_TO_PYTHON: Perl database handler returns value as array of bytes
         if isinstance(content, list):
@@ -78,14 +87,66 @@ class PostgreSQLStore(KeyValueStore):
 
         return content
 
-    def store_content(self, db: DatabaseHandler, object_id: int, content: Union[str, bytes]) -> str:
-        """Write object to PostgreSQL table."""
+    def fetch_content(self, db: DatabaseHandler, object_id: int, object_path: str = None) -> bytes:
+        """Read object from PostgreSQL table."""
 
         object_id = self._prepare_object_id(object_id)
+
+        sql = "SELECT raw_data "
+        sql += "FROM %s " % self.__table  # interpolated by Python
+        sql += "WHERE object_id = %(object_id)s"  # interpolated by psycopg2
+
+        content = db.query(sql, {'object_id': object_id}).hash()
+
+        if content is None or len(content) == 0:
+            # Clients are expected to do content_exists() before attempting to fetch content that might not exist
+            raise McPostgreSQLStoreException("Object with ID %d was not found." % object_id)
+
+        return self.__content_from_raw_data(object_id=object_id, raw_data=content['raw_data'])
+
+    def fetch_contents(self,
+                       db: DatabaseHandler,
+                       object_ids: List[int],
+                       object_paths: Optional[Dict[int, str]] = None) -> Dict[int, Union[bytes, Exception]]:
+        """Read multiple objects from PostgreSQL table with a single query."""
+
+        object_ids = self._prepare_object_ids(object_ids)
+
+        if len(object_ids) == 0:
+            return {}
+
+        sql = "SELECT object_id, raw_data "
+        sql += "FROM %s " % self.__table  # interpolated by Python
+        sql += "WHERE object_id = ANY(%(object_ids)s)"  # interpolated by psycopg2
+
+        rows = db.query(sql, {'object_ids': object_ids}).hashes()
+        raw_data_by_object_id = {row['object_id']: row['raw_data'] for row in rows}
+
+        contents = {}
+        for object_id in object_ids:
+            try:
+                if object_id not in raw_data_by_object_id:
+                    raise McPostgreSQLStoreException("Object with ID %d was not found." % object_id)
+
+                contents[object_id] = self.__content_from_raw_data(
+                    object_id=object_id,
+                    raw_data=raw_data_by_object_id[object_id],
+                )
+
+            except Exception as ex:
+                contents[object_id] = ex
+
+        return contents
+
+    def __compress_content(self, object_id: int, content: Union[str, bytes]) -> bytes:
+        """Validate and compress content to be stored."""
+
         content = self._prepare_content(content)
 
         try:
-            content = self._compress_data_for_method(data=content, compression_method=self.__compression_method)
+            content = self._compress_data_for_method(data=content,
+                                                     compression_method=self.__compression_method,
+                                                     zstd_dictionary=self.__zstd_dictionary)
         except Exception as ex:
             raise McPostgreSQLStoreException("Unable to compress data for object ID %d: %s" % (object_id, str(ex),))
 
@@ -94,6 +155,14 @@ class PostgreSQLStore(KeyValueStore):
         if not isinstance(content, bytes):
             raise McPostgreSQLStoreException("Content is not bytes after compression for object ID %d" % object_id)
 
+        return content
+
+    def store_content(self, db: DatabaseHandler, object_id: int, content: Union[str, bytes]) -> str:
+        """Write object to PostgreSQL table."""
+
+        object_id = self._prepare_object_id(object_id)
+        content = self.__compress_content(object_id=object_id, content=content)
+
         sql = "INSERT INTO %s " % self.__table  # interpolated by Python
         sql += "(object_id, raw_data) "
         sql += "VALUES (%(object_id)s, %(raw_data)s) "  # interpolated by psycopg2
@@ -106,6 +175,76 @@ class PostgreSQLStore(KeyValueStore):
 
         return path
 
+    def store_contents(self,
+                       db: DatabaseHandler,
+                       contents: Dict[int, Union[str, bytes]]) -> Dict[int, Union[str, Exception]]:
+        """Write multiple objects to PostgreSQL table with multi-row upserts.
+
+        If a chunk fails to get upserted outside of a transaction, its objects get retried one by one to find out which
+        of them have failed; within a transaction, all objects of the failed chunk get reported as failed as the
+        transaction is aborted at that point anyway."""
+
+        contents = self._prepare_object_contents(contents)
+
+        path = 'postgresql:%s' % self.__table
+
+        paths = {}
+        compressed_contents = []
+
+        for object_id, content in contents.items():
+            try:
+                compressed_contents.append((object_id, self.__compress_content(object_id=object_id, content=content)))
+            except Exception as ex:
+                paths[object_id] = ex
+
+        for chunk_start in range(0, len(compressed_contents), self.__STORE_CONTENTS_CHUNK_SIZE):
+            chunk = compressed_contents[chunk_start:chunk_start + self.__STORE_CONTENTS_CHUNK_SIZE]
+
+            values = []
+            params = {}
+            for row_number, (object_id, content) in enumerate(chunk):
+                values.append("(%%(object_id_%d)s, %%(raw_data_%d)s)" % (row_number, row_number,))
+                params['object_id_%d' % row_number] = object_id
+                params['raw_data_%d' % row_number] = content
+
+            sql = "INSERT INTO %s " % self.__table  # interpolated by Python
+            sql += "(object_id, raw_data) "
+            sql += "VALUES %s " % ", ".join(values)  # interpolated by psycopg2
+            sql += "ON CONFLICT (object_id) DO UPDATE "
+            sql += "    SET raw_data = EXCLUDED.raw_data"
+
+            try:
+                db.query(sql, params)
+
+            except Exception as ex:
+
+                if db.in_transaction():
+                    for object_id, _ in chunk:
+                        paths[object_id] = McPostgreSQLStoreException(
+                            "Unable to store object ID %d: %s" % (object_id, str(ex),)
+                        )
+
+                else:
+                    log.warning("Unable to store %d objects at once, will store them one by one: %s" % (
+                        len(chunk), str(ex),
+                    ))
+                    for object_id, _ in chunk:
+                        try:
+                            paths[object_id] = self.store_content(
+                                db=db,
+                                object_id=object_id,
+                                content=contents[object_id],
+                            )
+                        except Exception as object_ex:
+                            paths[object_id] = object_ex
+
+            else:
+                for object_id, _ in chunk:
+                    paths[object_id] = path
+
+        # Return in input order
+        return {object_id: paths[object_id] for object_id in contents.keys()}
+
     def remove_content(self, db: DatabaseHandler, object_id: int, object_path: str = None) -> None:
         """Remove object from PostgreSQL table."""
 
@@ -122,7 +261,7 @@ class PostgreSQLStore(KeyValueStore):
 
         object_id = self._prepare_object_id(object_id)
 
-        sql = "SELECT 1"
+        sql = "SELECT 1 "
         sql += "FROM %s " % self.__table  # interpolated by Python
         sql += "WHERE object_id = %(object_id)s"  # interpolated by psycopg2
 
@@ -24,9 +24,12 @@ end points, but the results will not be stemmed or get their stop words removed.
 """
 
 import abc
+import multiprocessing
 import os
 import re
-from typing import Dict, List
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple
 
 from nltk import TweetTokenizer
 from sentence_splitter import SentenceSplitter
@@ -43,9 +46,111 @@ class McLanguageException(Exception):
     pass
 
 
+class StemCache(object):
+    """Thread-safe, size-bounded LRU cache of word -> stem."""
+
+    __slots__ = [
+        '__max_size',
+
+        # Word -> stem, least recently used first
+        '__stems',
+
+        '__hits',
+        '__misses',
+
+        '__lock',
+    ]
+
+    def __init__(self, max_size: int):
+        if max_size is None or int(max_size) < 1:
+            raise McLanguageException("Max. stem cache size must be positive.")
+
+        self.__max_size = int(max_size)
+        self.__stems = OrderedDict()
+        self.__hits = 0
+        self.__misses = 0
+        self.__lock = threading.Lock()
+
+    def stem_words(self, words: List[str], stem_uncached_words: Callable[[List[str]], List[str]]) -> List[str]:
+        """Return stems of words, stemming the ones that are not in the cache with stem_uncached_words()."""
+
+        stems = [None] * len(words)
+        uncached_indexes = []
+
+        with self.__lock:
+            for index, word in enumerate(words):
+                stem = self.__stems.get(word, None)
+                if stem is None:
+                    uncached_indexes.append(index)
+                else:
+                    self.__stems.move_to_end(word)
+                    stems[index] = stem
+
+            self.__hits += len(words) - len(uncached_indexes)
+            self.__misses += len(uncached_indexes)
+
+        if not uncached_indexes:
+            return stems
+
+        # Stem every uncached word only once
+        uncached_words = list(OrderedDict.fromkeys(words[index] for index in uncached_indexes))
+        uncached_stems = stem_uncached_words(uncached_words)
+
+        if len(uncached_stems) != len(uncached_words):
+            # Unable to tell which stem belongs to which word
+            log.warning("Stem count is not the same as word count; not caching stems of words: %s" % str(words))
+            return stem_uncached_words(words)
+
+        word_stems = dict(zip(uncached_words, uncached_stems))
+
+        for index in uncached_indexes:
+            stems[index] = word_stems[words[index]]
+
+        with self.__lock:
+            self.__stems.update(word_stems)
+            while len(self.__stems) > self.__max_size:
+                self.__stems.popitem(last=False)
+
+        return stems
+
+    def stats(self) -> Dict[str, float]:
+        """Return cache statistics: "hits", "misses", "size" and "hit_rate"."""
+        with self.__lock:
+            lookups = self.__hits + self.__misses
+            return {
+                'hits': self.__hits,
+                'misses': self.__misses,
+                'size': len(self.__stems),
+                'hit_rate': self.__hits / lookups if lookups else 0.0,
+            }
+
+
+# Lock for lazy initialization of language objects' stem caches
+_stem_cache_init_lock = threading.Lock()
+
+
+def _split_text_to_sentences_in_worker(language_code_and_text: Tuple[str, str]) -> List[str]:
+    """Split text to sentences in a split_texts_to_sentences() worker process."""
+
+    # Imported here because factory imports this module
+    from mediawords.languages.factory import LanguageFactory
+
+    language_code, text = language_code_and_text
+
+    lang = LanguageFactory.language_for_code(language_code)
+    if lang is None:
+        raise McLanguageException("Language '%s' is not enabled." % language_code)
+
+    return lang.split_text_to_sentences(text)
+
+
 class AbstractLanguage(object, metaclass=abc.ABCMeta):
     """Abstract language class. See doc/README.languages for instructions on how to add a new language."""
 
+    # Max. number of words to keep in the language's stem cache (news text follows Zipf's law, so a cache of a
+    # moderate size is able to serve most of the words)
+    _STEM_CACHE_SIZE = 100 * 1000
+
     @staticmethod
     @abc.abstractmethod
     def language_code() -> str:
@@ -89,11 +194,61 @@ class AbstractLanguage(object, metaclass=abc.ABCMeta):
         """
         raise NotImplementedError("Abstract method.")
 
+    def __stem_cache(self) -> StemCache:
+        """Return (lazy initialized) stem cache of the language object."""
+        stem_cache = getattr(self, '_AbstractLanguage__stem_cache_instance', None)
+        if stem_cache is None:
+            with _stem_cache_init_lock:
+                stem_cache = getattr(self, '_AbstractLanguage__stem_cache_instance', None)
+                if stem_cache is None:
+                    stem_cache = StemCache(max_size=self._STEM_CACHE_SIZE)
+                    self.__stem_cache_instance = stem_cache
+        return stem_cache
+
+    def _stem_words_with_cache(self,
+                               words: List[str],
+                               stem_uncached_words: Callable[[List[str]], List[str]]) -> List[str]:
+        """Return stems of words from the language's stem cache; stem the rest with stem_uncached_words().
+
+        stem_uncached_words() is expected to do all of the word normalization (and stem lowercasing) so that it can be
+        skipped for the cached words."""
+        return self.__stem_cache().stem_words(words=words, stem_uncached_words=stem_uncached_words)
+
+    def stem_cache_stats(self) -> Dict[str, float]:
+        """Return stem cache statistics: "hits", "misses", "size" and "hit_rate"."""
+        return self.__stem_cache().stats()
+
     @abc.abstractmethod
     def split_text_to_sentences(self, text: str) -> List[str]:
         """Return a list of sentences for a story text (tokenize text into sentences)."""
         raise NotImplementedError("Abstract method.")
 
+    def split_texts_to_sentences(self, texts: List[str], processes: int = 1) -> List[List[str]]:
+        """Return a list of sentences for every story text in a list.
+
+        If "processes" is more than 1, texts get split in a pool of that many worker processes (splitting is CPU bound,
+        so it's worth it for big batches only)."""
+
+        texts = decode_object_from_bytes_if_needed(texts)
+
+        if texts is None:
+            raise McLanguageException("Texts is None.")
+
+        if processes is None or int(processes) <= 1 or len(texts) < 2:
+            return [self.split_text_to_sentences(text) for text in texts]
+
+        processes = min(int(processes), len(texts))
+
+        # Workers get language by its code as language objects might not be picklable
+        language_code = self.language_code()
+
+        with multiprocessing.Pool(processes=processes) as pool:
+            return pool.map(
+                _split_text_to_sentences_in_worker,
+                [(language_code, text) for text in texts],
+                chunksize=max(1, len(texts) // (processes * 4)),
+            )
+
     @abc.abstractmethod
     def split_sentence_to_words(self, sentence: str) -> List[str]:
         """Return a list of words for a sentence (tokenize sentence into words).
@@ -142,6 +297,20 @@ class SentenceSplitterMixIn(AbstractLanguage, metaclass=abc.ABCMeta):
     # Max. text length to try to split into sentences
     __MAX_TEXT_LENGTH = 1024 * 1024
 
+    # Single line break (only "\n\n", not a single "\n", denotes the end of sentence)
+    __SINGLE_LINE_BREAK_REGEX = re.compile('([^\n])\n([^\n])')
+
+    # Asterisk from list
+    __LIST_ASTERISK_LINE_REGEX = re.compile(r"\n\s\*\n")
+
+    # Multiple spaces
+    __MULTIPLE_SPACES_REGEX = re.compile(r" {2,}")
+
+    # Missing space after sentence ending period (has a hardcoded lower limit of characters because otherwise it breaks
+    # Portuguese "a.C.." abbreviations and such); anchored to the start of the lowercase run so that the regex doesn't
+    # get retried from every letter of a word
+    __MISSING_SPACE_AFTER_PERIOD_REGEX = re.compile(r"(?<![a-z])([a-z]{2,})\.([A-Z][a-z]+)")
+
     def __init__(self):
         """Constructor."""
         super().__init__()
@@ -149,6 +318,39 @@ class SentenceSplitterMixIn(AbstractLanguage, metaclass=abc.ABCMeta):
         # SentenceSplitter instance (lazy initialized)
         self.__sentence_splitter = None
 
+    @classmethod
+    def __normalize_text(cls, text: str) -> str:
+        """Normalize text before splitting it into sentences.
+
+        Literal patterns get replaced with str.replace() which is a lot faster than regular expressions."""
+
+        text = cls.__SINGLE_LINE_BREAK_REGEX.sub(r"\1 \2", text)
+
+        # Remove asterisks from lists
+        text = text.replace("  *", " ")
+        text = cls.__LIST_ASTERISK_LINE_REGEX.sub("\n\n", text)
+        text = text.replace("\n\n\n*", "\n\n")
+
+        text = text.replace("\n\n", "\n")
+
+        # Replace tabs and non-breaking spaces with normal spaces
+        text = text.replace("\t", " ").replace("\xa0", " ")
+
+        text = cls.__MULTIPLE_SPACES_REGEX.sub(" ", text)
+
+        # The above regexp and HTML stripping often leave a space before the period at the end of a sentence
+        text = text.replace(" .", ".")
+
+        text = cls.__MISSING_SPACE_AFTER_PERIOD_REGEX.sub(r"\1. \2", text)
+
+        # Replace Unicode's "…" with "..."
+        text = text.replace("…", "...")
+
+        # Trim whitespace from start / end of the whole string
+        text = text.strip()
+
+        return text
+
     def split_text_to_sentences(self, text: str) -> List[str]:
         """Splits text into sentences with "sentence_splitter" module.
 
@@ -174,37 +376,7 @@ class SentenceSplitterMixIn(AbstractLanguage, metaclass=abc.ABCMeta):
         if len(text) > self.__MAX_TEXT_LENGTH:
             text = text[:self.__MAX_TEXT_LENGTH]
 
-        # Only "\n\n" (not a single "\n") denotes the end of sentence, so remove single line breaks
-        text = re.sub('([^\n])\n([^\n])', r"\1 \2", text, flags=re.DOTALL)
-
-        # Remove asterisks from lists
-        text = re.sub(r" {2}\*", " ", text, flags=re.DOTALL)
-
-        text = re.sub(r"\n\s\*\n", "\n\n", text, flags=re.DOTALL)
-        text = re.sub(r"\n\n\n\*", "\n\n", text, flags=re.DOTALL)
-        text = re.sub(r"\n\n", "\n", text, flags=re.DOTALL)
-
-        # Replace tabs with spaces
-        text = re.sub(r"\t", " ", text, flags=re.DOTALL)
-
-        # Replace non-breaking spaces with normal spaces
-        text = re.sub(r"\xa0", " ", text, flags=re.DOTALL)
-
-        # Replace multiple spaces with a single space
-        text = re.sub(" +", " ", text, flags=re.DOTALL)
-
-        # The above regexp and HTML stripping often leave a space before the period at the end of a sentence
-        text = re.sub(r" +\.", ".", text, flags=re.DOTALL)
-
-        # We see lots of cases of missing spaces after sentence ending periods (has a hardcoded lower limit of
-        # characters because otherwise it breaks Portuguese "a.C.." abbreviations and such)
-        text = re.sub(r"([a-z]{2,})\.([A-Z][a-z]+)", r"\1. \2", text, flags=re.DOTALL)
-
-        # Replace Unicode's "…" with "..."
-        text = text.replace("…", "...")
-
-        # Trim whitespace from start / end of the whole string
-        text = text.strip()
+        text = self.__normalize_text(text)
 
         # FIXME: fix "bla bla... yada yada"? is it two sentences?
         # FIXME: fix "text . . some more text."?
@@ -242,11 +414,6 @@ class PyStemmerMixIn(AbstractLanguage, metaclass=abc.ABCMeta):
         language_code = self.language_code()
         words = decode_object_from_bytes_if_needed(words)
 
-        # Normalize apostrophe so that "it’s" and "it's" get treated identically (it's being done in
-        # _tokenize_with_spaces() too but let's not assume that all tokens that are to be stemmed go through sentence
-        # tokenization first)
-        words = [word.replace("’", "'") for word in words]
-
         if language_code is None:
             raise McLanguageException("Language code is None.")
 
@@ -263,6 +430,16 @@ class PyStemmerMixIn(AbstractLanguage, metaclass=abc.ABCMeta):
                     "Unable to initialize PyStemmer for language '%s': %s" % (language_code, str(ex),)
                 )
 
+        return self._stem_words_with_cache(words=words, stem_uncached_words=self.__stem_uncached_words)
+
+    def __stem_uncached_words(self, words: List[str]) -> List[str]:
+        """Stem words that are not in the stem cache."""
+
+        # Normalize apostrophe so that "it’s" and "it's" get treated identically (it's being done in
+        # _tokenize_with_spaces() too but let's not assume that all tokens that are to be stemmed go through sentence
+        # tokenization first)
+        words = [word.replace("’", "'") for word in words]
+
         stems = self.__pystemmer.stemWords(words)
 
         if len(words) != len(stems):
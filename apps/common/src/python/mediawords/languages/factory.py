@@ -1,27 +1,9 @@
-from typing import Union
-
-from mediawords.languages import AbstractLanguage
-from mediawords.languages.ca import CatalanLanguage
-from mediawords.languages.da import DanishLanguage
-from mediawords.languages.de import GermanLanguage
-from mediawords.languages.en import EnglishLanguage
-from mediawords.languages.es import SpanishLanguage
-from mediawords.languages.fi import FinnishLanguage
-from mediawords.languages.fr import FrenchLanguage
-from mediawords.languages.ha import HausaLanguage
-from mediawords.languages.hi import HindiLanguage
-from mediawords.languages.hu import HungarianLanguage
-from mediawords.languages.it import ItalianLanguage
-from mediawords.languages.ja import JapaneseLanguage
-from mediawords.languages.lt import LithuanianLanguage
-from mediawords.languages.nl import DutchLanguage
-from mediawords.languages.no import NorwegianLanguage
-from mediawords.languages.pt import PortugueseLanguage
-from mediawords.languages.ro import RomanianLanguage
-from mediawords.languages.ru import RussianLanguage
-from mediawords.languages.sv import SwedishLanguage
-from mediawords.languages.tr import TurkishLanguage
-from mediawords.languages.zh import ChineseLanguage
+import gc
+import importlib
+import threading
+from typing import List, Optional, Union
+
+from mediawords.languages import AbstractLanguage, McLanguageException
 from mediawords.util.log import create_logger
 from mediawords.util.perl import decode_object_from_bytes_if_needed
 
@@ -29,36 +11,46 @@ log = create_logger(__name__)
 
 
 class LanguageFactory(object):
-    """Language instance factory."""
+    """Language instance factory.
+
+    Language modules (some of which load large dictionaries, e.g. MeCab for Japanese or jieba for Chinese) get imported
+    only when a language object is requested for the first time, or when prewarm() gets called."""
 
-    # Supported + enabled language codes and their corresponding classes
+    # Supported + enabled language codes and their corresponding modules + classes
     __ENABLED_LANGUAGES = {
-        CatalanLanguage.language_code(): CatalanLanguage,
-        ChineseLanguage.language_code(): ChineseLanguage,
-        DanishLanguage.language_code(): DanishLanguage,
-        DutchLanguage.language_code(): DutchLanguage,
-        EnglishLanguage.language_code(): EnglishLanguage,
-        FinnishLanguage.language_code(): FinnishLanguage,
-        FrenchLanguage.language_code(): FrenchLanguage,
-        GermanLanguage.language_code(): GermanLanguage,
-        HausaLanguage.language_code(): HausaLanguage,
-        HindiLanguage.language_code(): HindiLanguage,
-        HungarianLanguage.language_code(): HungarianLanguage,
-        ItalianLanguage.language_code(): ItalianLanguage,
-        JapaneseLanguage.language_code(): JapaneseLanguage,
-        LithuanianLanguage.language_code(): LithuanianLanguage,
-        NorwegianLanguage.language_code(): NorwegianLanguage,
-        PortugueseLanguage.language_code(): PortugueseLanguage,
-        RomanianLanguage.language_code(): RomanianLanguage,
-        RussianLanguage.language_code(): RussianLanguage,
-        SpanishLanguage.language_code(): SpanishLanguage,
-        SwedishLanguage.language_code(): SwedishLanguage,
-        TurkishLanguage.language_code(): TurkishLanguage,
+        'ca': ('mediawords.languages.ca', 'CatalanLanguage'),
+        'da': ('mediawords.languages.da', 'DanishLanguage'),
+        'de': ('mediawords.languages.de', 'GermanLanguage'),
+        'en': ('mediawords.languages.en', 'EnglishLanguage'),
+        'es': ('mediawords.languages.es', 'SpanishLanguage'),
+        'fi': ('mediawords.languages.fi', 'FinnishLanguage'),
+        'fr': ('mediawords.languages.fr', 'FrenchLanguage'),
+        'ha': ('mediawords.languages.ha', 'HausaLanguage'),
+        'hi': ('mediawords.languages.hi', 'HindiLanguage'),
+        'hu': ('mediawords.languages.hu', 'HungarianLanguage'),
+        'it': ('mediawords.languages.it', 'ItalianLanguage'),
+        'ja': ('mediawords.languages.ja', 'JapaneseLanguage'),
+        'lt': ('mediawords.languages.lt', 'LithuanianLanguage'),
+        'nl': ('mediawords.languages.nl', 'DutchLanguage'),
+        'no': ('mediawords.languages.no', 'NorwegianLanguage'),
+        'pt': ('mediawords.languages.pt', 'PortugueseLanguage'),
+        'ro': ('mediawords.languages.ro', 'RomanianLanguage'),
+        'ru': ('mediawords.languages.ru', 'RussianLanguage'),
+        'sv': ('mediawords.languages.sv', 'SwedishLanguage'),
+        'tr': ('mediawords.languages.tr', 'TurkishLanguage'),
+        'zh': ('mediawords.languages.zh', 'ChineseLanguage'),
     }
 
+    # Default language code (English)
+    __DEFAULT_LANGUAGE_CODE = 'en'
+
     # Static language object instances ({'language code': language object, ... })
     __language_instances = dict()
 
+    # Lock for importing language modules and creating their instances; reentrant because importing a module might
+    # end up requesting some other language
+    __language_instances_lock = threading.RLock()
+
     @staticmethod
     def enabled_languages() -> set:
         """Return set of enabled languages (their codes)."""
@@ -76,6 +68,23 @@ class LanguageFactory(object):
 
         return language_code in LanguageFactory.__ENABLED_LANGUAGES
 
+    @staticmethod
+    def __create_language(language_code: str) -> AbstractLanguage:
+        """Import language module and create language object."""
+
+        module_name, class_name = LanguageFactory.__ENABLED_LANGUAGES[language_code]
+
+        log.debug("Loading language '%s' from %s..." % (language_code, module_name))
+
+        try:
+            module = importlib.import_module(module_name)
+            language_class = getattr(module, class_name)
+            language = language_class()
+        except Exception as ex:
+            raise McLanguageException("Unable to load language '%s': %s" % (language_code, str(ex),))
+
+        return language
+
     @staticmethod
     def language_for_code(language_code: str) -> Union[AbstractLanguage, None]:
         """Return language module instance for the language code, None if language is not supported."""
@@ -85,17 +94,53 @@ class LanguageFactory(object):
         if not LanguageFactory.language_is_enabled(language_code):
             return None
 
-        if language_code not in LanguageFactory.__language_instances:
-            language_class = LanguageFactory.__ENABLED_LANGUAGES[language_code]
-            language = language_class()
-            LanguageFactory.__language_instances[language_code] = language
+        language = LanguageFactory.__language_instances.get(language_code, None)
+        if language is None:
+            with LanguageFactory.__language_instances_lock:
+                language = LanguageFactory.__language_instances.get(language_code, None)
+                if language is None:
+                    language = LanguageFactory.__create_language(language_code)
+                    LanguageFactory.__language_instances[language_code] = language
+
+        return language
+
+    @staticmethod
+    def loaded_languages() -> set:
+        """Return set of languages (their codes) that have been loaded already."""
+        return set(LanguageFactory.__language_instances.keys())
+
+    @staticmethod
+    def prewarm(language_codes: Optional[List[str]] = None, freeze: bool = False) -> None:
+        """Load languages upfront instead of on first use.
+
+        Loads languages with the provided codes, or every enabled language if "language_codes" is None.
+
+        To be called by a parent process before forking off workers so that the (fairly big) dictionaries get loaded
+        once and then shared between children copy-on-write. If "freeze" is True, objects allocated so far get moved
+        out of the garbage collector's reach (gc.freeze()) so that collections in the children don't end up writing
+        to, and thus copying, the shared memory pages."""
+
+        language_codes = decode_object_from_bytes_if_needed(language_codes)
+
+        if language_codes is None:
+            language_codes = sorted(LanguageFactory.__ENABLED_LANGUAGES.keys())
+
+        for language_code in language_codes:
+            if not LanguageFactory.language_is_enabled(language_code):
+                raise McLanguageException("Language '%s' is not enabled." % str(language_code))
+
+            LanguageFactory.language_for_code(language_code)
+
+        log.info("Prewarmed languages: %s" % ', '.join(sorted(LanguageFactory.loaded_languages())))
 
-        return LanguageFactory.__language_instances[language_code]
+        if freeze:
+            gc.collect()
+            gc.freeze()
 
     @staticmethod
     def default_language_code() -> str:
         """Return default language code ('en' for English)."""
-        return EnglishLanguage.language_code()
+        return LanguageFactory.__DEFAULT_LANGUAGE_CODE
 
     @staticmethod
     def default_language() -> AbstractLanguage:
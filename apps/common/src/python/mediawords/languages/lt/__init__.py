@@ -40,6 +40,11 @@ class LithuanianLanguage(SpaceSeparatedWordsMixIn, SentenceSplitterMixIn, StopWo
         if words is None:
             raise McLanguageException("Words to stem is None.")
 
+        return self._stem_words_with_cache(words=words, stem_uncached_words=self.__stem_uncached_words)
+
+    def __stem_uncached_words(self, words: List[str]) -> List[str]:
+        """Stem words that are not in the stem cache."""
+
         stems = self.__lt_stemmer.stemWords(words)
 
         if len(words) != len(stems):
@@ -1,3 +1,4 @@
+import copy
 import random
 import re
 
@@ -371,6 +372,8 @@ def add_content_to_test_story(db: DatabaseHandler, story: dict, feed: dict) -> d
     story = decode_object_from_bytes_if_needed(story)
     feed = decode_object_from_bytes_if_needed(feed)
 
+    story = story.copy()  # To be able to safely modify it
+
     content_language_code = None
     if 'content' in story:
         content = story['content']
@@ -461,6 +464,8 @@ def add_content_to_test_story_stack(db: DatabaseHandler, story_stack: dict) -> d
 
     story_stack = decode_object_from_bytes_if_needed(story_stack)
 
+    story_stack = copy.deepcopy(story_stack)  # To be able to safely modify nested feeds and stories
+
     log.debug("Adding content to test story stack ...")
 
     for medium_key, medium in story_stack.items():
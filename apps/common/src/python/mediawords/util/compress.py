@@ -1,7 +1,12 @@
 import bz2
 import gzip as gzip_lib
 import os
-from typing import Union
+import threading
+from functools import lru_cache
+from typing import Dict, List, Union
+
+import lz4.frame as lz4_frame
+import zstandard
 
 from mediawords.util.log import create_logger
 from mediawords.util.perl import decode_object_from_bytes_if_needed
@@ -34,6 +39,47 @@ class McGunzipException(McCompressException):
     pass
 
 
+class McZstdException(McCompressException):
+    """zstd() exception."""
+    pass
+
+
+class McUnzstdException(McCompressException):
+    """unzstd() exception."""
+    pass
+
+
+class McLz4Exception(McCompressException):
+    """lz4() exception."""
+    pass
+
+
+class McUnlz4Exception(McCompressException):
+    """unlz4() exception."""
+    pass
+
+
+class McZstdDictionaryException(McCompressException):
+    """Zstandard dictionary training / registration exception."""
+    pass
+
+
+# Zstandard compression level (3 is zstd's default, and it's both faster and better than gzip's level 9)
+__ZSTD_COMPRESSION_LEVEL = 3
+
+# Default size of trained Zstandard dictionary (zstd's own default)
+__ZSTD_DICTIONARY_SIZE = 110 * 1024
+
+# Dictionary ID -> Zstandard dictionary to decompress the data compressed with such a dictionary
+__zstd_dictionaries: Dict[int, zstandard.ZstdCompressionDict] = {}
+
+__zstd_dictionaries_lock = threading.Lock()
+
+# Per-thread Zstandard compressors / decompressors (they're not thread-safe, but are expensive to create, especially
+# with a dictionary)
+__zstd_thread_local = threading.local()
+
+
 def bzip2(data: Union[str, bytes]) -> bytes:
     """Bzip2 data."""
 
@@ -136,3 +182,214 @@ def gunzip(data: bytes) -> bytes:
         raise McGunzipException("Gunzipped data is not bytes.")
 
     return gunzipped_data
+
+
+def train_zstd_dictionary(samples: List[Union[str, bytes]], dictionary_size: int = __ZSTD_DICTIONARY_SIZE) -> bytes:
+    """Train Zstandard dictionary on a sample of data (e.g. raw HTML of a single media source), return dictionary.
+
+    Dictionary has to be registered with register_zstd_dictionary() in every process that is going to decompress data
+    compressed with it."""
+
+    if samples is None:
+        raise McZstdDictionaryException("Samples is None.")
+
+    samples = [sample.encode('utf-8') if isinstance(sample, str) else sample for sample in samples]
+
+    for sample in samples:
+        if not isinstance(sample, bytes):
+            raise McZstdDictionaryException("Sample is not str or bytes: %s" % str(sample))
+
+    try:
+        dictionary = zstandard.train_dictionary(dictionary_size, samples)
+    except Exception as ex:
+        raise McZstdDictionaryException("Unable to train Zstandard dictionary: %s" % str(ex))
+
+    return dictionary.as_bytes()
+
+
+def register_zstd_dictionary(dictionary: bytes) -> int:
+    """Register Zstandard dictionary for decompressing data that was compressed with it, return dictionary ID."""
+
+    if dictionary is None:
+        raise McZstdDictionaryException("Dictionary is None.")
+
+    if not isinstance(dictionary, bytes):
+        raise McZstdDictionaryException("Dictionary is not bytes.")
+
+    try:
+        compression_dictionary = zstandard.ZstdCompressionDict(dictionary)
+        dictionary_id = compression_dictionary.dict_id()
+    except Exception as ex:
+        raise McZstdDictionaryException("Unable to load Zstandard dictionary: %s" % str(ex))
+
+    if not dictionary_id:
+        raise McZstdDictionaryException("Dictionary doesn't have an ID.")
+
+    with __zstd_dictionaries_lock:
+        __zstd_dictionaries[dictionary_id] = compression_dictionary
+
+    return dictionary_id
+
+
+@lru_cache(maxsize=64)
+def __zstd_dictionary_id(dictionary: bytes) -> int:
+    """Register dictionary for compression and decompression once, return dictionary ID."""
+    return register_zstd_dictionary(dictionary)
+
+
+def __zstd_compressor(dictionary_id: int) -> zstandard.ZstdCompressor:
+    """Return current thread's compressor for dictionary ID (0 for no dictionary)."""
+
+    compressors = getattr(__zstd_thread_local, 'compressors', None)
+    if compressors is None:
+        compressors = __zstd_thread_local.compressors = {}
+
+    compressor = compressors.get(dictionary_id, None)
+    if compressor is None:
+        compression_dictionary = None
+        if dictionary_id:
+            with __zstd_dictionaries_lock:
+                compression_dictionary = __zstd_dictionaries[dictionary_id]
+        compressor = zstandard.ZstdCompressor(level=__ZSTD_COMPRESSION_LEVEL, dict_data=compression_dictionary)
+        compressors[dictionary_id] = compressor
+
+    return compressor
+
+
+def __zstd_decompressor(dictionary_id: int) -> zstandard.ZstdDecompressor:
+    """Return current thread's decompressor for dictionary ID (0 for no dictionary)."""
+
+    decompressors = getattr(__zstd_thread_local, 'decompressors', None)
+    if decompressors is None:
+        decompressors = __zstd_thread_local.decompressors = {}
+
+    decompressor = decompressors.get(dictionary_id, None)
+    if decompressor is None:
+        compression_dictionary = None
+        if dictionary_id:
+            with __zstd_dictionaries_lock:
+                compression_dictionary = __zstd_dictionaries.get(dictionary_id, None)
+            if compression_dictionary is None:
+                raise McUnzstdException("Zstandard dictionary with ID %d is not registered." % dictionary_id)
+        decompressor = zstandard.ZstdDecompressor(dict_data=compression_dictionary)
+        decompressors[dictionary_id] = decompressor
+
+    return decompressor
+
+
+def zstd(data: Union[str, bytes], dictionary: bytes = None) -> bytes:
+    """Compress data with Zstandard, optionally using a dictionary (which also gets registered for decompression)."""
+
+    if data is None:
+        raise McZstdException("Data is None.")
+
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+
+    if not isinstance(data, bytes):
+        raise McZstdException("Data is not str or bytes: %s" % str(data))
+
+    dictionary_id = 0
+    if dictionary is not None:
+        try:
+            dictionary_id = __zstd_dictionary_id(dictionary)
+        except McZstdDictionaryException as ex:
+            raise McZstdException("Unable to register dictionary: %s" % str(ex))
+
+    try:
+        zstd_data = __zstd_compressor(dictionary_id).compress(data)
+    except Exception as ex:
+        raise McZstdException("Unable to zstd data: %s" % str(ex))
+
+    if zstd_data is None:
+        raise McZstdException("Zstd data is None.")
+
+    if not isinstance(zstd_data, bytes):
+        raise McZstdException("Zstd data is not bytes.")
+
+    return zstd_data
+
+
+def unzstd(data: bytes) -> bytes:
+    """Decompress Zstandard data; dictionary that the data was compressed with (if any) has to be registered."""
+
+    if data is None:
+        raise McUnzstdException("Data is None.")
+
+    if not isinstance(data, bytes):
+        raise McUnzstdException("Data is not bytes: %s" % str(data))
+
+    if len(data) == 0:
+        raise McUnzstdException("Data is empty (no way an empty string is a valid Zstandard frame).")
+
+    try:
+        dictionary_id = zstandard.get_frame_parameters(data).dict_id
+    except Exception as ex:
+        raise McUnzstdException("Unable to read Zstandard frame parameters: %s" % str(ex))
+
+    decompressor = __zstd_decompressor(dictionary_id)
+
+    try:
+        unzstd_data = decompressor.decompress(data)
+    except Exception as ex:
+        raise McUnzstdException("Unable to unzstd data: %s" % str(ex))
+
+    if unzstd_data is None:
+        raise McUnzstdException("Unzstd data is None.")
+
+    if not isinstance(unzstd_data, bytes):
+        raise McUnzstdException("Unzstd data is not bytes.")
+
+    return unzstd_data
+
+
+def lz4(data: Union[str, bytes]) -> bytes:
+    """Compress data with LZ4 (frame format)."""
+
+    if data is None:
+        raise McLz4Exception("Data is None.")
+
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+
+    if not isinstance(data, bytes):
+        raise McLz4Exception("Data is not str or bytes: %s" % str(data))
+
+    try:
+        lz4_data = lz4_frame.compress(data, store_size=True)
+    except Exception as ex:
+        raise McLz4Exception("Unable to lz4 data: %s" % str(ex))
+
+    if lz4_data is None:
+        raise McLz4Exception("LZ4 data is None.")
+
+    if not isinstance(lz4_data, bytes):
+        raise McLz4Exception("LZ4 data is not bytes.")
+
+    return lz4_data
+
+
+def unlz4(data: bytes) -> bytes:
+    """Decompress LZ4 (frame format) data."""
+
+    if data is None:
+        raise McUnlz4Exception("Data is None.")
+
+    if not isinstance(data, bytes):
+        raise McUnlz4Exception("Data is not bytes: %s" % str(data))
+
+    if len(data) == 0:
+        raise McUnlz4Exception("Data is empty (no way an empty string is a valid LZ4 frame).")
+
+    try:
+        unlz4_data = lz4_frame.decompress(data)
+    except Exception as ex:
+        raise McUnlz4Exception("Unable to unlz4 data: %s" % str(ex))
+
+    if unlz4_data is None:
+        raise McUnlz4Exception("Unlz4 data is None.")
+
+    if not isinstance(unlz4_data, bytes):
+        raise McUnlz4Exception("Unlz4 data is not bytes.")
+
+    return unlz4_data
@@ -192,6 +192,27 @@ class DownloadStorageConfig(object):
             value = 0
         return bool(int(value))
 
+    @staticmethod
+    def compression_method() -> str:
+        """Compression method to store new downloads with ("gzip", "bzip2", "zstd", "lz4" or "none").
+
+        Downloads stored with any other compression method can still be read."""
+        value = env_value('MC_DOWNLOADS_COMPRESSION_METHOD', required=False, allow_empty_string=True)
+        if not value:
+            value = 'gzip'
+        value = value.strip().lower()
+        if value not in {'gzip', 'bzip2', 'zstd', 'lz4', 'none'}:
+            raise McConfigException("Unsupported download compression method: %s" % value)
+        return value
+
+    @staticmethod
+    def memory_cache_size() -> int:
+        """Max. size of per-process in-memory cache of fetched downloads (in bytes); 0 if it's disabled."""
+        value = env_value('MC_DOWNLOADS_MEMORY_CACHE_MB', required=False, allow_empty_string=True)
+        if not value:
+            value = 0
+        return int(value) * 1024 * 1024
+
 
 class AuthenticatedDomain(object):
     """Single authenticated domain."""
@@ -320,6 +341,38 @@ class UserAgentConfig(object):
             value = 1
         return int(value)
 
+    @staticmethod
+    def parallel_get_per_domain_requests() -> int:
+        """Max. number of requests to a single domain per per-domain timeout."""
+        value = env_value('MC_USERAGENT_PARALLEL_GET_PER_DOMAIN_REQUESTS', required=False)
+        if not value:
+            value = 5
+        return int(value)
+
+    @staticmethod
+    def http_cache_directory() -> Optional[str]:
+        """Directory to cache HTTP responses in; None if HTTP cache is disabled."""
+        value = env_value('MC_USERAGENT_HTTP_CACHE_DIR', required=False, allow_empty_string=True)
+        if not value:
+            value = None
+        return value
+
+    @staticmethod
+    def http_cache_max_size() -> int:
+        """Max. total size of cached HTTP responses, in bytes."""
+        value = env_value('MC_USERAGENT_HTTP_CACHE_MAX_SIZE_MB', required=False)
+        if not value:
+            value = 1024
+        return int(value) * 1024 * 1024
+
+    @staticmethod
+    def http_cache_ttl() -> int:
+        """Max. age of cached HTTP responses, in seconds."""
+        value = env_value('MC_USERAGENT_HTTP_CACHE_TTL', required=False)
+        if not value:
+            value = 7 * 24 * 60 * 60
+        return int(value)
+
 
 class CommonConfig(object):
     """Global configuration (shared by all the apps)."""
@@ -362,6 +415,24 @@ class CommonConfig(object):
             value = 'info@mediacloud.org'
         return value
 
+    @staticmethod
+    def job_metrics_port() -> Optional[int]:
+        """Port to serve job worker metrics on (in Prometheus' text format); None if metrics server is disabled."""
+        value = env_value('MC_JOB_METRICS_PORT', required=False, allow_empty_string=True)
+        if not value:
+            return None
+        return int(value)
+
+    @staticmethod
+    def prewarm_languages() -> Optional[List[str]]:
+        """Language codes to load before starting job workers; empty list if none, None if all enabled languages."""
+        value = env_value('MC_LANGUAGES_PREWARM', required=False, allow_empty_string=True)
+        if not value:
+            return []
+        if value.strip().lower() == 'all':
+            return None
+        return [code.strip() for code in value.split(',') if code.strip()]
+
     @staticmethod
     def solr_url() -> str:
         """Solr server URL."""
@@ -1,4 +1,6 @@
-from typing import Dict
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 
 import cld2
 
@@ -11,6 +13,37 @@ __RELIABLE_IDENTIFICATION_MIN_TEXT_LENGTH = 10
 # Don't process strings longer than the following length
 __MAX_TEXT_LENGTH = 1024 * 1024
 
+# Max. number of sentences to keep identified languages of (for repeated boilerplate sentences)
+__SENTENCE_LANGUAGE_CACHE_SIZE = 10 * 1000
+
+# Don't cache identified languages of sentences longer than the following length
+__MAX_CACHED_SENTENCE_LENGTH = 1024
+
+# Language code -> regex that matches a letter that's *not* in a script used only by that language; if a sentence has
+# no such letters, there's no need to run it through CLD to find out its language
+__SINGLE_LANGUAGE_SCRIPT_NON_LETTER_REGEXES = {
+    # Greek
+    'el': re.compile(r'[^\W\d_\u0370-\u03FF\u1F00-\u1FFF]'),
+
+    # Armenian
+    'hy': re.compile(r'[^\W\d_\u0530-\u058F]'),
+
+    # Japanese (kanji are shared with Chinese, so also kana are required, see __JAPANESE_KANA_REGEX)
+    'ja': re.compile(r'[^\W\d_\u3040-\u30FF\u31F0-\u31FF\u3400-\u4DBF\u4E00-\u9FFF\uFF66-\uFF9F]'),
+
+    # Georgian
+    'ka': re.compile(r'[^\W\d_\u10A0-\u10FF]'),
+
+    # Korean
+    'ko': re.compile(r'[^\W\d_\u1100-\u11FF\u3130-\u318F\uAC00-\uD7AF]'),
+
+    # Thai
+    'th': re.compile(r'[^\W\d_\u0E00-\u0E7F]'),
+}
+
+# Hiragana / katakana
+__JAPANESE_KANA_REGEX = re.compile(r'[\u3040-\u30FF\u31F0-\u31FF\uFF66-\uFF9F]')
+
 log = create_logger(__name__)
 
 
@@ -107,24 +140,82 @@ def identification_would_be_reliable(text: str) -> bool:
     text = __recode_utf8_string(text)
 
     # Not enough letters as opposed to non-letters?
-    word_character_count = 0
-    digit_count = 0
-    underscore_count = 0
-    for character in text:
-        if character.isalpha():
-            word_character_count += 1
-        if character.isdigit():
-            digit_count += 1
-        if character == '_':
-            underscore_count += 1
-
-    letter_count = word_character_count - digit_count - underscore_count
-    if letter_count < __RELIABLE_IDENTIFICATION_MIN_TEXT_LENGTH:
+    if __letter_count(text) < __RELIABLE_IDENTIFICATION_MIN_TEXT_LENGTH:
+        return False
+
+    return True
+
+
+def __letter_count(text: str) -> int:
+    """Return number of word characters minus digits and underscores."""
+    word_character_count = sum(map(str.isalpha, text))
+    digit_count = sum(map(str.isdigit, text))
+    underscore_count = text.count('_')
+    return word_character_count - digit_count - underscore_count
+
+
+@lru_cache(maxsize=__SENTENCE_LANGUAGE_CACHE_SIZE)
+def __cached_language_code_for_sentence(sentence: str) -> str:
+    return language_code_for_text(sentence)
+
+
+def __sentence_is_in_single_language_script(sentence: str, language_code: str) -> bool:
+    """Return True if all letters of the sentence are in a script that's used only by the language."""
+    non_letter_regex = __SINGLE_LANGUAGE_SCRIPT_NON_LETTER_REGEXES.get(language_code, None)
+    if non_letter_regex is None:
+        return False
+
+    if non_letter_regex.search(sentence):
+        return False
+
+    if language_code == 'ja' and not __JAPANESE_KANA_REGEX.search(sentence):
         return False
 
     return True
 
 
+def language_codes_for_sentences(sentences: List[str],
+                                 story_language_code: Optional[str] = None) -> List[Tuple[str, bool]]:
+    """Identify languages of a list of sentences.
+
+    Sentences that are long enough for the identification to be reliable and are written in a script that's used only
+    by the story's language (e.g. Greek or Korean) don't get passed to CLD. Identified languages of short sentences get
+    cached so that repeated (boilerplate) sentences get identified only once.
+
+    :param sentences: Sentences that should be identified
+    :param story_language_code: Language code of the whole story that the sentences are from (if known)
+    :return: List of (language code as returned by language_code_for_text(), whether identification would be
+             reliable as returned by identification_would_be_reliable()) tuples, one for every sentence
+    """
+    sentences = decode_object_from_bytes_if_needed(sentences)
+    story_language_code = decode_object_from_bytes_if_needed(story_language_code)
+
+    if sentences is None:
+        return []
+
+    results = []
+
+    for sentence in sentences:
+
+        is_reliable = identification_would_be_reliable(text=sentence)
+
+        if is_reliable and story_language_code and __sentence_is_in_single_language_script(
+                sentence=sentence,
+                language_code=story_language_code,
+        ) and language_is_supported(story_language_code):
+            sentence_language_code = story_language_code
+
+        elif sentence and len(sentence) <= __MAX_CACHED_SENTENCE_LENGTH:
+            sentence_language_code = __cached_language_code_for_sentence(sentence)
+
+        else:
+            sentence_language_code = language_code_for_text(sentence)
+
+        results.append((sentence_language_code, is_reliable,))
+
+    return results
+
+
 def language_is_supported(code: str) -> bool:
     """Returns True if the language code if supported by the identifier.
 
@@ -1,15 +1,90 @@
+import json
 import logging
 import os
+import time
+from typing import Any, Callable, Dict, Optional, Union
+
+
+class _LazyMessage(object):
+    """Message that gets rendered by a callable only when (and if) it gets emitted."""
+
+    __slots__ = [
+        '__render',
+        '__message',
+    ]
+
+    def __init__(self, render: Callable[[], str]):
+        self.__render = render
+        self.__message = None
+
+    def __str__(self) -> str:
+        # Render only once even if there are multiple handlers
+        if self.__message is None:
+            self.__message = str(self.__render())
+        return self.__message
+
+
+class _JSONFormatter(logging.Formatter):
+    """Formats log records as single line JSON objects, with structured fields (if any) added to them."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + '.%03dZ' % record.msecs,
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process,
+            'thread': record.threadName,
+
+            # Milliseconds since the logging module got loaded, for timing things from the logs alone
+            'relative_ms': round(record.relativeCreated, 3),
+        }
+
+        fields = getattr(record, 'mc_fields', None)
+        if fields:
+            for name, value in fields.items():
+                if name not in entry:
+                    entry[name] = value
+
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _TextFormatter(logging.Formatter):
+    """Formats log records as text, with structured fields (if any) appended as "name=value" pairs."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+
+        fields = getattr(record, 'mc_fields', None)
+        if fields:
+            message += ' ' + ' '.join('%s=%s' % (name, value) for name, value in fields.items())
+
+        return message
 
 
 class Logger(object):
     """Logger class.
 
+    Messages can be passed either as preformatted strings, as "%"-style format strings with arguments, or as callables
+    returning the message; the latter two get rendered only if the message's level is enabled, so they're the
+    preferred way to log (debugging) messages on hot paths:
+
+        log.debug("Running query: %s", query)
+        log.debug(lambda: "Stories: %s" % ', '.join(str(story['stories_id']) for story in stories))
+
+    Every method also accepts a "fields" dictionary of structured fields (e.g. timings) to add to the log entry.
+
     See doc/logging.markdown for usage example."""
 
     # Environment variable to read the custom logging level from
     __logging_level_env_variable = 'MC_LOGGING_LEVEL'
 
+    # Environment variable to read the output format ("text" or "json") from
+    __logging_format_env_variable = 'MC_LOGGING_FORMAT'
+
     # Valid logging levels and their "logging" counterparts
     __logging_levels = {
         'CRITICAL': logging.CRITICAL,
@@ -22,6 +97,12 @@ class Logger(object):
     # Default logging level (used when environment variable is not set)
     __default_logging_level = 'INFO'
 
+    # Valid output formats
+    __logging_formats = {'text', 'json'}
+
+    # Default output format (used when environment variable is not set)
+    __default_logging_format = 'text'
+
     # "logging" object
     __l = None
 
@@ -31,14 +112,26 @@ class Logger(object):
 
         self.__l = logging.getLogger(name)
         if not self.__l.handlers:
-            formatter = logging.Formatter(
-                fmt='%(levelname)s %(name)s: %(message)s'
-            )
+
+            logging_format = os.environ.get(self.__logging_format_env_variable, self.__default_logging_format)
+            logging_format = logging_format.lower()
+
+            if logging_format == 'json':
+                formatter = _JSONFormatter()
+            else:
+                formatter = _TextFormatter(
+                    fmt='%(levelname)s %(name)s: %(message)s'
+                )
 
             handler = logging.StreamHandler()
             handler.setFormatter(formatter)
             self.__l.addHandler(handler)
 
+            if logging_format not in self.__logging_formats:
+                self.warning("Logging format '%s' is invalid, resetting to default '%s'" % (
+                    logging_format, self.__default_logging_format
+                ))
+
             logging_level = os.environ.get(self.__logging_level_env_variable, self.__default_logging_level)
             if logging_level not in self.__logging_levels:
                 self.warning("Logging level '%s' is invalid, resetting to default '%s'" % (
@@ -52,21 +145,41 @@ class Logger(object):
             # (http://stackoverflow.com/a/21127526/200603)
             self.__l.propagate = False
 
-    def error(self, message: str) -> None:
+    def is_enabled_for(self, level: str) -> bool:
+        """Return True if messages of a given level ('DEBUG', 'INFO', ...) would get logged."""
+        if level not in self.__logging_levels:
+            raise ValueError("Logging level '%s' is invalid." % level)
+        return self.__l.isEnabledFor(self.__logging_levels[level])
+
+    def __log(self,
+              level: int,
+              message: Union[str, Callable[[], str]],
+              args: tuple,
+              fields: Optional[Dict[str, Any]]) -> None:
+        if not self.__l.isEnabledFor(level):
+            return
+
+        if callable(message):
+            message = _LazyMessage(message)
+
+        # "logging" renders the message with arguments only when the record gets emitted
+        self.__l.log(level, message, *args, extra={'mc_fields': fields} if fields else None)
+
+    def error(self, message: Union[str, Callable[[], str]], *args, fields: Optional[Dict[str, Any]] = None) -> None:
         """Log error message."""
-        self.__l.error(message)
+        self.__log(level=logging.ERROR, message=message, args=args, fields=fields)
 
-    def warning(self, message: str) -> None:
+    def warning(self, message: Union[str, Callable[[], str]], *args, fields: Optional[Dict[str, Any]] = None) -> None:
         """Log warning message."""
-        self.__l.warning(message)
+        self.__log(level=logging.WARNING, message=message, args=args, fields=fields)
 
-    def info(self, message: str) -> None:
+    def info(self, message: Union[str, Callable[[], str]], *args, fields: Optional[Dict[str, Any]] = None) -> None:
         """Log informational message."""
-        self.__l.info(message)
+        self.__log(level=logging.INFO, message=message, args=args, fields=fields)
 
-    def debug(self, message: str) -> None:
+    def debug(self, message: Union[str, Callable[[], str]], *args, fields: Optional[Dict[str, Any]] = None) -> None:
         """Log debugging message."""
-        self.__l.debug(message)
+        self.__log(level=logging.DEBUG, message=message, args=args, fields=fields)
 
 
 def create_logger(name: str) -> Logger:
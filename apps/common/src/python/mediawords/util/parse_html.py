@@ -4,7 +4,7 @@
 
 import re
 from urllib.parse import urljoin
-from typing import Optional
+from typing import Iterable, Optional
 
 from bs4 import BeautifulSoup
 
@@ -22,8 +22,9 @@ def link_canonical_url_from_html(html: str, base_url: Optional[str] = None) -> O
     base_url_decode = decode_object_from_bytes_if_needed(base_url)
     base_url = None if base_url_decode is None else str(base_url_decode)
 
-    link_elements = re.findall(r'(<\s*?link.+?>)', html, re.I)
-    for link_element in link_elements:
+    # Iterate over matches instead of finding them all first to be able to stop at the first canonical link
+    for link_element_match in re.finditer(r'(<\s*?link.+?>)', html, re.I):
+        link_element = link_element_match.group(1)
         if re.search(r'rel\s*?=\s*?["\']\s*?canonical\s*?["\']', link_element, re.I):
             match = re.search(r'href\s*?=\s*?["\'](.+?)["\']', link_element, re.I)
             if match:
@@ -83,17 +84,34 @@ def meta_refresh_url_from_html(html: str, base_url: Optional[str] = None) -> Opt
     """From the provided HTML, determine the <meta http-equiv="refresh" /> URL (if any)."""
 
     html = str(decode_object_from_bytes_if_needed(html))
+
+    return meta_refresh_url_from_html_chunks(html_chunks=[html], base_url=base_url)
+
+
+def meta_refresh_url_from_html_chunks(html_chunks: Iterable[str], base_url: Optional[str] = None) -> Optional[str]:
+    """From the provided HTML chunks (e.g. Response.iter_decoded_content()), determine the <meta http-equiv="refresh" />
+    URL (if any); stop reading chunks at the first refresh tag."""
+
     base_url_decode = decode_object_from_bytes_if_needed(base_url)
     base_url = None if base_url_decode is None else str(base_url_decode)
 
     if not is_http_url(str(base_url)):
         log.info("Base URL is not HTTP(s): %s" % base_url)
 
-    tags = re.findall(r'(<\s*meta[^>]+>)', html, re.I)
-    for tag in tags:
-        url = __get_meta_refresh_url_from_tag(tag, base_url)
-        if url is not None:
-            return url
+    # Start of the tag which might continue in the next chunk
+    unparsed_html = ''
+
+    for html_chunk in html_chunks:
+        html = unparsed_html + str(decode_object_from_bytes_if_needed(html_chunk))
+
+        for tag_match in re.finditer(r'(<\s*meta[^>]+>)', html, re.I):
+            url = __get_meta_refresh_url_from_tag(tag_match.group(1), base_url)
+            if url is not None:
+                return url
+
+        # Tags can't contain ">", so only a tag that starts after the last ">" might be incomplete
+        tag_start = html.find('<', html.rfind('>') + 1)
+        unparsed_html = html[tag_start:] if tag_start != -1 else ''
 
     return None
 
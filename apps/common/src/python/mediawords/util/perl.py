@@ -2,8 +2,9 @@
 # Perl (Inline::Perl) helpers
 #
 from enum import Enum
+from functools import lru_cache
 import re
-from typing import Union
+from typing import Tuple, Union
 
 from mediawords.util.log import create_logger
 
@@ -14,28 +15,76 @@ class McDecodeObjectFromBytesIfNeededException(Exception):
     pass
 
 
-# MC_REWRITE_TO_PYTHON: remove after porting all Perl code to Python
-def decode_object_from_bytes_if_needed(obj: Union[dict, list, tuple, str, bytes, None]) \
-        -> Union[dict, list, tuple, str, None]:
-    """Convert object (dictionary, list or string) from 'bytes' string to 'unicode' if needed.
+# Types that can't contain anything to decode
+__SCALAR_TYPES = frozenset({str, int, float, bool, type(None)})
 
-    (http://search.cpan.org/dist/Inline-Python/Python.pod#PORTING_YOUR_INLINE_PYTHON_CODE_FROM_2_TO_3)"""
+# If True, only objects that are 'bytes' themselves get decoded, and containers get returned as-is
+__skip_decoding_containers = False
+
+
+def skip_decoding_containers(skip: bool = True) -> None:
+    """Make decode_object_from_bytes_if_needed() return dictionaries, lists and tuples as-is without looking for
+    'bytes' in them.
+
+    To be called by processes that don't get called from Perl (via Inline::Python), as it's only the strings that are
+    coming from Perl that might end up being 'bytes' in nested objects. Objects that are 'bytes' themselves still get
+    decoded."""
+    global __skip_decoding_containers
+    __skip_decoding_containers = skip
+
+
+def __contains_bytes(obj: Union[dict, list, tuple]) -> bool:
+    """Return True if there are 'bytes' anywhere in a (nested) dictionary, list or tuple."""
+
+    # Iterative walk because most of the objects don't have anything to decode, so it's better to not pay for recursive
+    # calls on every item
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+
+        if isinstance(obj, dict):
+            for k, v in obj.items():
+                k_type = type(k)
+                v_type = type(v)
+                if k_type is bytes or v_type is bytes:
+                    return True
+                if k_type not in __SCALAR_TYPES:
+                    stack.append(k)
+                if v_type not in __SCALAR_TYPES:
+                    stack.append(v)
+
+        elif isinstance(obj, (list, tuple)):
+            for v in obj:
+                v_type = type(v)
+                if v_type is bytes:
+                    return True
+                if v_type not in __SCALAR_TYPES:
+                    stack.append(v)
+
+        elif isinstance(obj, bytes):
+            return True
+
+    return False
+
+
+def __decode_object_from_bytes(obj: Union[dict, list, tuple, str, bytes, None]) -> Union[dict, list, tuple, str, None]:
+    """Convert object (dictionary, list or string) from 'bytes' string to 'unicode', copying every container."""
 
     if isinstance(obj, dict):
         result = dict()
         for k, v in obj.items():
-            k = decode_object_from_bytes_if_needed(k)
-            v = decode_object_from_bytes_if_needed(v)
+            k = __decode_object_from_bytes(k)
+            v = __decode_object_from_bytes(v)
             result[k] = v
     elif isinstance(obj, list):
         result = list()
         for v in obj:
-            v = decode_object_from_bytes_if_needed(v)
+            v = __decode_object_from_bytes(v)
             result.append(v)
     elif isinstance(obj, tuple):
         result = list()
         for v in obj:
-            v = decode_object_from_bytes_if_needed(v)
+            v = __decode_object_from_bytes(v)
             result.append(v)
         result = tuple(result)
     elif isinstance(obj, bytes):
@@ -46,6 +95,33 @@ def decode_object_from_bytes_if_needed(obj: Union[dict, list, tuple, str, bytes,
     return result
 
 
+# MC_REWRITE_TO_PYTHON: remove after porting all Perl code to Python
+def decode_object_from_bytes_if_needed(obj: Union[dict, list, tuple, str, bytes, None]) \
+        -> Union[dict, list, tuple, str, None]:
+    """Convert object (dictionary, list or string) from 'bytes' string to 'unicode' if needed.
+
+    Dictionaries, lists and tuples that don't have any 'bytes' in them get returned as-is (not copied).
+
+    (http://search.cpan.org/dist/Inline-Python/Python.pod#PORTING_YOUR_INLINE_PYTHON_CODE_FROM_2_TO_3)"""
+
+    obj_type = type(obj)
+
+    if obj_type in __SCALAR_TYPES:
+        return obj
+
+    if isinstance(obj, bytes):
+        # Mimic Perl decode replace on error behavior
+        return obj.decode(encoding='utf-8', errors='replace')
+
+    if not isinstance(obj, (dict, list, tuple)):
+        return obj
+
+    if __skip_decoding_containers or not __contains_bytes(obj):
+        return obj
+
+    return __decode_object_from_bytes(obj)
+
+
 def decode_str_from_bytes_if_needed(obj: Union[bytes, str, None]) -> Union[str, None]:
     """Call decode_object_from_bytes_if_needed by only accept bytes and strings and only output strings."""
     decode = decode_object_from_bytes_if_needed(obj)
@@ -59,92 +135,96 @@ class McConvertDBDPgArgumentsToPsycopg2FormatException(Exception):
     pass
 
 
-def __replace_double_question_marks_or_return_none(q: str, q_args: list) -> Union[tuple, None]:
-    """Replace "??" parameters with psycopg2's "%s" and tuple parameter, or return None if not found."""
+# Matches "(WHERE) column IN (??)" with optional spaces around
+__DOUBLE_QUESTION_MARK_REGEX = re.compile(r"""
+    (?P<in_statement>\sIN\s)    # "(WHERE) column IN"
+    \(\s*\?\?\s*\)              # "(??)" with optional spaces around
+""", flags=re.I | re.X)
 
-    double_question_mark_regex = re.compile(r"""
-        (?P<in_statement>\sIN\s)    # "(WHERE) column IN"
-        \(\s*\?\?\s*\)              # "(??)" with optional spaces around
-    """, flags=re.I | re.X)
-    double_question_mark_replacement = r'\g<in_statement>%s'
+# Matches "?" singled out by whitespace, comma or brackets
+__QUESTION_MARK_REGEX = re.compile(r"""
+    (?P<char_before_question_mark>\s|,|\()      # Question mark preceded by whitespace, comma or bracket
+    \?                                          # Question mark
+    (?=(\s|,|\)|(::)|$))                        # Lookahead and make sure question mark is singled out
+""", flags=re.I | re.X)
 
-    double_question_mark_count = len(re.findall(double_question_mark_regex, q))
-    if double_question_mark_count > 0:
-        if double_question_mark_count > 1:
-            raise McConvertDBDPgArgumentsToPsycopg2FormatException("""
-                More than one double question mark found
-                in query "%(query)s" (arguments: %(query_args)s)
-            """ % {
-                'query': q,
-                'query_args': q_args,
-            })
+# Matches "$1" singled out by whitespace, comma or brackets
+__DOLLAR_SIGN_REGEX = re.compile(r"""
+    (?P<char_before_dollar_sign>\s|,|\()    # Dollar sign preceded by whitespace, comma or bracket
+    \$(?P<param_index>\d)                   # Dollar sign with a single-digit index ("$1", "$2", ...)
+    (?=(\s|,|\)|(::)|$))                    # Lookahead and make sure dollar sign is singled out
+""", flags=re.I | re.X)
 
-        q = re.sub(double_question_mark_regex, double_question_mark_replacement, q)
+# Matches 'PostgreSQL''s quoted literals'
+__QUOTED_LITERAL_REGEX = re.compile(r"('(?:[^']+|'')+')")
 
-        if not isinstance(q_args, tuple):  # might have been converted previously
-            # Convert arguments to first (and only) psycopg2's query parameter
-            # (which should be a tuple: http://stackoverflow.com/a/28117658/200603)
-            q_args = tuple(q_args)
-            q_args = (q_args,)
 
-        return q, q_args
+class _PlaceholderType(Enum):
+    double_question_mark = 1
+    question_mark = 2
+    dollar_signs = 3
 
-    else:
-        return None
 
+# Max. number of converted queries to cache
+__CONVERTED_QUERY_CACHE_SIZE = 1024
 
-def __replace_question_marks_or_return_none(q: str, q_args: list) -> Union[tuple, None]:
-    """Replace "?" parameters with psycopg2's "%s", or return None if not found."""
+# Longer queries (usually one-offs with inlined values) don't get cached to not push hot queries out of the cache
+__MAX_CACHED_QUERY_LENGTH = 4 * 1024
 
-    question_mark_regex = re.compile(r"""
-        (?P<char_before_question_mark>\s|,|\()      # Question mark preceded by whitespace, comma or bracket
-        \?                                          # Question mark
-        (?=(\s|,|\)|(::)|$))                        # Lookahead and make sure question mark is singled out
-    """, flags=re.I | re.X)
-    question_mark_replacement = r'\g<char_before_question_mark>%s'
 
-    question_mark_count = len(re.findall(question_mark_regex, q))
-    if question_mark_count > 0:
+def __convert_dbd_pg_query(query: str) -> Tuple[str, Tuple[_PlaceholderType, ...]]:
+    """Replace DBD::Pg's placeholders in a query with psycopg2's ones.
 
-        q = re.sub(question_mark_regex, question_mark_replacement, q)
+    Conversion depends on the query only, so it's cached. Return converted query and a list of placeholder types found
+    in every non-literal part of the query."""
 
-        # Convert arguments to psycopg2's argument tuple
-        if not isinstance(q_args, tuple):  # might have been converted previously
-            q_args = tuple(q_args)
+    # Split SQL query into literals and not literals, iterate over all of them, replace parameters to psycopg2-style
+    # only for the non-literals parts
+    split_query = __QUOTED_LITERAL_REGEX.split(query)
+    converted_query = ""
+    placeholder_types = []
 
-        return q, q_args
+    for query_part in split_query:
+        if __QUOTED_LITERAL_REGEX.fullmatch(query_part):
+            # Don't touch quoted literals
+            pass
 
-    else:
-        return None
+        else:
 
+            double_question_mark_count = len(__DOUBLE_QUESTION_MARK_REGEX.findall(query_part))
+            if double_question_mark_count > 0:
+                if double_question_mark_count > 1:
+                    raise McConvertDBDPgArgumentsToPsycopg2FormatException(
+                        'More than one double question mark found in query "%s"' % query
+                    )
 
-def __replace_dollar_signs_or_return_none(q: str, q_args: list) -> Union[tuple, None]:
-    """Replace "$1" parameters with psycopg2's "%(param_1)s", or return None if not found."""
+                query_part = __DOUBLE_QUESTION_MARK_REGEX.sub(r'\g<in_statement>%s', query_part)
+                placeholder_types.append(_PlaceholderType.double_question_mark)
 
-    dollar_sign_regex = re.compile(r"""
-        (?P<char_before_dollar_sign>\s|,|\()    # Dollar sign preceded by whitespace, comma or bracket
-        \$(?P<param_index>\d)                   # Dollar sign with a single-digit index ("$1", "$2", ...)
-        (?=(\s|,|\)|(::)|$))                    # Lookahead and make sure dollar sign is singled out
-    """, flags=re.I | re.X)
-    dollar_sign_replacement = r'\g<char_before_dollar_sign>%(param_\g<param_index>)s'
+            elif __QUESTION_MARK_REGEX.search(query_part):
 
-    dollar_sign_unique_indexes = set([x[1] for x in re.findall(dollar_sign_regex, q)])
-    dollar_sign_unique_count = len(dollar_sign_unique_indexes)
-    if dollar_sign_unique_count > 0:
+                query_part = __QUESTION_MARK_REGEX.sub(r'\g<char_before_question_mark>%s', query_part)
+                placeholder_types.append(_PlaceholderType.question_mark)
 
-        q = re.sub(dollar_sign_regex, dollar_sign_replacement, q)
+            elif __DOLLAR_SIGN_REGEX.search(query_part):
 
-        # Convert arguments to psycopg2's argument dictionary
-        if not isinstance(q_args, dict):  # might have been converted previously
-            q_args_dict = {}
-            for i in range(0, len(q_args)):
-                q_args_dict['param_%d' % (i + 1)] = q_args[i]
-            q_args = q_args_dict
+                query_part = __DOLLAR_SIGN_REGEX.sub(
+                    r'\g<char_before_dollar_sign>%(param_\g<param_index>)s', query_part
+                )
+                placeholder_types.append(_PlaceholderType.dollar_signs)
 
-        return q, q_args
+        converted_query += query_part
+
+    return converted_query, tuple(placeholder_types)
+
+
+__cached_convert_dbd_pg_query = lru_cache(maxsize=__CONVERTED_QUERY_CACHE_SIZE)(__convert_dbd_pg_query)
 
-    else:
-        return None
+
+def __convert_dbd_pg_query_maybe_cached(query: str) -> Tuple[str, Tuple[_PlaceholderType, ...]]:
+    if len(query) > __MAX_CACHED_QUERY_LENGTH:
+        return __convert_dbd_pg_query(query)
+    return __cached_convert_dbd_pg_query(query)
 
 
 # MC_REWRITE_TO_PYTHON: remove after porting queries to named parameter style
@@ -181,78 +261,34 @@ def convert_dbd_pg_arguments_to_psycopg2_format(*query_parameters: Union[list, t
 
     else:
 
-        # Matches 'PostgreSQL''s quoted literals'
-        quoted_literal_regex = r"('(?:[^']+|'')+')"
-
-        # Split SQL query into literals and not literals, iterate over all of them, replace parameters to psycopg2-style
-        # only for the non-literals parts
-        split_query = re.split(quoted_literal_regex, query)
-        converted_query = ""
-
-        class PlaceholderType(Enum):
-            double_question_mark = 1
-            question_mark = 2
-            dollar_signs = 3
-
-        placeholder_type = None
-
-        for query_part in split_query:
-            if re.match("^" + quoted_literal_regex + "$", query_part):
-                # Don't touch quoted literals
-                pass
-            else:
-
-                double_question_mark = __replace_double_question_marks_or_return_none(q=query_part, q_args=query_args)
-                if double_question_mark is not None:
-
-                    if placeholder_type is not None:
-                        if placeholder_type != PlaceholderType.double_question_mark:
-                            raise McConvertDBDPgArgumentsToPsycopg2FormatException("""
-                                Mixed placeholder types? Query: %(query)s, arguments: %(query_args)s
-                            """ % {'query': query, 'query_args': query_args})
-                    placeholder_type = PlaceholderType.double_question_mark
-
-                    query_part = double_question_mark[0]
-                    query_args = double_question_mark[1]
+        converted_query, placeholder_types = __convert_dbd_pg_query_maybe_cached(query)
 
-                else:
-
-                    question_mark = __replace_question_marks_or_return_none(q=query_part, q_args=query_args)
-                    if question_mark is not None:
-
-                        if placeholder_type is not None:
-                            if placeholder_type != PlaceholderType.question_mark:
-                                raise McConvertDBDPgArgumentsToPsycopg2FormatException("""
-                                    Mixed placeholder types? Query: %(query)s, arguments: %(query_args)s
-                                """ % {'query': query, 'query_args': query_args})
-                        placeholder_type = PlaceholderType.question_mark
-
-                        query_part = question_mark[0]
-                        query_args = question_mark[1]
-
-                    else:
-
-                        dollar_signs = __replace_dollar_signs_or_return_none(q=query_part, q_args=query_args)
-                        if dollar_signs is not None:
-
-                            if placeholder_type is not None:
-                                if placeholder_type != PlaceholderType.dollar_signs:
-                                    raise McConvertDBDPgArgumentsToPsycopg2FormatException("""
-                                        Mixed placeholder types? Query: %(query)s, arguments: %(query_args)s
-                                    """ % {'query': query, 'query_args': query_args})
-                            placeholder_type = PlaceholderType.dollar_signs
-
-                            query_part = dollar_signs[0]
-                            query_args = dollar_signs[1]
-
-            converted_query += query_part
+        if len(set(placeholder_types)) > 1:
+            raise McConvertDBDPgArgumentsToPsycopg2FormatException("""
+                Mixed placeholder types? Query: %(query)s, arguments: %(query_args)s
+            """ % {'query': query, 'query_args': query_args})
 
-        if placeholder_type is None:
+        if len(placeholder_types) == 0:
             raise McConvertDBDPgArgumentsToPsycopg2FormatException("""
                 Query has arguments coming from Perl, but none of the supported placeholders ("?", "??", "$1")
                 were found. Query: %(query)s; arguments: %(query_args)s
             """ % {'query': query, 'query_args': query_args})
 
+        placeholder_type = placeholder_types[0]
+
+        if placeholder_type == _PlaceholderType.double_question_mark:
+            # Convert arguments to first (and only) psycopg2's query parameter
+            # (which should be a tuple: http://stackoverflow.com/a/28117658/200603)
+            query_args = (tuple(query_args),)
+
+        elif placeholder_type == _PlaceholderType.question_mark:
+            # Convert arguments to psycopg2's argument tuple
+            query_args = tuple(query_args)
+
+        else:
+            # Convert arguments to psycopg2's argument dictionary
+            query_args = {'param_%d' % (i + 1): query_args[i] for i in range(0, len(query_args))}
+
         query = converted_query
 
     if query_args is None:
@@ -1,10 +1,13 @@
-import multiprocessing
 import io
+import os
+import queue
 import re
-import time
+import threading
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from http import HTTPStatus
-from typing import Dict, List, Union
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 from urllib.parse import quote
 
 import requests
@@ -21,12 +24,13 @@ from mediawords.util.url import (
     fix_common_url_mistakes,
     is_http_url,
     get_url_distinctive_domain,
-    get_url_host,
     get_base_url,
     urls_are_equal,
 )
+from mediawords.util.web.user_agent.http_cache import HTTPCache, HTTPCacheEntry
 from mediawords.util.web.user_agent.request.request import Request
 from mediawords.util.web.user_agent.response.response import Response
+from mediawords.util.web.user_agent.scheduler import DomainScheduler
 
 log = create_logger(__name__)
 
@@ -71,57 +75,37 @@ class McRequestException(McUserAgentException):
     pass
 
 
-# In the module namespace because pickle is unable to serialize classes located in functions
-class _ParallelGetScheduledURL(object):
-    """URL scheduled to download in parallel_get()."""
-    __slots__ = [
-        'url',
-        'time',
-    ]
-
-    def __init__(self, url: str, time_: float):
-        self.url = url
-        self.time = time_
-
-
-# In the module namespace because pickle is unable to serialize classes located in functions
-class _ParallelGetResponse(object):
-    # Separate response object to keep the original requested URL intact (might be different in original_response())
-
-    __slots__ = [
-        'scheduled_url',
-        'response',
-    ]
-
-    def __init__(self, scheduled_url: _ParallelGetScheduledURL, response: Response):
-        self.scheduled_url = scheduled_url
-        self.response = response
+# Persistent parallel_get() thread pools (number of threads -> pool); threads don't survive a fork so the pools get
+# recreated in forked processes
+__parallel_get_pools = {}  # type: Dict[int, ThreadPoolExecutor]
+__parallel_get_pools_pid = None
+__parallel_get_pools_lock = threading.Lock()
 
+# Every parallel_get() thread keeps its own UserAgent (and thus "requests" session with its connection pool) around
+_parallel_get_thread_local = threading.local()
 
-# In the module namespace because pickle is unable to serialize functions located in other functions
-def _parallel_get_web_store(
-        scheduled_urls: List[_ParallelGetScheduledURL],
-        start_time: float,
-        timeout: Union[int, None]
-) -> List[_ParallelGetResponse]:
-    """Download a list of URLs, return responses."""
 
-    responses = []
+def _parallel_get_pool(num_parallel: int) -> ThreadPoolExecutor:
+    """Return persistent thread pool for parallel_get()."""
+    global __parallel_get_pools, __parallel_get_pools_pid
 
-    for scheduled_url in scheduled_urls:
+    with __parallel_get_pools_lock:
+        if __parallel_get_pools_pid != os.getpid():
+            __parallel_get_pools = {}
+            __parallel_get_pools_pid = os.getpid()
 
-        time_increment = time.time() - start_time
-        if time_increment < scheduled_url.time:
-            sleep_time = scheduled_url.time - time_increment
-            time.sleep(sleep_time)
+        pool = __parallel_get_pools.get(num_parallel, None)
+        if pool is None:
+            pool = ThreadPoolExecutor(max_workers=num_parallel, thread_name_prefix='ParallelGet')
+            __parallel_get_pools[num_parallel] = pool
 
-        ua = UserAgent()
-        ua.set_timeout(timeout)
+        return pool
 
-        response = ua.get_follow_http_html_redirects(url=scheduled_url.url)
-        responses.append(_ParallelGetResponse(scheduled_url=scheduled_url, response=response))
 
-    return responses
+@lru_cache(maxsize=None)
+def _shared_http_cache(directory: str, max_size: int, ttl: int) -> HTTPCache:
+    """Return HTTP cache shared by all user agents of a process (for the counters to add up)."""
+    return HTTPCache(directory=directory, max_size=max_size, ttl=ttl)
 
 
 class UserAgent(object):
@@ -156,6 +140,9 @@ class UserAgent(object):
         # Delays between retries
         '__timing',
 
+        # HTTP cache (None if disabled)
+        '__http_cache',
+
     ]
 
     def __init__(self, user_agent_config: UserAgentConfig = None):
@@ -193,6 +180,15 @@ class UserAgent(object):
         self.__timing = None
         self.set_timing(None)
 
+        self.__http_cache = None
+        http_cache_directory = self._user_agent_config.http_cache_directory()
+        if http_cache_directory:
+            self.__http_cache = _shared_http_cache(
+                directory=http_cache_directory,
+                max_size=self._user_agent_config.http_cache_max_size(),
+                ttl=self._user_agent_config.http_cache_ttl(),
+            )
+
     def __get_domain_http_auth_lookup(self) -> Dict[str, AuthenticatedDomain]:
         """Read the authenticated domains from configuration and generate a lookup hash with
         the host domain as the key and the user:password credentials as the value."""
@@ -230,7 +226,7 @@ class UserAgent(object):
 
     def get(self, url: str) -> Response:
         """GET an URL."""
-        log.debug("mediawords.util.web.user_agent.get: %s" % url)
+        log.debug("mediawords.util.web.user_agent.get: %s", url)
         url = decode_object_from_bytes_if_needed(url)
 
         if url is None:
@@ -248,18 +244,41 @@ class UserAgent(object):
 
         return self.request(request)
 
-    def __get_follow_http_html_redirects_follow_redirects(self,
-                                                          response_: Response,
-                                                          meta_redirects_left: int) -> Union[Response, None]:
+    @staticmethod
+    def __html_redirect_requests(response_: Response, base_url: str) -> Iterator[Union[Request, None]]:
+        """Yield requests (or None) after HTML redirects found in response's content, in order of preference."""
 
         from mediawords.util.web.user_agent.html_redirects import (
-            target_request_from_meta_refresh_url,
+            target_request_from_meta_refresh_url_chunks,
             target_request_from_archive_org_url,
             target_request_from_archive_is_url,
             target_request_from_linkis_com_url,
             target_request_from_alarabiya_url,
         )
 
+        # META refresh tag is usually near the top, so there might be no need to decode the (possibly huge) content
+        yield target_request_from_meta_refresh_url_chunks(
+            content_chunks=response_.iter_decoded_content(),
+            archive_site_url=base_url,
+        )
+
+        # Decode content once and not for every function
+        content = response_.decoded_content()
+
+        html_redirect_functions = [
+            target_request_from_archive_org_url,
+            target_request_from_archive_is_url,
+            target_request_from_linkis_com_url,
+            target_request_from_alarabiya_url,
+        ]
+
+        for html_redirect_function in html_redirect_functions:
+            yield html_redirect_function(content=content, archive_site_url=base_url)
+
+    def __get_follow_http_html_redirects_follow_redirects(self,
+                                                          response_: Response,
+                                                          meta_redirects_left: int) -> Union[Response, None]:
+
         if response_ is None:
             raise McGetFollowHTTPHTMLRedirectsException("Response is None.")
 
@@ -267,24 +286,12 @@ class UserAgent(object):
 
             base_url = get_base_url(response_.request().url())
 
-            html_redirect_functions = [
-                target_request_from_meta_refresh_url,
-                target_request_from_archive_org_url,
-                target_request_from_archive_is_url,
-                target_request_from_linkis_com_url,
-                target_request_from_alarabiya_url,
-            ]
-            for html_redirect_function in html_redirect_functions:
-                request_after_meta_redirect = html_redirect_function(
-                    content=response_.decoded_content(),
-                    archive_site_url=base_url,
-                )
+            for request_after_meta_redirect in self.__html_redirect_requests(response_=response_, base_url=base_url):
                 if request_after_meta_redirect is not None:
-                    log.debug(
-                        "meta redirect from %s: %s" % (html_redirect_function, request_after_meta_redirect.url()))
+                    log.debug("meta redirect: %s" % request_after_meta_redirect.url())
                     if not urls_are_equal(url1=response_.request().url(), url2=request_after_meta_redirect.url()):
 
-                        log.debug("URL after HTML redirects: %s" % request_after_meta_redirect.url())
+                        log.debug("URL after HTML redirects: %s", request_after_meta_redirect.url())
 
                         orig_redirect_response = self.request(request=request_after_meta_redirect)
                         redirect_response = orig_redirect_response
@@ -321,7 +328,7 @@ class UserAgent(object):
             return response_
 
         else:
-            log.debug("Request to %s was unsuccessful: %s" % (response_.request().url(), response_.status_line(),))
+            log.debug("Request to %s was unsuccessful: %s", response_.request().url(), response_.status_line())
 
             # Return the original URL and give up
             return None
@@ -407,69 +414,70 @@ class UserAgent(object):
         else:
             return response_after_redirects
 
-    @staticmethod
-    def __get_url_domain(url_: str) -> str:
-
-        if not is_http_url(url_):
-            return url_
-
-        host = get_url_host(url_)
-
-        name_parts = host.split('.')
+    def __parallel_get_user_agent(self, timeout: Union[int, None]) -> 'UserAgent':
+        """Return current thread's user agent for parallel_get() with the same configuration as this one."""
 
-        n = len(name_parts) - 1
+        settings = (
+            type(self._user_agent_config),
+            timeout,
+            tuple(self.timing()) if self.timing() else None,
+            self.max_size(),
+            self.max_redirect(),
+            id(self.http_cache()),
+        )
 
-        # for country domains, use last three parts of name
-        if re.search(pattern=r"\...$", string=host):
-            domain = '.'.join([name_parts[n - 2], name_parts[n - 1], name_parts[0]])
+        if getattr(_parallel_get_thread_local, 'settings', None) != settings:
+            ua = UserAgent(user_agent_config=self._user_agent_config)
+            ua.set_timeout(timeout)
+            ua.set_timing(self.timing())
+            ua.set_max_size(self.max_size())
+            ua.set_max_redirect(self.max_redirect())
+            ua.set_http_cache(self.http_cache())
 
-        elif re.search(pattern=r"(localhost|blogspot\.com|wordpress\.com)", string=host):
-            domain = url_
+            # Keep connections to the same hosts alive between requests
+            del ua.__session.headers['Connection']
 
-        else:
-            domain = '.'.join([name_parts[n - 1], name_parts[n]])
+            _parallel_get_thread_local.user_agent = ua
+            _parallel_get_thread_local.settings = settings
 
-        return domain.lower()
+        return _parallel_get_thread_local.user_agent
 
-    @staticmethod
-    def __get_scheduled_urls(urls_: List[str], per_domain_timeout_: int) -> List[_ParallelGetScheduledURL]:
-        """Schedule the URLs by adding a { time => $time } field to each URL to make sure we obey the
-        'per_domain_timeout'. Sort requests by ascending time."""
-        domain_urls = {}
+    def __parallel_get_worker(self,
+                              scheduler: DomainScheduler,
+                              results: queue.Queue,
+                              timeout: Union[int, None]) -> None:
+        """Fetch URLs handed out by the scheduler until there are none left, add (URL, response) tuples to results.
 
-        for url_ in urls_:
-            domain = UserAgent.__get_url_domain(url_=url_)
-            if domain not in domain_urls:
-                domain_urls[domain] = []
-            domain_urls[domain].append(url_)
+        Add (URL, exception) tuple to results and stop on errors."""
 
-        scheduled_urls = []
-
-        for domain, urls_in_domain in domain_urls.items():
-            time_ = 0
-            for domain_url in urls_in_domain:
-                domain_url = _ParallelGetScheduledURL(url=domain_url, time_=time_)
-                scheduled_urls.append(domain_url)
+        url = None
+        try:
+            ua = self.__parallel_get_user_agent(timeout=timeout)
 
-                if time_ % 5 == 0:  # FIXME why 5?
-                    time_ = time_ + per_domain_timeout_
+            while True:
+                url = scheduler.next_url()
+                if url is None:
+                    break
 
-        scheduled_urls = sorted(scheduled_urls, key=lambda x: x.time)
+                results.put((url, ua.get_follow_http_html_redirects(url=url),))
 
-        return scheduled_urls
+        except Exception as ex:
+            results.put((url, ex,))
 
-    def parallel_get(self, urls: List[str]) -> List[Response]:
-        """GET multiple URLs in parallel."""
+    def parallel_get_iter(self, urls: List[str]) -> Iterator[Tuple[str, Response]]:
+        """GET multiple URLs in parallel, yield (URL, response) tuples in the order in which the downloads finish.
 
-        # FIXME doesn't respect timing() and other object properties
+        URLs get fetched by a persistent pool of threads which reuse their connections, with the same timing(),
+        max_size() and max_redirect() as this user agent. Requests to every domain are rate limited by DomainScheduler.
+        """
 
         urls = decode_object_from_bytes_if_needed(urls)
 
         # Original implementation didn't raise on undefined / empty list of URLs
         if urls is None:
-            return []
+            return
         if len(urls) == 0:
-            return []
+            return
 
         # Remove duplicates from list while maintaining order because:
         # 1) We don't want to fetch the same URL twice
@@ -480,64 +488,63 @@ class UserAgent(object):
             log.warning("Some of the URLs are duplicate; URLs: %s" % str(urls_before_removing_duplicates))
 
         # Raise on one or more invalid URLs because we consider it a caller's problem; if URL at least looks valid,
-        # get() in a fork should be able to come up with a reasonable Response object for it
+        # get() in a thread should be able to come up with a reasonable Response object for it
         for url in urls:
             if not is_http_url(url):
                 raise McParallelGetException("URL %s is not a valid URL; URLs: %s" % (url, str(urls),))
 
         num_parallel = self._user_agent_config.parallel_get_num_parallel()
         timeout = self._user_agent_config.parallel_get_timeout()
-        per_domain_timeout = self._user_agent_config.parallel_get_per_domain_timeout()
 
-        url_stack = UserAgent.__get_scheduled_urls(urls_=urls, per_domain_timeout_=per_domain_timeout)
+        scheduler = DomainScheduler(
+            urls=urls,
+            requests_per_domain=self._user_agent_config.parallel_get_per_domain_requests(),
+            per_domain_timeout=self._user_agent_config.parallel_get_per_domain_timeout(),
+        )
+
+        log.debug(lambda: "Fetching %d URLs in parallel; queue depth per domain: %s" % (
+            len(urls), scheduler.queue_depths(),
+        ))
 
-        start_time = time.time()
+        results = queue.Queue()
 
-        url_blocks = {}
-        while len(url_stack) > 0:
-            block_i = len(url_stack) % num_parallel
+        # Workers pick up any URL that can be fetched right away, so there's no point in having more of them than URLs
+        pool = _parallel_get_pool(num_parallel=num_parallel)
+        for _ in range(min(num_parallel, len(urls))):
+            pool.submit(self.__parallel_get_worker, scheduler, results, timeout)
 
-            if block_i not in url_blocks:
-                url_blocks[block_i] = []
+        try:
+            # No timeouts here because we trust the workers to timeout by themselves (by UserAgent)
+            for _ in range(len(urls)):
+                url, response = results.get()
+                if isinstance(response, Exception):
+                    raise McParallelGetException("Fetching URL %s failed: %s" % (url, str(response),))
 
-            url_blocks[block_i].append(url_stack.pop())
+                yield url, response
 
-        pool = multiprocessing.Pool(processes=num_parallel)
+        finally:
+            # Don't fetch the rest of the URLs if caller stopped iterating or fetching failed
+            scheduler.stop()
 
-        all_results = []
-        for i, url_block in url_blocks.items():
-            result = pool.apply_async(_parallel_get_web_store, args=(url_block, start_time, timeout,))
-            all_results.append(result)
+    def parallel_get(self, urls: List[str]) -> List[Response]:
+        """GET multiple URLs in parallel, return responses in the order of URLs."""
 
-        all_responses = []
-        for result in all_results:
-            responses = result.get()
-            all_responses = all_responses + responses
+        urls = decode_object_from_bytes_if_needed(urls)
 
-        # No timeouts here because we trust the workers to timeout by themselves (by UserAgent)
-        pool.close()
-        pool.join()
-        pool.terminate()
+        if not urls:
+            return []
 
-        # Sort URLs in parameter order
-        # (if URLs weren't split into blocks, we could probably use map_async)
         response_url_map = {}
-        for response in all_responses:
-            url = response.scheduled_url.url
-            response_url_map[url] = response.response
+        for url, response in self.parallel_get_iter(urls=urls):
+            response_url_map[url] = response
 
         sorted_responses = []
-        for url in urls:
+        for url in OrderedDict.fromkeys(urls):
             if url not in response_url_map:
                 raise McParallelGetException("URL %s is not in the response URL map %s." % (url, response_url_map,))
 
             sorted_responses.append(response_url_map[url])
 
-        if len(urls) != len(sorted_responses):
-            raise McParallelGetException(
-                "Response count doesn't match URL count; responses: %s; URLs: %s" % (sorted_responses, urls,)
-            )
-
         return sorted_responses
 
     def get_string(self, url: str) -> Union[str, None]:
@@ -591,7 +598,7 @@ class UserAgent(object):
         if len(url) == 0:
             raise McRequestException("URL is empty.")
 
-        log.debug("HTTP request: %s %s\n" % (sql_now(), url,))
+        log.debug(lambda: "HTTP request: %s %s\n" % (sql_now(), url,))
 
     def __prepare_request(self, request: Request) -> requests.PreparedRequest:
         """Create PreparedRequest from UserAgent's Request. Raises if one or more parameters are invalid."""
@@ -745,6 +752,23 @@ class UserAgent(object):
         except Exception as ex:
             raise McRequestException("Unable to prepare request %s: %s" % (str(request), str(ex),))
 
+        http_cache_entry = None
+        if self.__http_cache is not None and self.__request_is_cacheable(request):
+            http_cache_entry = self.__http_cache.get(request.url())
+            if http_cache_entry is not None:
+                if http_cache_entry.is_fresh():
+                    self.__http_cache.record_hit()
+                    return self.__response_from_http_cache_entry(
+                        http_cache_entry=http_cache_entry,
+                        requests_prepared_request=requests_prepared_request,
+                    )
+
+                # Revalidate
+                if http_cache_entry.etag():
+                    requests_prepared_request.headers['If-None-Match'] = http_cache_entry.etag()
+                if http_cache_entry.last_modified():
+                    requests_prepared_request.headers['If-Modified-Since'] = http_cache_entry.last_modified()
+
         try:
             user_agent_response = self.__execute_request(requests_prepared_request)
         except Exception as ex:
@@ -753,6 +777,29 @@ class UserAgent(object):
         if user_agent_response.requests_response is None:
             raise McRequestException("Response from 'requests' is None.")
 
+        if http_cache_entry is not None and user_agent_response.requests_response.status_code == 304:
+            not_modified_response = user_agent_response.requests_response
+            not_modified_response.close()
+
+            if not not_modified_response.history:
+                http_cache_entry = http_cache_entry.revalidated(headers=dict(not_modified_response.headers))
+                self.__http_cache.store(http_cache_entry)
+                self.__http_cache.record_revalidation()
+                return self.__response_from_http_cache_entry(
+                    http_cache_entry=http_cache_entry,
+                    requests_prepared_request=requests_prepared_request,
+                )
+
+            # Got redirected to a different URL which the validators weren't meant for, so refetch unconditionally
+            requests_prepared_request.headers.pop('If-None-Match', None)
+            requests_prepared_request.headers.pop('If-Modified-Since', None)
+            try:
+                user_agent_response = self.__execute_request(requests_prepared_request)
+            except Exception as ex:
+                raise McRequestException(
+                    "Unable to execute request %s: %s" % (str(requests_prepared_request), str(ex),)
+                )
+
         response = Response(
             requests_response=user_agent_response.requests_response,
             max_size=self.max_size(),
@@ -791,8 +838,91 @@ class UserAgent(object):
         )
         response.set_request(response_request)
 
+        if self.__http_cache is not None and self.__request_is_cacheable(request):
+            self.__http_cache.record_miss()
+            self.__store_in_http_cache_if_needed(request=request, response=response)
+
         return response
 
+    @staticmethod
+    def __request_is_cacheable(request: Request) -> bool:
+        """Return True if response to request can be stored in / served from HTTP cache."""
+        if request.method() != 'GET':
+            return False
+        if request.content() is not None:
+            return False
+
+        headers = {name.lower(): value for name, value in request.headers().items()}
+        if 'no-cache' in headers.get('cache-control', '') or 'no-store' in headers.get('cache-control', ''):
+            return False
+        if 'if-none-match' in headers or 'if-modified-since' in headers:
+            # Caller does their own conditional requests
+            return False
+
+        return True
+
+    def __store_in_http_cache_if_needed(self, request: Request, response: Response) -> None:
+        """Store response in HTTP cache if it's cacheable."""
+        if response.code() != HTTPStatus.OK.value:
+            return
+        if response.previous() is not None:
+            # Redirected
+            return
+
+        max_size = self.max_size()
+        if max_size is not None and len(response.raw_data()) > max_size:
+            # Truncated
+            return
+
+        headers = response.headers()
+        if 'no-store' in headers.get('cache-control', '').lower():
+            return
+
+        http_cache_entry = HTTPCacheEntry(
+            url=request.url(),
+            code=response.code(),
+            message=response.message(),
+            headers={
+                # Content got decoded while it was being read
+                name: value for name, value in headers.items()
+                if name not in {'content-length', 'content-encoding', 'transfer-encoding'}
+            },
+            content=response.raw_data(),
+        )
+
+        if not (http_cache_entry.etag() or http_cache_entry.last_modified() or http_cache_entry.is_fresh()):
+            # Wouldn't be able to use it
+            return
+
+        self.__http_cache.store(http_cache_entry)
+
+    def __response_from_http_cache_entry(self,
+                                         http_cache_entry: HTTPCacheEntry,
+                                         requests_prepared_request: requests.PreparedRequest) -> Response:
+        """Create Response from HTTP cache entry."""
+        requests_response = requests.Response()
+        requests_response.status_code = http_cache_entry.code()
+        requests_response.reason = http_cache_entry.message()
+        requests_response.headers = requests.structures.CaseInsensitiveDict(http_cache_entry.headers())
+        requests_response.encoding = requests.utils.get_encoding_from_headers(requests_response.headers)
+        requests_response.url = requests_prepared_request.url
+        requests_response.request = requests_prepared_request
+        requests_response.history = []
+        requests_response.raw = HTTPResponse(body=io.BytesIO(http_cache_entry.content()), preload_content=False)
+
+        response = Response(requests_response=requests_response, max_size=self.max_size())
+        response.set_request(Request.from_requests_prepared_request(requests_prepared_request))
+
+        return response
+
+    def http_cache(self) -> Optional[HTTPCache]:
+        """Return HTTP cache; if None, responses are not being cached."""
+        return self.__http_cache
+
+    def set_http_cache(self, http_cache: Optional[HTTPCache]) -> None:
+        """Set HTTP cache; if None, responses will not be cached."""
+        self.__http_cache = http_cache
+
     def timing(self) -> Union[List[int], None]:
         """Return list of integer seconds; if None, retries are disabled."""
         return self.__timing
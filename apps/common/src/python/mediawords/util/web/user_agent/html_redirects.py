@@ -1,10 +1,10 @@
 import re
 from io import StringIO
-from typing import Union
+from typing import Iterable, Union
 
 from lxml import etree
 
-from mediawords.util.parse_html import meta_refresh_url_from_html, link_canonical_url_from_html
+from mediawords.util.parse_html import meta_refresh_url_from_html_chunks, link_canonical_url_from_html
 from mediawords.util.log import create_logger
 from mediawords.util.perl import decode_object_from_bytes_if_needed
 from mediawords.util.url import is_http_url
@@ -20,12 +20,22 @@ def target_request_from_meta_refresh_url(content: str, archive_site_url: str) ->
     """Given a URL and content from website with META refresh, return a request for the original URL."""
 
     content = decode_object_from_bytes_if_needed(content)
-    archive_site_url = decode_object_from_bytes_if_needed(archive_site_url)
 
     if content is None:
         return None
 
-    target_url = meta_refresh_url_from_html(html=content, base_url=archive_site_url)
+    return target_request_from_meta_refresh_url_chunks(content_chunks=[content], archive_site_url=archive_site_url)
+
+
+def target_request_from_meta_refresh_url_chunks(content_chunks: Iterable[str],
+                                                archive_site_url: str) -> Union[Request, None]:
+    """Given a URL and content chunks from website with META refresh, return a request for the original URL.
+
+    Stops reading chunks at the first META refresh tag, so content doesn't have to be decoded in full."""
+
+    archive_site_url = decode_object_from_bytes_if_needed(archive_site_url)
+
+    target_url = meta_refresh_url_from_html_chunks(html_chunks=content_chunks, base_url=archive_site_url)
     if target_url is None:
         return None
 
@@ -0,0 +1,407 @@
+"""
+On-disk HTTP response cache for UserAgent.
+
+Responses to GET requests get stored together with their validators ("ETag", "Last-Modified") so that the next request
+to the same URL can be made conditional ("If-None-Match", "If-Modified-Since") and the cached body returned on
+"304 Not Modified". Responses that are still fresh according to their "Cache-Control: max-age" (or "Expires") get
+returned without making a request at all.
+"""
+
+import email.utils
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+
+from mediawords.util.log import create_logger
+from mediawords.util.perl import decode_object_from_bytes_if_needed
+from mediawords.util.url import normalize_url
+
+log = create_logger(__name__)
+
+
+class McHTTPCacheException(Exception):
+    """HTTP cache exception."""
+    pass
+
+
+class HTTPCacheEntry(object):
+    """Cached HTTP response."""
+
+    __slots__ = [
+        '__url',
+        '__code',
+        '__message',
+        '__headers',
+        '__content',
+        '__stored_at',
+    ]
+
+    def __init__(self,
+                 url: str,
+                 code: int,
+                 message: str,
+                 headers: Dict[str, str],
+                 content: bytes,
+                 stored_at: Optional[float] = None):
+        self.__url = url
+        self.__code = code
+        self.__message = message
+
+        # Lowercase header names
+        self.__headers = {name.lower(): value for name, value in headers.items()}
+
+        self.__content = content
+        self.__stored_at = stored_at if stored_at is not None else time.time()
+
+    def url(self) -> str:
+        """Return URL that the response was fetched from."""
+        return self.__url
+
+    def code(self) -> int:
+        """Return HTTP status code."""
+        return self.__code
+
+    def message(self) -> str:
+        """Return HTTP status message."""
+        return self.__message
+
+    def headers(self) -> Dict[str, str]:
+        """Return HTTP headers (with lowercase names)."""
+        return self.__headers
+
+    def content(self) -> bytes:
+        """Return (decoded) response body."""
+        return self.__content
+
+    def stored_at(self) -> float:
+        """Return UNIX timestamp of when the response was fetched or last revalidated."""
+        return self.__stored_at
+
+    def etag(self) -> Optional[str]:
+        """Return "ETag" validator."""
+        return self.__headers.get('etag', None)
+
+    def last_modified(self) -> Optional[str]:
+        """Return "Last-Modified" validator."""
+        return self.__headers.get('last-modified', None)
+
+    def freshness_lifetime(self) -> int:
+        """Return for how many seconds the response is to be considered fresh after being stored."""
+        cache_control = _cache_control_directives(self.__headers.get('cache-control', None))
+
+        if 'no-cache' in cache_control:
+            return 0
+
+        max_age = cache_control.get('max-age', None)
+        if max_age is not None:
+            try:
+                return max(int(max_age), 0)
+            except ValueError:
+                return 0
+
+        expires = self.__headers.get('expires', None)
+        date = self.__headers.get('date', None)
+        if expires and date:
+            try:
+                return max(int(email.utils.parsedate_to_datetime(expires).timestamp() -
+                               email.utils.parsedate_to_datetime(date).timestamp()), 0)
+            except (TypeError, ValueError):
+                return 0
+
+        return 0
+
+    def is_fresh(self) -> bool:
+        """Return True if response can be used without revalidating it."""
+        return time.time() - self.__stored_at < self.freshness_lifetime()
+
+    def revalidated(self, headers: Dict[str, str]) -> 'HTTPCacheEntry':
+        """Return entry updated with headers from "304 Not Modified" response."""
+        updated_headers = self.__headers.copy()
+        for name, value in headers.items():
+            name = name.lower()
+            if name not in {'content-length', 'content-encoding', 'transfer-encoding'}:
+                updated_headers[name] = value
+
+        return HTTPCacheEntry(
+            url=self.__url,
+            code=self.__code,
+            message=self.__message,
+            headers=updated_headers,
+            content=self.__content,
+        )
+
+    def to_bytes(self) -> bytes:
+        """Serialize entry to bytes."""
+        metadata = json.dumps({
+            'url': self.__url,
+            'code': self.__code,
+            'message': self.__message,
+            'headers': self.__headers,
+            'stored_at': self.__stored_at,
+        })
+        return metadata.encode('utf-8') + b"\n" + self.__content
+
+    @staticmethod
+    def from_bytes(data: bytes) -> 'HTTPCacheEntry':
+        """Deserialize entry from bytes."""
+        metadata, content = data.split(b"\n", 1)
+        metadata = json.loads(metadata.decode('utf-8'))
+        return HTTPCacheEntry(
+            url=metadata['url'],
+            code=metadata['code'],
+            message=metadata['message'],
+            headers=metadata['headers'],
+            content=content,
+            stored_at=metadata['stored_at'],
+        )
+
+
+__CACHE_CONTROL_DIRECTIVE_REGEX = re.compile(r'\s*([\w-]+)\s*(?:=\s*"?([^",]*)"?)?\s*(?:,|$)')
+
+
+def _cache_control_directives(cache_control: Optional[str]) -> Dict[str, Optional[str]]:
+    """Parse "Cache-Control" header into a dictionary of lowercase directive names and their values."""
+    directives = {}
+    if cache_control:
+        for name, value in __CACHE_CONTROL_DIRECTIVE_REGEX.findall(cache_control):
+            directives[name.lower()] = value or None
+    return directives
+
+
+class HTTPCache(object):
+    """On-disk HTTP response cache keyed by normalized URL.
+
+    Entries older than "ttl" seconds get ignored and removed; once the total size of entries exceeds "max_size" bytes,
+    least recently used entries get removed. Hit / miss counters are per-process."""
+
+    # Default max. total size of cache entries (in bytes)
+    _DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+
+    # Default max. age of cache entries (in seconds)
+    _DEFAULT_TTL = 7 * 24 * 60 * 60
+
+    # Max. size of a single response body to store
+    __MAX_CONTENT_SIZE = 10 * 1024 * 1024
+
+    # Filename extension of cache entries
+    __ENTRY_EXTENSION = '.http'
+
+    __slots__ = [
+        '__directory',
+        '__max_size',
+        '__ttl',
+
+        # Total size of entries, None if it hasn't been calculated yet
+        '__size',
+
+        '__hits',
+        '__revalidations',
+        '__misses',
+        '__stores',
+        '__evictions',
+
+        '__lock',
+    ]
+
+    def __init__(self, directory: str, max_size: int = _DEFAULT_MAX_SIZE, ttl: int = _DEFAULT_TTL):
+        """Constructor."""
+
+        directory = decode_object_from_bytes_if_needed(directory)
+        if not directory:
+            raise McHTTPCacheException("Cache directory is unset.")
+
+        if max_size is None or int(max_size) < 1:
+            raise McHTTPCacheException("Max. cache size must be positive.")
+
+        if ttl is None or int(ttl) < 1:
+            raise McHTTPCacheException("TTL must be positive.")
+
+        os.makedirs(directory, exist_ok=True)
+
+        self.__directory = directory
+        self.__max_size = int(max_size)
+        self.__ttl = int(ttl)
+
+        self.__size = None
+
+        self.__hits = 0
+        self.__revalidations = 0
+        self.__misses = 0
+        self.__stores = 0
+        self.__evictions = 0
+
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(url: str) -> str:
+        """Return cache key of URL."""
+        url = decode_object_from_bytes_if_needed(url)
+        try:
+            url = normalize_url(url)
+        except Exception as ex:
+            log.debug("Unable to normalize URL %s, using it as-is: %s" % (url, str(ex)))
+        return hashlib.sha1(url.encode('utf-8', errors='replace')).hexdigest()
+
+    def __entry_path(self, url: str) -> str:
+        key = self.cache_key(url)
+        return os.path.join(self.__directory, key[:2], key + self.__ENTRY_EXTENSION)
+
+    def __entry_paths(self):
+        for root, _, filenames in os.walk(self.__directory):
+            for filename in filenames:
+                if filename.endswith(self.__ENTRY_EXTENSION):
+                    yield os.path.join(root, filename)
+
+    def __remove_entry_file(self, path: str) -> int:
+        """Remove entry file, return its size."""
+        try:
+            size = os.path.getsize(path)
+            os.unlink(path)
+        except OSError:
+            return 0
+
+        with self.__lock:
+            if self.__size is not None:
+                self.__size = max(self.__size - size, 0)
+
+        return size
+
+    def get(self, url: str) -> Optional[HTTPCacheEntry]:
+        """Return cached entry for URL, or None if there isn't one (or it has expired)."""
+
+        path = self.__entry_path(url)
+
+        try:
+            with open(path, 'rb') as f:
+                entry = HTTPCacheEntry.from_bytes(f.read())
+        except FileNotFoundError:
+            return None
+        except Exception as ex:
+            log.warning("Unable to read HTTP cache entry %s: %s" % (path, str(ex)))
+            self.__remove_entry_file(path)
+            return None
+
+        if time.time() - entry.stored_at() > self.__ttl:
+            self.__remove_entry_file(path)
+            return None
+
+        try:
+            # Mark as recently used
+            os.utime(path)
+        except OSError:
+            pass
+
+        return entry
+
+    def store(self, entry: HTTPCacheEntry) -> None:
+        """Store entry, evict least recently used entries if cache gets too big."""
+
+        if entry is None:
+            raise McHTTPCacheException("Entry is None.")
+
+        if len(entry.content()) > self.__MAX_CONTENT_SIZE:
+            return
+
+        path = self.__entry_path(entry.url())
+        data = entry.to_bytes()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+
+        # Write to temporary file first so that concurrent readers don't get to see partial entries
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except Exception as ex:
+            log.warning("Unable to write HTTP cache entry %s: %s" % (path, str(ex)))
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            return
+
+        with self.__lock:
+            self.__stores += 1
+            if self.__size is not None:
+                self.__size += len(data) - old_size
+            size = self.__size
+
+        if size is None or size > self.__max_size:
+            self.__evict()
+
+    def __evict(self) -> None:
+        """Remove expired entries and, if the cache is still too big, least recently used ones."""
+
+        now = time.time()
+
+        entries = []
+        total_size = 0
+        for path in self.__entry_paths():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_size += stat.st_size
+
+        evicted = 0
+
+        # Leave some room so that eviction doesn't happen on every store()
+        target_size = int(self.__max_size * 0.9)
+
+        for mtime, size, path in sorted(entries):
+            if total_size <= target_size and now - mtime <= self.__ttl:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total_size -= size
+            evicted += 1
+
+        with self.__lock:
+            self.__size = total_size
+            self.__evictions += evicted
+
+    def remove(self, url: str) -> None:
+        """Remove URL's entry (if any)."""
+        self.__remove_entry_file(self.__entry_path(url))
+
+    def record_hit(self) -> None:
+        """Count response served from cache without making a request."""
+        with self.__lock:
+            self.__hits += 1
+
+    def record_revalidation(self) -> None:
+        """Count response served from cache after "304 Not Modified"."""
+        with self.__lock:
+            self.__revalidations += 1
+
+    def record_miss(self) -> None:
+        """Count response that had to be fetched in full."""
+        with self.__lock:
+            self.__misses += 1
+
+    def stats(self) -> Dict[str, float]:
+        """Return cache statistics: "hits", "revalidations", "misses", "stores", "evictions" and "hit_rate"."""
+        with self.__lock:
+            requests_ = self.__hits + self.__revalidations + self.__misses
+            return {
+                'hits': self.__hits,
+                'revalidations': self.__revalidations,
+                'misses': self.__misses,
+                'stores': self.__stores,
+                'evictions': self.__evictions,
+                'hit_rate': (self.__hits + self.__revalidations) / requests_ if requests_ else 0.0,
+            }
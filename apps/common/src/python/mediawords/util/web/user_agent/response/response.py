@@ -3,7 +3,7 @@ import email
 
 import chardet
 from http import HTTPStatus
-from typing import Union, Dict, Optional
+from typing import Union, Dict, Iterator, Optional
 
 import requests
 
@@ -30,6 +30,9 @@ class Response(object):
         # Raw data that was read from the response
         '__response_data',
 
+        # Encoding to decode raw data with (None if it hasn't been determined yet)
+        '__encoding',
+
         '__previous_response',
         '__request',
     ]
@@ -68,6 +71,8 @@ class Response(object):
         self.__requests_response = requests_response
         self.__error_is_client_side = error_is_client_side
 
+        self.__encoding = None
+
         self.__previous_response = None
         self.__request = None
 
@@ -114,7 +119,8 @@ class Response(object):
     def __read_response_data(requests_response: requests.Response, max_size: int) -> bytes:
         """Read data from Response object. Raises on read errors, callers are expected to catch exceptions."""
 
-        response_data = b''
+        # Chunks get joined once at the end instead of copying everything read so far on every chunk
+        chunks = []
 
         url = requests_response.url
 
@@ -126,7 +132,7 @@ class Response(object):
 
         for chunk in requests_response.raw.stream(chunk_size, decode_content=True):
 
-            response_data += chunk
+            chunks.append(chunk)
             response_data_size += len(chunk)  # byte length, not string length
 
             # Content-Length might be missing / lying, so we measure size while fetching the data too
@@ -135,13 +141,23 @@ class Response(object):
                     log.warning("Data size exceeds %d for URL %s" % (max_size, url,))
                     break
 
-        return response_data
+        if len(chunks) == 1:
+            return chunks[0]
+
+        return b''.join(chunks)
 
     def raw_data(self) -> bytes:
         return self.__response_data
 
-    def decoded_content(self) -> str:
-        """Return content in UTF-8 encoding."""
+    def raw_data_view(self) -> memoryview:
+        """Return read-only view of raw data (to be able to slice it without copying)."""
+        return memoryview(self.__response_data)
+
+    def encoding(self) -> str:
+        """Return encoding to decode raw data with (as determined from HTTP headers or the start of the content)."""
+
+        if self.__encoding is not None:
+            return self.__encoding
 
         url = self.__requests_response.url
 
@@ -184,14 +200,47 @@ class Response(object):
             if encoding is None:
                 encoding = 'UTF-8'
 
+        self.__encoding = encoding
+
+        return encoding
+
+    def decoded_content(self) -> str:
+        """Return content in UTF-8 encoding."""
+
         try:
-            decoded_content = codecs.decode(self.__response_data, encoding=encoding, errors='replace')
+            decoded_content = codecs.decode(self.__response_data, encoding=self.encoding(), errors='replace')
         except Exception as ex:
-            log.warning("Unable to decode data for URL {}: {}".format(url, str(ex)))
+            log.warning("Unable to decode data for URL {}: {}".format(self.__requests_response.url, str(ex)))
             decoded_content = ''
 
         return decoded_content
 
+    def iter_decoded_content(self, chunk_size: int = 1024 * 64) -> Iterator[str]:
+        """Decode content incrementally, yield decoded chunks of up to chunk_size bytes of raw data each.
+
+        Useful for consumers which might be able to stop before decoding the whole (possibly huge) content."""
+
+        if chunk_size < 1:
+            raise McUserAgentResponseException("Chunk size must be positive.")
+
+        try:
+            decoder = codecs.getincrementaldecoder(self.encoding())(errors='replace')
+        except Exception as ex:
+            log.warning("Unable to decode data for URL {}: {}".format(self.__requests_response.url, str(ex)))
+            return
+
+        raw_data = self.raw_data_view()
+
+        for offset in range(0, len(raw_data), chunk_size):
+            # Not every decoder supports memoryviews, so copy just the chunk
+            decoded_chunk = decoder.decode(bytes(raw_data[offset:offset + chunk_size]))
+            if decoded_chunk:
+                yield decoded_chunk
+
+        decoded_chunk = decoder.decode(b'', final=True)
+        if decoded_chunk:
+            yield decoded_chunk
+
     def decoded_utf8_content(self) -> str:
         """Return content in UTF-8 content while assuming that the raw data is in UTF-8."""
         # FIXME how do we do this?
@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+from mediawords.util.log import create_logger
+from mediawords.util.perl import decode_object_from_bytes_if_needed
+from mediawords.util.url import get_url_distinctive_domain
+
+log = create_logger(__name__)
+
+
+class McDomainSchedulerException(Exception):
+    """DomainScheduler exception."""
+    pass
+
+
+class _TokenBucket(object):
+    """Per-domain token bucket."""
+
+    __slots__ = [
+        'tokens',
+        'updated_at',
+    ]
+
+    def __init__(self, tokens: float, updated_at: float):
+        self.tokens = tokens
+        self.updated_at = updated_at
+
+
+class DomainScheduler(object):
+    """Hands out URLs to fetch to any number of worker threads while limiting the request rate to every domain.
+
+    Every domain (as returned by get_url_distinctive_domain()) gets a token bucket that holds up to
+    "requests_per_domain" tokens and refills at a rate of "requests_per_domain" tokens per "per_domain_timeout"
+    seconds. Every URL handed out takes a token, so a domain gets at most "requests_per_domain" requests in a burst, and
+    on average at most that many requests every "per_domain_timeout" seconds afterwards.
+
+    Workers call next_url() which returns a URL from any domain that has a token available (domains take turns), so
+    idle workers pick up whatever can be fetched right away instead of waiting for a slow domain."""
+
+    __slots__ = [
+        '__requests_per_domain',
+        '__refill_rate',
+
+        # Domain -> queue of URLs still to be handed out; domains that got served most recently are at the end
+        '__domain_urls',
+
+        # Domain -> token bucket
+        '__buckets',
+
+        '__condition',
+        '__stopped',
+    ]
+
+    def __init__(self, urls: List[str], requests_per_domain: int, per_domain_timeout: float):
+        """Constructor."""
+
+        urls = decode_object_from_bytes_if_needed(urls)
+
+        if urls is None:
+            raise McDomainSchedulerException("URLs is None.")
+
+        requests_per_domain = int(requests_per_domain)
+        if requests_per_domain < 1:
+            raise McDomainSchedulerException("Requests per domain must be positive.")
+
+        per_domain_timeout = float(per_domain_timeout)
+        if per_domain_timeout < 0:
+            raise McDomainSchedulerException("Per-domain timeout is negative.")
+
+        self.__requests_per_domain = requests_per_domain
+
+        # Tokens per second; None if not limited
+        self.__refill_rate = requests_per_domain / per_domain_timeout if per_domain_timeout else None
+
+        self.__domain_urls = OrderedDict()
+        for url in urls:
+            domain = get_url_distinctive_domain(url)
+            if domain not in self.__domain_urls:
+                self.__domain_urls[domain] = deque()
+            self.__domain_urls[domain].append(url)
+
+        now = time.monotonic()
+        self.__buckets = {
+            domain: _TokenBucket(tokens=float(requests_per_domain), updated_at=now)
+            for domain in self.__domain_urls.keys()
+        }
+
+        self.__condition = threading.Condition()
+        self.__stopped = False
+
+    def __refill(self, bucket: _TokenBucket, now: float) -> None:
+        if self.__refill_rate is None:
+            bucket.tokens = float(self.__requests_per_domain)
+        else:
+            bucket.tokens = min(
+                float(self.__requests_per_domain),
+                bucket.tokens + (now - bucket.updated_at) * self.__refill_rate,
+            )
+        bucket.updated_at = now
+
+    def next_url(self) -> Optional[str]:
+        """Wait for a URL that can be fetched right now and return it; return None if there are no URLs left."""
+
+        with self.__condition:
+            while True:
+
+                if self.__stopped or not self.__domain_urls:
+                    return None
+
+                now = time.monotonic()
+                min_wait = None
+
+                for domain, urls in self.__domain_urls.items():
+                    bucket = self.__buckets[domain]
+                    self.__refill(bucket=bucket, now=now)
+
+                    if bucket.tokens >= 1:
+                        bucket.tokens -= 1
+
+                        url = urls.popleft()
+
+                        if urls:
+                            # Let other domains go first next time
+                            self.__domain_urls.move_to_end(domain)
+                        else:
+                            del self.__domain_urls[domain]
+
+                        return url
+
+                    wait = (1 - bucket.tokens) / self.__refill_rate
+                    if min_wait is None or wait < min_wait:
+                        min_wait = wait
+
+                self.__condition.wait(timeout=min_wait)
+
+    def stop(self) -> None:
+        """Stop handing out URLs, make waiting workers return."""
+        with self.__condition:
+            self.__stopped = True
+            self.__condition.notify_all()
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Return domain -> number of URLs that are still waiting to be handed out."""
+        with self.__condition:
+            return {domain: len(urls) for domain, urls in self.__domain_urls.items()}
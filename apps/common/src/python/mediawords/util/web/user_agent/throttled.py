@@ -1,5 +1,9 @@
 """Implement ThrottledUserAgent as a sub class of mediawords.util.web.UserAgent with per domain throttling."""
 
+import abc
+import os
+import threading
+import time
 import typing
 
 import mediawords.db
@@ -40,18 +44,157 @@ class McThrottledDomainException(Exception):
     pass
 
 
+class DomainThrottle(object, metaclass=abc.ABCMeta):
+    """Abstract domain throttle which decides whether a request to a domain can be made right now."""
+
+    @abc.abstractmethod
+    def acquire(self, domain: str, domain_timeout: int) -> float:
+        """Try to lock domain for domain_timeout seconds.
+
+        Return 0 if the lock was obtained and the request can be made, or number of seconds until the domain is
+        expected to get unlocked."""
+        raise NotImplementedError("Abstract method")
+
+
+class PostgreSQLDomainThrottle(DomainThrottle):
+    """Domain throttle shared by all the workers through PostgreSQL's domain_web_requests table."""
+
+    __slots__ = [
+        '__db',
+    ]
+
+    def __init__(self, db: mediawords.db.DatabaseHandler):
+        self.__db = db
+
+    def acquire(self, domain: str, domain_timeout: int) -> float:
+        # this postgres function returns true if we are allowed to make the request and false otherwise. this
+        # function does not use a table lock, so some extra requests might sneak through, but that's better than
+        # dealing with a lock.  we use a postgres function to make the the race condition as rare as possible.
+        got_domain_lock = self.__db.query(
+            "select get_domain_web_requests_lock(%s, %s)",
+            (domain, domain_timeout)).flat()[0]
+
+        if got_domain_lock:
+            return 0
+
+        # Find out for how long the domain will stay locked so that callers don't have to ask again too soon
+        wait = self.__db.query("""
+            SELECT %(domain_timeout)s - EXTRACT(EPOCH FROM NOW() - MAX(request_time))
+            FROM domain_web_requests
+            WHERE domain = %(domain)s
+        """, {'domain': domain, 'domain_timeout': domain_timeout}).flat()[0]
+
+        # Lock might have been released in the meantime, but the caller is expected to try again anyway
+        return max(float(wait or 0), 0.001)
+
+
+# Domain -> time.monotonic() of the last request to the domain, either made by this process or implied by the backend's
+# denial; shared by all LocalDomainThrottle objects of a process
+__local_domain_requests = {}  # type: typing.Dict[str, float]
+
+__local_domain_requests_pid = None
+__local_domain_requests_lock = threading.Lock()
+
+# Max. number of domains to keep in the local lock table
+__LOCAL_DOMAIN_REQUESTS_MAX_SIZE = 100000
+
+
+def _local_domain_locked_for(domain: str, domain_timeout: float) -> float:
+    """Return number of seconds for which the domain is known to stay locked for a caller with the specified timeout,
+    0 if it isn't known to be locked."""
+    global __local_domain_requests, __local_domain_requests_pid
+
+    with __local_domain_requests_lock:
+        if __local_domain_requests_pid != os.getpid():
+            __local_domain_requests = {}
+            __local_domain_requests_pid = os.getpid()
+
+        last_request_at = __local_domain_requests.get(domain, None)
+        if last_request_at is None:
+            return 0
+
+        # Compare against the caller's timeout and not the timeout of whoever got (or got denied) the domain last, just
+        # like get_domain_web_requests_lock() does
+        since_last_request = time.monotonic() - last_request_at
+        if since_last_request < domain_timeout:
+            return domain_timeout - since_last_request
+
+        return 0
+
+
+def __set_local_domain_last_request_at(domain: str, last_request_at: float) -> None:
+    with __local_domain_requests_lock:
+        if len(__local_domain_requests) >= __LOCAL_DOMAIN_REQUESTS_MAX_SIZE:
+            # Forgetting about a request only means that the backend will get asked again
+            __local_domain_requests.clear()
+
+        __local_domain_requests[domain] = max(last_request_at, __local_domain_requests.get(domain, last_request_at))
+
+
+def _set_local_domain_granted(domain: str) -> None:
+    """Record that a request to the domain is being made right now."""
+    __set_local_domain_last_request_at(domain=domain, last_request_at=time.monotonic())
+
+
+def _set_local_domain_denied(domain: str, domain_timeout: float, locked_for: float) -> None:
+    """Record that the backend denied a request with the specified timeout as the domain will stay locked for
+    "locked_for" seconds.
+
+    Backend's timeout is relative to the last request to the domain, so remember when that request was made; callers
+    with a smaller timeout than the denied one will then get passed on to the backend again."""
+    since_last_request = max(domain_timeout - locked_for, 0)
+    __set_local_domain_last_request_at(domain=domain, last_request_at=time.monotonic() - since_last_request)
+
+
+class LocalDomainThrottle(DomainThrottle):
+    """Domain throttle that remembers domain locks in a table shared by the whole process.
+
+    Domains that are known to have been requested within the caller's timeout (either by this process or, as implied
+    by the backend's denial, by someone else) get denied without asking the backend. Only domains that might be
+    unlocked get passed on to the backend (if any), so that the locks are still shared with other processes."""
+
+    __slots__ = [
+        '__backend',
+    ]
+
+    def __init__(self, backend: typing.Optional[DomainThrottle] = None):
+        self.__backend = backend
+
+    def acquire(self, domain: str, domain_timeout: int) -> float:
+        locked_for = _local_domain_locked_for(domain=domain, domain_timeout=domain_timeout)
+        if locked_for > 0:
+            return locked_for
+
+        if self.__backend is not None:
+            locked_for = self.__backend.acquire(domain=domain, domain_timeout=domain_timeout)
+            if locked_for > 0:
+                _set_local_domain_denied(domain=domain, domain_timeout=domain_timeout, locked_for=locked_for)
+                return locked_for
+
+        _set_local_domain_granted(domain=domain)
+
+        return 0
+
+
 class ThrottledUserAgent(UserAgent):
     """Add per domain throttling to mediawords.util.web.UserAgent."""
 
     def __init__(self,
                  db: mediawords.db.DatabaseHandler,
                  domain_timeout: typing.Optional[int] = None,
-                 user_agent_config: UserAgentConfig = None) -> None:
+                 user_agent_config: UserAgentConfig = None,
+                 throttle: typing.Optional[DomainThrottle] = None,
+                 max_wait: typing.Optional[float] = None) -> None:
         """
         Add database handler and domain_timeout to UserAgent object.
 
         If domain_timeout is not specified, use mediawords.throttled_user_agent_domain_timeout from mediawords.yml.
         If not present in mediawords.yml, use _DEFAULT_DOMAIN_TIMEOUT.
+
+        If throttle is not specified, use LocalDomainThrottle backed by PostgreSQLDomainThrottle.
+
+        If max_wait is set, wait for up to max_wait seconds for the domain to get unlocked instead of raising
+        McThrottledDomainException right away.
         """
 
         super().__init__(user_agent_config=user_agent_config)
@@ -62,6 +205,12 @@ class ThrottledUserAgent(UserAgent):
         if self.domain_timeout is None:
             self.domain_timeout = _DEFAULT_DOMAIN_TIMEOUT
 
+        self.throttle = throttle
+        if self.throttle is None:
+            self.throttle = LocalDomainThrottle(backend=PostgreSQLDomainThrottle(db=db))
+
+        self.max_wait = max_wait
+
         self._use_throttling = True
 
         super().__init__()
@@ -71,9 +220,9 @@ class ThrottledUserAgent(UserAgent):
         Execute domain throttled version of mediawords.util.web.user_agent.UserAgent.request.
 
         Before executing the request, the method will check whether a request has been made for this domain within the
-        last self.domain_timeout seconds.  If so, the call will raise a McThrottledDomainException.
-        Otherwise, the method will mark the time for this domain request in a postgres table and then execute
-        UserAgent.request().
+        last self.domain_timeout seconds.  If so, the call will wait for up to self.max_wait seconds for the domain to
+        get unlocked, and raise a McThrottledDomainException if it doesn't.  Otherwise, the method will mark the time
+        for this domain request with self.throttle and then execute UserAgent.request().
 
         The throttling routine will not be applied after the first successful request, to allow for redirects and
         other followup requests to succeed.  To ensure proper throttling, a new object should be create for each
@@ -89,19 +238,22 @@ class ThrottledUserAgent(UserAgent):
             if domain_timeout > 1 and (is_shortened_url(request.url()) or domain in _ACCELERATED_DOMAINS):
                 domain_timeout = max(1, int(self.domain_timeout / _ACCELERATED_DOMAIN_SPEEDUP_FACTOR))
 
-            # this postgres function returns true if we are allowed to make the request and false otherwise. this
-            # function does not use a table lock, so some extra requests might sneak through, but that's better than
-            # dealing with a lock.  we use a postgres function to make the the race condition as rare as possible.
-            got_domain_lock = self.db.query(
-                "select get_domain_web_requests_lock(%s, %s)",
-                (domain, domain_timeout)).flat()[0]
+            waited = 0.0
+            while True:
+                locked_for = self.throttle.acquire(domain=domain, domain_timeout=domain_timeout)
+
+                log.debug("domain lock obtained for %s: %s", request.url(), locked_for == 0)
+
+                if locked_for == 0:
+                    break
 
-            log.debug("domain lock obtained for %s: %s" % (str(request.url()), str(got_domain_lock)))
+                if self.max_wait is None or waited + locked_for > self.max_wait:
+                    raise McThrottledDomainException("domain " + str(domain) + " is locked.")
 
-            if not got_domain_lock:
-                raise McThrottledDomainException("domain " + str(domain) + " is locked.")
+                time.sleep(locked_for)
+                waited += locked_for
         else:
-            log.debug("domain lock obtained for %s: skipped" % str(request.url()))
+            log.debug("domain lock obtained for %s: skipped", request.url())
 
         self._use_throttling = False
 
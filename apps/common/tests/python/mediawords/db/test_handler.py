@@ -1,13 +1,16 @@
 import re
+import threading
 from unittest import TestCase
 
 import pytest
 
 from mediawords.db import connect_to_db
 from mediawords.db.exceptions.handler import McPrimaryKeyColumnException
+from mediawords.db.copy.copy_from import McCopyFromException
 from mediawords.db.exceptions.result import McDatabaseResultException
 from mediawords.db.handler import (
     McUpdateByIDException, McCreateException, McRequireByIDException, McUniqueConstraintException,
+    McInsertManyException,
 )
 from mediawords.util.log import create_logger
 
@@ -330,6 +333,55 @@ class TestDatabaseHandler(TestCase):
         assert isinstance(hashes[0]['dob'], str)
         assert isinstance(hashes[1]['dob'], str)
 
+    def test_prepare_statements(self):
+        assert self.__db.prepare_statements() is False
+        self.__db.set_prepare_statements(True)
+        assert self.__db.prepare_statements() is True
+
+        for _ in range(3):
+            # Dictionary parameters
+            row = self.__db.query("SELECT * FROM kardashians WHERE name = %(name)s", {'name': 'Khloé'}).hash()
+            assert row['surname'] == 'Kardashian'
+
+            # Tuple parameters and a literal percentage sign
+            rows = self.__db.query(
+                "SELECT name FROM kardashians WHERE surname LIKE 'Jen%' AND id > %s ORDER BY id", (2,)
+            ).flat()
+            assert rows == ['Kendall', 'Kylie']
+
+            # DBD::Pg style, tuple parameter
+            rows = self.__db.query("SELECT name FROM kardashians WHERE id IN (??) ORDER BY id", 1, 2).flat()
+            assert rows == ['Kris', 'Caitlyn']
+
+        (prepared_count,) = self.__db.query("SELECT COUNT(*) FROM pg_prepared_statements").flat()
+        assert prepared_count == 2
+
+        self.__db.set_prepare_statements(False)
+        (prepared_count,) = self.__db.query("SELECT COUNT(*) FROM pg_prepared_statements").flat()
+        assert prepared_count == 0
+
+    def test_query_stream(self):
+        names = [row['name'] for row in self.__db.query_stream(
+            "SELECT * FROM kardashians WHERE surname = ? ORDER BY id", 'Kardashian', batch_size=2,
+        )]
+        assert names == ['Kourtney', 'Kim', 'Khloé', 'Rob']
+        assert self.__db.in_transaction() is False
+
+        rows = list(self.__db.query_stream("SELECT * FROM kardashians WHERE name = %(name)s", {'name': 'Kris'}))
+        assert len(rows) == 1
+
+        # MC_REWRITE_TO_PYTHON: remove after __convert_datetime_objects_to_strings() gets removed and database handler
+        # is made to return datetime.datetime objects again
+        assert isinstance(rows[0]['dob'], str)
+
+        # Stopping early
+        self.__db.begin()
+        for row in self.__db.query_stream("SELECT * FROM kardashians ORDER BY id", batch_size=3):
+            assert row['name'] == 'Kris'
+            break
+        assert self.__db.in_transaction() is True
+        self.__db.commit()
+
     def test_primary_key_column(self):
         primary_key = self.__db.primary_key_column('kardashians')
         assert primary_key == 'id'
@@ -502,6 +554,32 @@ class TestDatabaseHandler(TestCase):
         with pytest.raises(McUniqueConstraintException):
             self.__db.create('kardashians', insert_hash)
 
+    def test_insert_many(self):
+        rows = self.__db.insert_many(table='kardashians', rows=[
+            {'name': 'Lamar', 'surname': 'Odom', 'dob': '1979-11-06'},
+            {'name': 'Sam Brody', 'surname': '𝐽𝑒𝑛𝑛𝑒𝑟', 'dob': '1983-08-21'},  # UTF-8
+        ])
+        assert [row['name'] for row in rows] == ['Lamar', 'Sam Brody']
+        assert rows[1]['surname'] == '𝐽𝑒𝑛𝑛𝑒𝑟'
+        assert str(rows[0]['dob']) == '1979-11-06'
+
+        assert self.__db.insert_many(table='kardashians', rows=[]) == []
+
+        # Different columns
+        with pytest.raises(McInsertManyException):
+            self.__db.insert_many('kardashians', [{'name': 'Scott', 'surname': 'Disick'}, {'name': 'Travis'}])
+
+        # unique constraint
+        with pytest.raises(McUniqueConstraintException):
+            self.__db.insert_many('kardashians', [{'name': 'Lamar', 'surname': 'Odom', 'dob': '1979-11-06'}])
+
+        # ON CONFLICT
+        rows = self.__db.insert_many(table='kardashians', on_conflict='(name) DO NOTHING', rows=[
+            {'name': 'Lamar', 'surname': 'Odom', 'dob': '1979-11-06'},
+            {'name': 'Scott', 'surname': 'Disick', 'dob': '1983-05-26'},
+        ])
+        assert [row['name'] for row in rows] == ['Scott']
+
     def test_create_updatable_view(self):
         """Test create() against an updatable view that's in front of a partitioned table."""
 
@@ -616,6 +694,28 @@ class TestDatabaseHandler(TestCase):
         assert row_hash is not None
         assert row_hash['surname'] == 'Odom'
 
+    def test_find_or_create_many(self):
+        rows = self.__db.find_or_create_many(table='kardashians', insert_hashes=[
+            {'name': 'Lamar', 'surname': 'Odom', 'dob': '1979-11-06'},
+            {'name': 'Kim', 'surname': 'Kardashian', 'dob': '1980-10-21'},
+            {'name': 'Lamar', 'surname': 'Odom', 'dob': '1979-11-06'},
+        ])
+        assert [row['name'] for row in rows] == ['Lamar', 'Kim', 'Lamar']
+        assert rows[0]['id'] == rows[2]['id']
+        assert rows[1]['id'] == 4
+
+        (lamar_count,) = self.__db.query("SELECT COUNT(*) FROM kardashians WHERE name = 'Lamar'").flat()
+        assert lamar_count == 1
+
+        # Should SELECT only
+        rows = self.__db.find_or_create_many(table='kardashians', insert_hashes=[
+            {'name': 'Lamar', 'surname': 'Odom', 'dob': '1979-11-06'},
+        ])
+        assert rows[0]['surname'] == 'Odom'
+
+        (total_count,) = self.__db.query("SELECT COUNT(*) FROM kardashians").flat()
+        assert total_count == 9
+
     def test_begin_commit(self):
 
         row = self.__db.query("SELECT * FROM kardashians WHERE name = 'Lamar'")
@@ -696,6 +796,85 @@ class TestDatabaseHandler(TestCase):
         assert row['surname'] == '𝐽𝑒𝑛𝑛𝑒𝑟'
         assert str(row['dob']) == '1983-08-21'
 
+    def test_copy_from_large(self):
+        self.__db.query("CREATE TEMPORARY TABLE numbers (number BIGINT NOT NULL, description TEXT NOT NULL)")
+
+        # Should be streamed in multiple chunks
+        copy = self.__db.copy_from(sql="COPY numbers (number, description) FROM STDIN")
+        for number in range(50000):
+            copy.put_line("%d\tNumber %d\n" % (number, number))
+        copy.end()
+
+        (count, total,) = self.__db.query("SELECT COUNT(*), SUM(number) FROM numbers").flat()
+        assert count == 50000
+        assert total == sum(range(50000))
+
+    def test_copy_from_failure(self):
+        copy = self.__db.copy_from(sql="COPY kardashians (name, surname, dob, married_to_kanye) FROM STDIN WITH CSV")
+        copy.put_line("Lamar,Odom,not a date,f\n")
+        with pytest.raises(McCopyFromException):
+            copy.end()
+
+        # Handler should still be usable
+        (count,) = self.__db.query("SELECT COUNT(*) FROM kardashians").flat()
+        assert count == 8
+
+    def test_copy_from_context_manager(self):
+        sql = "COPY kardashians (name, surname, dob, married_to_kanye) FROM STDIN WITH CSV"
+        with self.__db.copy_from(sql=sql) as copy:
+            copy.put_line("Lamar,Odom,1979-11-06,f\n")
+
+        (count,) = self.__db.query("SELECT COUNT(*) FROM kardashians WHERE name = 'Lamar'").flat()
+        assert count == 1
+
+    def test_copy_from_abort(self):
+        def __copy_threads():
+            return [thread for thread in threading.enumerate() if thread.name == 'CopyFrom']
+
+        assert not __copy_threads()
+
+        # Producer fails midway after some of the chunks got streamed already
+        with pytest.raises(ZeroDivisionError):
+            with self.__db.copy_from(sql="COPY kardashians (name, surname, dob, married_to_kanye) FROM STDIN") as copy:
+                for number in range(50000):
+                    copy.put_line("Name %d\tSurname\t2000-01-01\tf\n" % number)
+                assert __copy_threads()
+                copy.put_line("%d" % (1 / 0))
+
+        assert not __copy_threads()
+
+        # Nothing got copied and the handler is still usable
+        (count,) = self.__db.query("SELECT COUNT(*) FROM kardashians").flat()
+        assert count == 8
+
+        # Aborting explicitly
+        copy = self.__db.copy_from(sql="COPY kardashians (name, surname, dob, married_to_kanye) FROM STDIN WITH CSV")
+        copy.put_line("Lamar,Odom,1979-11-06,f\n")
+        copy.abort()
+        assert not __copy_threads()
+
+        with pytest.raises(McCopyFromException):
+            copy.end()
+
+        (count,) = self.__db.query("SELECT COUNT(*) FROM kardashians").flat()
+        assert count == 8
+
+    def test_copy_from_binary_bigints(self):
+        self.__db.query("CREATE TEMPORARY TABLE pairs (a BIGINT NOT NULL, b BIGINT NULL)")
+
+        copy = self.__db.copy_from_binary_bigints(sql="COPY pairs (a, b) FROM STDIN WITH (FORMAT binary)")
+        copy.put_row([1, 2])
+        copy.put_row([-3, None])
+        copy.put_row([2 ** 62, 0])
+        copy.end()
+
+        rows = self.__db.query("SELECT a, b FROM pairs ORDER BY a").hashes()
+        assert rows == [
+            {'a': -3, 'b': None},
+            {'a': 1, 'b': 2},
+            {'a': 2 ** 62, 'b': 0},
+        ]
+
     def test_copy_to(self):
         sql = """
             COPY (
@@ -0,0 +1,92 @@
+import os
+import signal
+
+from mediawords.db.stats import (
+    query_fingerprint,
+    record_query,
+    query_stats,
+    reset_query_stats,
+    enable_query_stats,
+    query_stats_enabled,
+    log_query_stats_on_signal,
+)
+
+
+def test_query_fingerprint():
+    assert query_fingerprint("""
+        SELECT *
+        FROM stories
+        WHERE stories_id = 123
+          AND title = 'It''s a title'
+          AND media_id IN (1, 2, 3)
+          AND url = %(url)s
+          AND guid = %s
+    """) == "SELECT * FROM stories WHERE stories_id = ? AND title = ? AND media_id IN (?) AND url = ? AND guid = ?"
+
+    assert query_fingerprint("SELECT * FROM table_1 WHERE id = 1") == "SELECT * FROM table_1 WHERE id = ?"
+
+    # Long queries get fingerprinted by their prefix
+    long_query = "SELECT * FROM foo WHERE id IN (%s)" % ', '.join(str(x) for x in range(10000))
+    long_query_fingerprint = query_fingerprint(long_query)
+    assert long_query_fingerprint.startswith("SELECT * FROM foo WHERE id IN (?")
+    assert len(long_query_fingerprint) < 40
+
+
+def test_query_stats():
+    reset_query_stats()
+
+    # Not collected unless enabled
+    enable_query_stats(False)
+    record_query(query="SELECT * FROM foo WHERE id = 1", query_time=0.5, rows=1)
+    assert query_stats() == []
+
+    enable_query_stats()
+
+    record_query(query="SELECT * FROM foo WHERE id = 1", query_time=0.5, rows=1)
+    record_query(query="SELECT * FROM foo WHERE id = 2", query_time=1.5, rows=0)
+    record_query(query="SELECT * FROM bar", query_time=1.0, rows=10)
+
+    stats = query_stats()
+    assert len(stats) == 2
+
+    assert stats[0]['fingerprint'] == "SELECT * FROM foo WHERE id = ?"
+    assert stats[0]['calls'] == 2
+    assert stats[0]['total_time'] == 2.0
+    assert stats[0]['mean_time'] == 1.0
+    assert stats[0]['rows'] == 1
+
+    assert stats[1]['fingerprint'] == "SELECT * FROM bar"
+    assert stats[1]['rows'] == 10
+
+    reset_query_stats()
+    assert query_stats() == []
+
+    enable_query_stats(False)
+
+
+def test_log_query_stats_on_signal():
+    reset_query_stats()
+    enable_query_stats(False)
+
+    previous_handler = signal.getsignal(signal.SIGUSR2)
+    try:
+        log_query_stats_on_signal()
+
+        # Not collected until asked to
+        assert query_stats_enabled() is False
+        record_query(query="SELECT * FROM foo WHERE id = 1", query_time=0.5, rows=1)
+        assert query_stats() == []
+
+        os.kill(os.getpid(), signal.SIGUSR2)
+        assert query_stats_enabled() is True
+        record_query(query="SELECT * FROM foo WHERE id = 1", query_time=0.5, rows=1)
+        assert len(query_stats()) == 1
+
+        # Logged and not collected anymore
+        os.kill(os.getpid(), signal.SIGUSR2)
+        assert query_stats_enabled() is False
+        assert query_stats() == []
+
+    finally:
+        signal.signal(signal.SIGUSR2, previous_handler)
+        enable_query_stats(False)
@@ -2,6 +2,7 @@
 from mediawords.dbi.downloads.store import (
     McDBIDownloadsException,
     fetch_content,
+    fetch_contents,
     _default_amazon_s3_downloads_config,
     _get_store_for_reading,
 )
@@ -55,3 +56,51 @@ class TestFetchContent(TestDownloadsDB):
             download_storage_config=DoNotReadAllFromS3DownloadStorageConfig(),
         )
         assert got_content == content.decode()
+
+    def test_fetch_contents(self) -> None:
+        """Test fetch_contents() with downloads stored in different stores."""
+        db = self._db
+
+        class DoNotReadAllFromS3DownloadStorageConfig(DownloadStorageConfig):
+            @staticmethod
+            def read_all_from_s3():
+                return False
+
+            @staticmethod
+            def fallback_postgresql_to_s3():
+                return False
+
+        with self.assertRaises(McDBIDownloadsException):
+            fetch_contents(db=db, downloads=[self.test_download, {'downloads_id': 1, 'state': 'error'}])
+
+        assert fetch_contents(db=db, downloads=[]) == []
+
+        inline_download = db.create('downloads', {
+            'feeds_id': self.test_feed['feeds_id'],
+            'url': 'http://inline.download/',
+            'host': 'inline.download',
+            'type': 'feed',
+            'sequence': 1,
+            'state': 'success',
+            'path': 'content:inline content',
+            'priority': 2,
+            'extracted': False,
+        })
+
+        postgresql_download = db.update_by_id('downloads', self.test_download['downloads_id'], {
+            'path': 'postgresql:raw_downloads',
+        })
+
+        store = _get_store_for_reading(
+            download=postgresql_download,
+            amazon_s3_downloads_config=_default_amazon_s3_downloads_config(),
+            download_storage_config=DoNotReadAllFromS3DownloadStorageConfig(),
+        )
+        store.store_content(db=db, object_id=postgresql_download['downloads_id'], content='foo bar')
+
+        contents = fetch_contents(
+            db=db,
+            downloads=[postgresql_download, inline_download, postgresql_download],
+            download_storage_config=DoNotReadAllFromS3DownloadStorageConfig(),
+        )
+        assert contents == ['foo bar', 'inline content', 'foo bar']
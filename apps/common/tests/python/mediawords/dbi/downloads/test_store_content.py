@@ -32,7 +32,13 @@ class TestStoreContent(TestDownloadsDB):
         )
 
         content = 'bat baz bar foo'
+        self.test_download['error_message'] = 'Previous error.'
+        download_before = self.test_download.copy()
         got_download = store_content(db=self._db, download=self.test_download, content=content)
+
+        # Caller's download shouldn't get modified
+        assert self.test_download == download_before
+        self.test_download['error_message'] = None
         got_content = store.fetch_content(db=self._db, object_id=self.test_download['downloads_id']).decode()
 
         assert got_content == content
@@ -0,0 +1,104 @@
+from typing import List
+
+import celery
+from kombu import Exchange, Queue
+
+# noinspection PyProtectedMember
+from mediawords.job import BatchJob, _BatchWorker
+
+
+def test_batch_worker():
+    queue_name = 'MediaWords::Job::TestBatchWorker'
+
+    # In-memory broker and result backend
+    app = celery.Celery(queue_name, broker='memory://', backend='cache+memory://')
+    queue = Queue(name=queue_name, exchange=Exchange(queue_name), routing_key=queue_name)
+    app.conf.task_queues = [queue]
+
+    batches = []
+
+    def __handler(jobs: List[BatchJob]) -> list:
+        batches.append(jobs)
+
+        results = []
+        for job in jobs:
+            if job.kwargs()['number'] == 3:
+                results.append(ValueError("Three is not allowed."))
+            else:
+                results.append(job.kwargs()['number'] * 2)
+        return results
+
+    worker = _BatchWorker(app=app, queue=queue, handler=__handler, batch_size=2, batch_timeout=0.1)
+
+    job_ids = []
+    for number in range(1, 6):
+        result = app.send_task(queue_name, kwargs={'number': number}, queue=queue_name, routing_key=queue_name)
+        job_ids.append(result.id)
+
+    with app.connection_for_read() as connection:
+        with worker.consumer(connection=connection):
+            assert worker.run_batch(connection=connection) == 2
+            assert worker.run_batch(connection=connection) == 2
+
+            # Last batch doesn't fill up, gets handled after timeout
+            assert worker.run_batch(connection=connection) == 1
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+
+    all_jobs = [job for batch in batches for job in batch]
+    assert [job.kwargs()['number'] for job in all_jobs] == [1, 2, 3, 4, 5]
+    assert [job.job_id() for job in all_jobs] == job_ids
+
+    assert app.AsyncResult(job_ids[0]).get(timeout=1) == 2
+    assert app.AsyncResult(job_ids[4]).get(timeout=1) == 10
+    assert app.AsyncResult(job_ids[2]).state == 'FAILURE'
+
+
+def test_batch_worker_handler_failure():
+    queue_name = 'MediaWords::Job::TestBatchWorkerFailure'
+
+    app = celery.Celery(queue_name, broker='memory://', backend='cache+memory://')
+    queue = Queue(name=queue_name, exchange=Exchange(queue_name), routing_key=queue_name)
+    app.conf.task_queues = [queue]
+
+    # noinspection PyUnusedLocal
+    def __handler(jobs: List[BatchJob]) -> list:
+        raise Exception("Whole batch failed.")
+
+    worker = _BatchWorker(app=app, queue=queue, handler=__handler, batch_size=10, batch_timeout=0.1)
+
+    job_ids = []
+    for number in range(3):
+        result = app.send_task(queue_name, args=(number,), queue=queue_name, routing_key=queue_name)
+        job_ids.append(result.id)
+
+    with app.connection_for_read() as connection:
+        with worker.consumer(connection=connection):
+            assert worker.run_batch(connection=connection) == 3
+
+    for job_id in job_ids:
+        assert app.AsyncResult(job_id).state == 'FAILURE'
+
+
+def test_batch_worker_max_jobs():
+    queue_name = 'MediaWords::Job::TestBatchWorkerMaxJobs'
+
+    app = celery.Celery(queue_name, broker='memory://', backend='cache+memory://')
+    queue = Queue(name=queue_name, exchange=Exchange(queue_name), routing_key=queue_name)
+    app.conf.task_queues = [queue]
+
+    batches = []
+
+    def __handler(jobs: List[BatchJob]) -> list:
+        batches.append(jobs)
+        return [None] * len(jobs)
+
+    worker = _BatchWorker(app=app, queue=queue, handler=__handler, batch_size=2, batch_timeout=0.1, max_jobs=3)
+
+    for number in range(6):
+        app.send_task(queue_name, args=(number,), queue=queue_name, routing_key=queue_name)
+
+    # Should return (for the worker process to get restarted) instead of running forever
+    worker.run()
+
+    assert [len(batch) for batch in batches] == [2, 2]
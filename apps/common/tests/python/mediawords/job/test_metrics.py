@@ -0,0 +1,56 @@
+import urllib.request
+
+from mediawords.job.metrics import metrics_text, record_job, record_requeue, reset_metrics, start_metrics_server
+
+
+def test_metrics_text():
+    reset_metrics()
+
+    record_job(queue_name='MediaWords::Job::Test', duration=0.02, queue_wait=5)
+    record_job(queue_name='MediaWords::Job::Test', duration=0.3, exception=ValueError("Failed."))
+    record_requeue(queue_name='MediaWords::Job::Test')
+
+    text = metrics_text()
+
+    assert 'mc_job_runs_total{queue="MediaWords::Job::Test"} 2' in text
+    assert 'mc_job_failures_total{exception="ValueError",queue="MediaWords::Job::Test"} 1' in text
+    assert 'mc_job_requeues_total{queue="MediaWords::Job::Test"} 1' in text
+
+    assert 'mc_job_duration_seconds_bucket{le="0.01",queue="MediaWords::Job::Test"} 0' in text
+    assert 'mc_job_duration_seconds_bucket{le="0.025",queue="MediaWords::Job::Test"} 1' in text
+    assert 'mc_job_duration_seconds_bucket{le="0.5",queue="MediaWords::Job::Test"} 2' in text
+    assert 'mc_job_duration_seconds_bucket{le="+Inf",queue="MediaWords::Job::Test"} 2' in text
+    assert 'mc_job_duration_seconds_count{queue="MediaWords::Job::Test"} 2' in text
+
+    # Second job's publish time is unknown
+    assert 'mc_job_queue_wait_seconds_bucket{le="1.0",queue="MediaWords::Job::Test"} 0' in text
+    assert 'mc_job_queue_wait_seconds_bucket{le="10.0",queue="MediaWords::Job::Test"} 1' in text
+    assert 'mc_job_queue_wait_seconds_count{queue="MediaWords::Job::Test"} 1' in text
+
+    reset_metrics()
+    assert 'MediaWords::Job::Test' not in metrics_text()
+
+
+def test_start_metrics_server():
+    reset_metrics()
+
+    record_job(queue_name='MediaWords::Job::TestServer', duration=1)
+
+    # Random port
+    server = start_metrics_server(port=0, address='127.0.0.1')
+    assert server is not None
+
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen('http://127.0.0.1:%d/metrics' % port, timeout=5) as response:
+            assert response.status == 200
+            body = response.read().decode('utf-8')
+        assert 'mc_job_runs_total{queue="MediaWords::Job::TestServer"} 1' in body
+
+        # Port is taken
+        assert start_metrics_server(port=port, address='127.0.0.1') is None
+
+    finally:
+        server.shutdown()
+        server.server_close()
+        reset_metrics()
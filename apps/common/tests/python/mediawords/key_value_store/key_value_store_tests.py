@@ -126,3 +126,48 @@ class TestKeyValueStoreTestCase(TestCase, metaclass=abc.ABCMeta):
             self.store().fetch_content(db=self._db,
                                        object_id=self._TEST_OBJECT_ID,
                                        object_path=path)
+
+    def _test_fetch_contents(self):
+        """Test fetch_contents()."""
+
+        self.store().store_content(db=self._db, object_id=self._TEST_OBJECT_ID, content=self._TEST_CONTENT_UTF_8)
+
+        assert self.store().fetch_contents(db=self._db, object_ids=[]) == {}
+
+        contents = self.store().fetch_contents(
+            db=self._db,
+            object_ids=[self._TEST_OBJECT_ID_NONEXISTENT, self._TEST_OBJECT_ID, self._TEST_OBJECT_ID_NONEXISTENT],
+        )
+
+        # Deduplicated, in input order
+        assert list(contents.keys()) == [self._TEST_OBJECT_ID_NONEXISTENT, self._TEST_OBJECT_ID]
+
+        assert contents[self._TEST_OBJECT_ID] == self._TEST_CONTENT_UTF_8
+
+        # Nonexistent item doesn't fail the whole batch
+        assert isinstance(contents[self._TEST_OBJECT_ID_NONEXISTENT], McKeyValueStoreException)
+
+        self.store().remove_content(db=self._db, object_id=self._TEST_OBJECT_ID)
+
+    def _test_store_contents(self):
+        """Test store_contents()."""
+
+        assert self.store().store_contents(db=self._db, contents={}) == {}
+
+        paths = self.store().store_contents(db=self._db, contents={self._TEST_OBJECT_ID: self._TEST_CONTENT_UTF_8})
+        assert list(paths.keys()) == [self._TEST_OBJECT_ID]
+        assert paths[self._TEST_OBJECT_ID].startswith(self._expected_path_prefix())
+
+        content = self.store().fetch_content(db=self._db, object_id=self._TEST_OBJECT_ID)
+        assert content == self._TEST_CONTENT_UTF_8
+
+        # Overwrite
+        paths = self.store().store_contents(db=self._db, contents={
+            self._TEST_OBJECT_ID: self._TEST_CONTENT_UTF_8_STRING + ' (updated)',
+        })
+        assert paths[self._TEST_OBJECT_ID].startswith(self._expected_path_prefix())
+
+        content = self.store().fetch_content(db=self._db, object_id=self._TEST_OBJECT_ID)
+        assert content == (self._TEST_CONTENT_UTF_8_STRING + ' (updated)').encode('utf-8')
+
+        self.store().remove_content(db=self._db, object_id=self._TEST_OBJECT_ID)
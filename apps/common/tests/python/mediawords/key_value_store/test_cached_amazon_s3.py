@@ -23,3 +23,9 @@ class TestCachedAmazonS3StoreTestCase(TestAmazonS3CredentialsTestCase):
 
     def test_key_value_store(self):
         self._test_key_value_store()
+
+    def test_fetch_contents(self):
+        self._test_fetch_contents()
+
+    def test_store_contents(self):
+        self._test_store_contents()
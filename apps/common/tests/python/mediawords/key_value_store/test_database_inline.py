@@ -35,3 +35,14 @@ class TestDatabaseInlineStoreTestCase(TestKeyValueStoreTestCase):
         assert self.store().content_exists(db=self._db,
                                            object_id=self._TEST_OBJECT_ID,
                                            object_path=test_content_path) is True
+
+        contents = self.store().fetch_contents(
+            db=self._db,
+            object_ids=[self._TEST_OBJECT_ID, self._TEST_OBJECT_ID_NONEXISTENT],
+            object_paths={self._TEST_OBJECT_ID: test_content_path, self._TEST_OBJECT_ID_NONEXISTENT: ''},
+        )
+        assert contents[self._TEST_OBJECT_ID] == self._TEST_CONTENT_UTF_8
+        assert isinstance(contents[self._TEST_OBJECT_ID_NONEXISTENT], McKeyValueStoreException)
+
+        paths = self.store().store_contents(db=self._db, contents={self._TEST_OBJECT_ID: self._TEST_CONTENT_UTF_8})
+        assert isinstance(paths[self._TEST_OBJECT_ID], McKeyValueStoreException)
@@ -0,0 +1,75 @@
+from mediawords.key_value_store.memory_cached import MemoryCachedStore
+from mediawords.key_value_store.postgresql import PostgreSQLStore
+from .mock_download import TestMockDownloadTestCase
+
+
+class TestMemoryCachedStoreTestCase(TestMockDownloadTestCase):
+    def _initialize_store(self) -> MemoryCachedStore:
+        return MemoryCachedStore(store=PostgreSQLStore(table='raw_downloads'), max_size=1024)
+
+    def _expected_path_prefix(self) -> str:
+        return 'postgresql:'
+
+    def test_key_value_store(self):
+        self._test_key_value_store()
+
+    def test_fetch_contents(self):
+        self._test_fetch_contents()
+
+    def test_store_contents(self):
+        self._test_store_contents()
+
+    def test_memory_cache(self):
+        store = self.store()
+        assert isinstance(store, MemoryCachedStore)
+
+        store.store_content(db=self._db, object_id=self._TEST_OBJECT_ID, content=self._TEST_CONTENT_UTF_8)
+
+        assert store.fetch_content(db=self._db, object_id=self._TEST_OBJECT_ID) == self._TEST_CONTENT_UTF_8
+        assert store.fetch_content(db=self._db, object_id=self._TEST_OBJECT_ID) == self._TEST_CONTENT_UTF_8
+
+        stats = store.cache_stats()
+        assert stats['misses'] == 1
+        assert stats['hits'] == 1
+        assert stats['objects'] == 1
+        assert stats['size'] == len(self._TEST_CONTENT_UTF_8)
+
+        # Object modified behind the cache's back is still served from cache
+        store.store().store_content(db=self._db, object_id=self._TEST_OBJECT_ID, content=b'Modified elsewhere')
+        assert store.fetch_content(db=self._db, object_id=self._TEST_OBJECT_ID) == self._TEST_CONTENT_UTF_8
+
+        # Writes through the cached store invalidate the object
+        store.store_content(db=self._db, object_id=self._TEST_OBJECT_ID, content=b'Modified')
+        assert store.cache_stats()['objects'] == 0
+        assert store.fetch_content(db=self._db, object_id=self._TEST_OBJECT_ID) == b'Modified'
+
+        # Objects that don't fit in the cache don't get cached
+        store.store_content(db=self._db, object_id=self._TEST_OBJECT_ID, content=b'x' * 2048)
+        assert store.fetch_content(db=self._db, object_id=self._TEST_OBJECT_ID) == b'x' * 2048
+        assert store.cache_stats()['objects'] == 0
+
+        # Least recently used objects get evicted
+        other_object_id = self._TEST_OBJECT_ID_NONEXISTENT + 1
+        self._db.query("""
+            INSERT INTO downloads (
+                downloads_id, feeds_id, stories_id, url, host, download_time, type, state, priority, sequence
+            ) VALUES (
+                %(downloads_id)s, 1, 1, 'http://', '', NOW(), 'content', 'pending', 0, 0
+            )
+        """, {'downloads_id': other_object_id})
+
+        store.store_contents(db=self._db, contents={self._TEST_OBJECT_ID: b'x' * 600, other_object_id: b'y' * 600})
+        assert store.fetch_content(db=self._db, object_id=self._TEST_OBJECT_ID) == b'x' * 600
+        contents = store.fetch_contents(db=self._db, object_ids=[other_object_id])
+        assert contents[other_object_id] == b'y' * 600
+
+        stats = store.cache_stats()
+        assert stats['evictions'] == 1
+        assert stats['objects'] == 1
+        assert stats['size'] == 600
+
+        store.remove_content(db=self._db, object_id=other_object_id)
+        assert store.cache_stats()['objects'] == 0
+        assert store.content_exists(db=self._db, object_id=other_object_id) is False
+
+        store.remove_content(db=self._db, object_id=self._TEST_OBJECT_ID)
@@ -32,3 +32,9 @@ class TestMultipleStoresStoreTestCase(TestAmazonS3CredentialsTestCase, TestMockD
 
     def test_key_value_store(self):
         self._test_key_value_store()
+
+    def test_fetch_contents(self):
+        self._test_fetch_contents()
+
+    def test_store_contents(self):
+        self._test_store_contents()
@@ -1,3 +1,4 @@
+from mediawords.key_value_store import KeyValueStore
 from mediawords.key_value_store.postgresql import PostgreSQLStore
 from .mock_download import TestMockDownloadTestCase
 
@@ -11,3 +12,40 @@ class TestPostgreSQLStoreTestCase(TestMockDownloadTestCase):
 
     def test_key_value_store(self):
         self._test_key_value_store()
+
+    def test_fetch_contents(self):
+        self._test_fetch_contents()
+
+    def test_store_contents(self):
+        self._test_store_contents()
+
+        # Object without a download to reference fails alone, the rest of the batch gets stored
+        paths = self.store().store_contents(db=self._db, contents={
+            self._TEST_OBJECT_ID_NONEXISTENT: self._TEST_CONTENT_UTF_8,
+            self._TEST_OBJECT_ID: self._TEST_CONTENT_UTF_8,
+        })
+        assert list(paths.keys()) == [self._TEST_OBJECT_ID_NONEXISTENT, self._TEST_OBJECT_ID]
+        assert isinstance(paths[self._TEST_OBJECT_ID_NONEXISTENT], Exception)
+        assert paths[self._TEST_OBJECT_ID] == 'postgresql:raw_downloads'
+
+        content = self.store().fetch_content(db=self._db, object_id=self._TEST_OBJECT_ID)
+        assert content == self._TEST_CONTENT_UTF_8
+
+    def test_compression_method_switch(self):
+        """Objects stored with one compression method are readable after switching to a different one."""
+
+        for old_method in KeyValueStore.Compression:
+            for new_method in KeyValueStore.Compression:
+                if (old_method == KeyValueStore.Compression.NONE) != (new_method == KeyValueStore.Compression.NONE):
+                    # Uncompressed data doesn't have a magic number, and uncompressed store doesn't detect compression
+                    continue
+
+                old_store = PostgreSQLStore(table='raw_downloads', compression_method=old_method)
+                new_store = PostgreSQLStore(table='raw_downloads', compression_method=new_method)
+
+                old_store.store_content(db=self._db, object_id=self._TEST_OBJECT_ID, content=self._TEST_CONTENT_UTF_8)
+
+                content = new_store.fetch_content(db=self._db, object_id=self._TEST_OBJECT_ID)
+                assert content == self._TEST_CONTENT_UTF_8, "%s -> %s" % (old_method, new_method,)
+
+        self.store().remove_content(db=self._db, object_id=self._TEST_OBJECT_ID)
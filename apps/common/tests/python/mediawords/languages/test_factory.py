@@ -1,5 +1,8 @@
 from unittest import TestCase
 
+import pytest
+
+from mediawords.languages import McLanguageException
 from mediawords.languages.en import EnglishLanguage
 from mediawords.languages.factory import LanguageFactory
 from mediawords.languages.lt import LithuanianLanguage
@@ -35,3 +38,10 @@ class TestLanguageFactory(TestCase):
 
     def test_default_language(self):
         assert isinstance(LanguageFactory.default_language(), EnglishLanguage)
+
+    def test_prewarm(self):
+        LanguageFactory.prewarm(['en', 'ro'])
+        assert {'en', 'ro'}.issubset(LanguageFactory.loaded_languages())
+
+        with pytest.raises(McLanguageException):
+            LanguageFactory.prewarm(['xx'])
@@ -0,0 +1,65 @@
+import time
+
+from mediawords.languages.factory import LanguageFactory
+from mediawords.util.parse_html import html_strip
+from mediawords.util.log import create_logger
+
+log = create_logger(__name__)
+
+
+def __sample_story_texts(language_code: str, count: int):
+    """Return story-like texts made of language's sample sentence."""
+    lang = LanguageFactory.language_for_code(language_code)
+    sentence = lang.sample_sentence()
+    return ["\n\n".join([sentence] * (x % 10 + 1)) + "\n\n  * List item\n\tTabbed\xa0text …" for x in range(count)]
+
+
+def test_split_texts_to_sentences():
+    lang = LanguageFactory.language_for_code('en')
+
+    texts = [
+        "This is the first sentence. This is the second one.",
+        "Single\nline break.\n\nParagraph.",
+        "",
+        "Missing space after period.Next sentence starts here.",
+    ]
+    expected_sentences = [lang.split_text_to_sentences(text) for text in texts]
+
+    assert lang.split_texts_to_sentences(texts) == expected_sentences
+    assert lang.split_texts_to_sentences(texts, processes=2) == expected_sentences
+
+    assert expected_sentences[3] == ['Missing space after period.', 'Next sentence starts here.']
+
+    assert lang.split_texts_to_sentences([]) == []
+
+
+def test_split_texts_to_sentences_benchmark():
+    """Report sentence splitting speed for a few languages."""
+
+    with open('/opt/mediacloud/tests/data/html-strip/strip.html', 'r', encoding='utf-8') as f:
+        extracted_story = html_strip(f.read())
+
+    corpus = {
+        'en': [extracted_story] * 5 + __sample_story_texts(language_code='en', count=200),
+    }
+    for language_code in ['de', 'es', 'fr', 'lt', 'ru']:
+        corpus[language_code] = __sample_story_texts(language_code=language_code, count=200)
+
+    for language_code, texts in corpus.items():
+        lang = LanguageFactory.language_for_code(language_code)
+
+        # Initialize lazy loaded splitter
+        lang.split_text_to_sentences("Warm up.")
+
+        start_time = time.time()
+        sentences = lang.split_texts_to_sentences(texts)
+        split_time = time.time() - start_time
+
+        sentence_count = sum(len(text_sentences) for text_sentences in sentences)
+        assert sentence_count > len(texts)
+
+        log.info("%(language_code)s: %(sentence_count)d sentences, %(speed).0f sentences/s" % {
+            'language_code': language_code,
+            'sentence_count': sentence_count,
+            'speed': sentence_count / max(split_time, 1e-9),
+        })
@@ -0,0 +1,59 @@
+import pytest
+
+from mediawords.languages import McLanguageException, StemCache
+from mediawords.languages.en import EnglishLanguage
+
+
+def test_stem_cache():
+    stem_calls = []
+
+    def __stem_uncached_words(words):
+        stem_calls.append(words)
+        return [word[:3] for word in words]
+
+    cache = StemCache(max_size=3)
+
+    assert cache.stem_words(['abcd', 'efgh', 'abcd'], __stem_uncached_words) == ['abc', 'efg', 'abc']
+
+    # Every uncached word gets stemmed only once
+    assert stem_calls == [['abcd', 'efgh']]
+
+    assert cache.stem_words(['efgh', 'ijkl'], __stem_uncached_words) == ['efg', 'ijk']
+    assert stem_calls[-1] == ['ijkl']
+
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 4
+    assert stats['size'] == 3
+    assert stats['hit_rate'] == 1 / 5
+
+    # Least recently used word ("abcd") gets evicted
+    assert cache.stem_words(['mnop'], __stem_uncached_words) == ['mno']
+    assert cache.stats()['size'] == 3
+    cache.stem_words(['abcd'], __stem_uncached_words)
+    assert stem_calls[-1] == ['abcd']
+
+    # Words that are all cached don't get stemmed
+    call_count = len(stem_calls)
+    assert cache.stem_words(['abcd', 'mnop'], __stem_uncached_words) == ['abc', 'mno']
+    assert len(stem_calls) == call_count
+
+    with pytest.raises(McLanguageException):
+        StemCache(max_size=0)
+
+
+def test_stem_words_cached():
+    lang = EnglishLanguage()
+
+    words = ['Stemming', 'it’s', "it's", 'stemming', 'Stemming']
+    expected_stems = ['stem', 'it', 'it', 'stem', 'stem']
+
+    assert lang.stem_words(words) == expected_stems
+
+    # Same stems from the cache
+    assert lang.stem_words(words) == expected_stems
+
+    stats = lang.stem_cache_stats()
+    assert stats['misses'] == 5
+    assert stats['hits'] == 5
+    assert stats['size'] == 4
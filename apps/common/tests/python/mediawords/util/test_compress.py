@@ -1,3 +1,5 @@
+import time
+
 import pytest
 
 from mediawords.util.compress import (
@@ -5,11 +7,24 @@ from mediawords.util.compress import (
     gunzip,
     bzip2,
     bunzip2,
+    zstd,
+    unzstd,
+    lz4,
+    unlz4,
+    train_zstd_dictionary,
+    register_zstd_dictionary,
     McBunzip2Exception,
     McGunzipException,
     McGzipException,
     McBzip2Exception,
+    McZstdException,
+    McUnzstdException,
+    McLz4Exception,
+    McUnlz4Exception,
 )
+from mediawords.util.log import create_logger
+
+log = create_logger(__name__)
 
 
 # Strings to try to compress / decompress
@@ -105,3 +120,140 @@ def test_wrong_algorithm():
 
     for data in __COMPRESS_TEST_DATA:
         __inner_test_wrong_algorithm(data_=data)
+
+
+def test_zstd():
+    def __inner_test_zstd(data_: bytes) -> None:
+        zstd_data = zstd(data_)
+        assert len(zstd_data) > 0
+        assert isinstance(zstd_data, bytes)
+        assert zstd_data != data_
+
+        unzstd_data = unzstd(zstd_data)
+        assert unzstd_data == data_
+
+    for data in __COMPRESS_TEST_DATA:
+        __inner_test_zstd(data_=data)
+
+
+def test_zstd_bad_input():
+    with pytest.raises(McZstdException):
+        # noinspection PyTypeChecker
+        zstd(None)
+
+    with pytest.raises(McUnzstdException):
+        # noinspection PyTypeChecker
+        unzstd(None)
+
+    with pytest.raises(McUnzstdException):
+        unzstd(b'')
+
+    with pytest.raises(McUnzstdException):
+        unzstd(b'No way this is valid Zstandard data')
+
+
+def __sample_html_pages(count: int) -> list:
+    """Return HTML pages that share a template, as the pages of a single media source would."""
+    pages = []
+    for page_number in range(count):
+        pages.append((
+            '<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>Story %(number)d - Example News</title>'
+            '<link rel="stylesheet" href="/static/css/main.css"><script src="/static/js/analytics.js"></script></head>'
+            '<body><header class="site-header"><nav><ul><li><a href="/politics">Politics</a></li>'
+            '<li><a href="/business">Business</a></li><li><a href="/sports">Sports</a></li></ul></nav></header>'
+            '<article class="story"><h1>Story number %(number)d</h1><p class="byline">By Reporter %(reporter)d</p>'
+            '<p>Paragraph about event %(number)d which happened on day %(day)d.</p></article>'
+            '<footer class="site-footer"><p>Copyright Example News. All rights reserved.</p></footer></body></html>'
+        ) % {'number': page_number, 'reporter': page_number % 7, 'day': page_number % 28})
+    return pages
+
+
+def test_zstd_dictionary():
+    pages = __sample_html_pages(count=500)
+
+    dictionary = train_zstd_dictionary(samples=pages[:400], dictionary_size=16 * 1024)
+    assert isinstance(dictionary, bytes)
+    assert len(dictionary) > 0
+
+    page = pages[450].encode('utf-8')
+
+    zstd_data_with_dictionary = zstd(page, dictionary=dictionary)
+    assert len(zstd_data_with_dictionary) < len(zstd(page))
+
+    # Dictionary got registered by zstd()
+    assert unzstd(zstd_data_with_dictionary) == page
+
+    # Registering the same dictionary again is fine
+    assert register_zstd_dictionary(dictionary) > 0
+
+
+def test_lz4():
+    def __inner_test_lz4(data_: bytes) -> None:
+        lz4_data = lz4(data_)
+        assert len(lz4_data) > 0
+        assert isinstance(lz4_data, bytes)
+        assert lz4_data != data_
+
+        unlz4_data = unlz4(lz4_data)
+        assert unlz4_data == data_
+
+    for data in __COMPRESS_TEST_DATA:
+        __inner_test_lz4(data_=data)
+
+
+def test_lz4_bad_input():
+    with pytest.raises(McLz4Exception):
+        # noinspection PyTypeChecker
+        lz4(None)
+
+    with pytest.raises(McUnlz4Exception):
+        # noinspection PyTypeChecker
+        unlz4(None)
+
+    with pytest.raises(McUnlz4Exception):
+        unlz4(b'')
+
+    with pytest.raises(McUnlz4Exception):
+        unlz4(b'No way this is valid LZ4 data')
+
+
+def test_compression_benchmark():
+    """Compare compression ratio and speed of every method on sample HTML."""
+
+    html_path = '/opt/mediacloud/tests/data/html-strip/strip.html'
+    with open(html_path, 'rb') as f:
+        html = f.read()
+
+    pages = [html] + [page.encode('utf-8') for page in __sample_html_pages(count=200)]
+    dictionary = train_zstd_dictionary(samples=pages[1:], dictionary_size=16 * 1024)
+
+    methods = [
+        ('gzip', gzip, gunzip),
+        ('bzip2', bzip2, bunzip2),
+        ('zstd', zstd, unzstd),
+        ('zstd+dictionary', lambda data: zstd(data, dictionary=dictionary), unzstd),
+        ('lz4', lz4, unlz4),
+    ]
+
+    total_size = sum(len(page) for page in pages)
+
+    for name, compress, uncompress in methods:
+        compress_start = time.time()
+        compressed_pages = [compress(page) for page in pages]
+        compress_time = time.time() - compress_start
+
+        uncompress_start = time.time()
+        uncompressed_pages = [uncompress(page) for page in compressed_pages]
+        uncompress_time = time.time() - uncompress_start
+
+        assert uncompressed_pages == pages
+
+        compressed_size = sum(len(page) for page in compressed_pages)
+
+        log.info("%(name)s: ratio %(ratio).2f, compression %(compress_speed).1f MB/s, "
+                 "decompression %(uncompress_speed).1f MB/s" % {
+                     'name': name,
+                     'ratio': total_size / compressed_size,
+                     'compress_speed': total_size / 1024 / 1024 / max(compress_time, 1e-9),
+                     'uncompress_speed': total_size / 1024 / 1024 / max(uncompress_time, 1e-9),
+                 })
@@ -1,7 +1,7 @@
 from mediawords.languages.factory import LanguageFactory
 from mediawords.util.identify_language import (
     language_code_for_text, identification_would_be_reliable, language_is_supported,
-    language_name_for_code)
+    language_name_for_code, language_codes_for_sentences)
 
 
 def test_language_code_for_text():
@@ -68,6 +68,50 @@ def test_identification_would_be_reliable_digits():
     assert identification_would_be_reliable(text='000000000000000aaaaaaa') is False
 
 
+def test_language_codes_for_sentences():
+    # noinspection PyTypeChecker
+    assert language_codes_for_sentences(sentences=None) == []
+    assert language_codes_for_sentences(sentences=[]) == []
+
+    sentences = []
+    expected_results = []
+    for language_code in sorted(LanguageFactory.enabled_languages()):
+        sample_sentence = LanguageFactory.language_for_code(language_code).sample_sentence()
+        sentences.append(sample_sentence)
+        expected_results.append((
+            language_code_for_text(text=sample_sentence),
+            identification_would_be_reliable(text=sample_sentence),
+        ))
+
+    sentences += ['', 'Ok.']
+    expected_results += [('', False), ('', False)]
+
+    # Same results with or without story language, and when identified repeatedly (from cache)
+    for story_language_code in [None, 'en', 'ja']:
+        for _ in range(2):
+            assert language_codes_for_sentences(
+                sentences=sentences,
+                story_language_code=story_language_code,
+            ) == expected_results
+
+
+def test_language_codes_for_sentences_single_language_script():
+    greek_sentence = 'Η γρήγορη καφέ αλεπού πηδάει πάνω από τον τεμπέλη σκύλο.'
+    japanese_sentence = '素早い茶色の狐はのろまな犬を飛び越える。'
+
+    assert language_codes_for_sentences(
+        sentences=[greek_sentence, japanese_sentence],
+        story_language_code='el',
+    ) == [('el', True), (language_code_for_text(text=japanese_sentence), True)]
+
+    # Kanji-only sentence could be Chinese too
+    chinese_sentence = '敏捷的棕色狐狸跳过了懒惰的狗。'
+    assert language_codes_for_sentences(
+        sentences=[japanese_sentence, chinese_sentence],
+        story_language_code='ja',
+    ) == [('ja', True), (language_code_for_text(text=chinese_sentence), True)]
+
+
 def test_language_is_supported():
     assert language_is_supported(code='') is False
     # noinspection PyTypeChecker
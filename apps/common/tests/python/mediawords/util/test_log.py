@@ -0,0 +1,64 @@
+import json
+import logging
+
+from mediawords.util.log import create_logger, _JSONFormatter, _TextFormatter
+
+
+class _ListHandler(logging.Handler):
+
+    def __init__(self, formatter: logging.Formatter):
+        super().__init__()
+        self.setFormatter(formatter)
+        self.lines = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.lines.append(self.format(record))
+
+
+def test_lazy_messages():
+    log = create_logger('test_lazy_messages')
+    logging.getLogger('test_lazy_messages').setLevel(logging.INFO)
+
+    handler = _ListHandler(formatter=_TextFormatter(fmt='%(levelname)s %(name)s: %(message)s'))
+    logging.getLogger('test_lazy_messages').addHandler(handler)
+
+    assert log.is_enabled_for('INFO') is True
+    assert log.is_enabled_for('DEBUG') is False
+
+    rendered = []
+
+    def __render():
+        rendered.append(True)
+        return 'Rendered'
+
+    # Not rendered because the level is disabled
+    log.debug(__render)
+    log.debug("Arguments: %s", __render)
+    assert rendered == []
+
+    log.info(__render)
+    log.info("Arguments: %s, %d", 'foo', 42)
+    log.info("Preformatted with literal 100%")
+    log.warning("Fields", fields={'duration': 1.5})
+
+    assert rendered == [True]
+    assert handler.lines[0:2] == ['INFO test_lazy_messages: Rendered', 'INFO test_lazy_messages: Arguments: foo, 42']
+    assert handler.lines[2] == 'INFO test_lazy_messages: Preformatted with literal 100%'
+    assert handler.lines[3] == 'WARNING test_lazy_messages: Fields duration=1.5'
+
+
+def test_json_format():
+    log = create_logger('test_json_format')
+
+    handler = _ListHandler(formatter=_JSONFormatter())
+    logging.getLogger('test_json_format').addHandler(handler)
+
+    log.info("Slow query: %s", 'SELECT 1', fields={'query_time': 2.5})
+
+    entry = json.loads(handler.lines[-1])
+    assert entry['level'] == 'INFO'
+    assert entry['logger'] == 'test_json_format'
+    assert entry['message'] == 'Slow query: SELECT 1'
+    assert entry['query_time'] == 2.5
+    assert 'time' in entry
+    assert 'relative_ms' in entry
@@ -1,6 +1,7 @@
 from mediawords.util.parse_html import (
     link_canonical_url_from_html,
     meta_refresh_url_from_html,
+    meta_refresh_url_from_html_chunks,
     html_strip,
     html_title,
     _sententize_block_level_tags,
@@ -184,6 +185,40 @@ def test_meta_refresh_url_from_html():
     assert no_url_results is None
 
 
+def test_meta_refresh_url_from_html_chunks():
+    html = """
+        <html><head>
+        <meta http-equiv="content-type" content="text/html; charset=UTF-8">
+        < meta name="refresh-like" content="0; url=http://not-a-refresh.com/" >
+        <meta http-equiv="refresh" content="0; url=http://example.com/" />
+        </head><body>Body</body></html>
+    """
+
+    # Tags split across chunks at every possible position
+    for chunk_size in [1, 2, 3, 7, 64, len(html)]:
+        html_chunks = [html[offset:offset + chunk_size] for offset in range(0, len(html), chunk_size)]
+        assert meta_refresh_url_from_html_chunks(html_chunks=html_chunks) == 'http://example.com/'
+
+    for split_offset in range(len(html)):
+        html_chunks = [html[:split_offset], html[split_offset:]]
+        assert meta_refresh_url_from_html_chunks(html_chunks=html_chunks) == 'http://example.com/'
+
+    # Unterminated tag extends up to the next ">" just like in a full document
+    html = '<meta http-equiv="refresh" <meta content="0; url=http://example.com/">'
+    assert meta_refresh_url_from_html(html=html) == 'http://example.com/'
+    assert meta_refresh_url_from_html_chunks(html_chunks=list(html)) == 'http://example.com/'
+
+    # Chunks after the refresh tag don't get read
+    def __html_chunks():
+        yield '<meta http-equiv="refresh" content="0; url=http://example.com/" />'
+        raise AssertionError("Chunk after the refresh tag was read.")
+
+    assert meta_refresh_url_from_html_chunks(html_chunks=__html_chunks()) == 'http://example.com/'
+
+    assert meta_refresh_url_from_html_chunks(html_chunks=['<meta http-eq', 'uiv="content-type">', '<p>']) is None
+    assert meta_refresh_url_from_html_chunks(html_chunks=[]) is None
+
+
 def test_sententize_block_level_tags() -> None:
     """Test _new_lines_around_block_level_tags()."""
     assert _sententize_block_level_tags('<h1>foo</h1>') == '\n\n<h1>foo.</h1>\n\n'
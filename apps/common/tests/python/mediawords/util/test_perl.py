@@ -1,5 +1,10 @@
+import time
+
+from mediawords.util.log import create_logger
 from mediawords.util.perl import (
-    decode_object_from_bytes_if_needed, convert_dbd_pg_arguments_to_psycopg2_format)
+    decode_object_from_bytes_if_needed, convert_dbd_pg_arguments_to_psycopg2_format, skip_decoding_containers)
+
+log = create_logger(__name__)
 
 
 def test_decode_object_from_bytes_if_needed():
@@ -40,6 +45,93 @@ def test_decode_object_from_bytes_if_needed():
     got = decode_object_from_bytes_if_needed(input_obj)
     assert expected == got
 
+    # Tuples stay tuples
+    assert decode_object_from_bytes_if_needed(('a', [b'b'],)) == ('a', ['b'],)
+
+
+def test_decode_object_from_bytes_if_needed_no_bytes():
+    input_obj = {
+        'a': 'b',
+        'c': ['d', ('e', 42, None, 1.5, True)],
+        'f': {'g': {'h': 'i'}},
+    }
+
+    # Not copied if there's nothing to decode
+    assert decode_object_from_bytes_if_needed(input_obj) is input_obj
+
+    # ...but copied if there's something to decode deep down
+    input_obj['f']['g']['h'] = b'i'
+    got = decode_object_from_bytes_if_needed(input_obj)
+    assert got is not input_obj
+    assert got['f']['g']['h'] == 'i'
+    assert input_obj['f']['g']['h'] == b'i'
+
+
+def test_skip_decoding_containers():
+    input_obj = {'a': [b'b']}
+
+    skip_decoding_containers()
+    try:
+        assert decode_object_from_bytes_if_needed(input_obj) is input_obj
+
+        # Top-level 'bytes' still get decoded
+        assert decode_object_from_bytes_if_needed(b'foo') == 'foo'
+
+    finally:
+        skip_decoding_containers(skip=False)
+
+    assert decode_object_from_bytes_if_needed(input_obj) == {'a': ['b']}
+
+
+def test_decode_object_from_bytes_if_needed_benchmark():
+    """Report decoding speed of story-like objects with and without 'bytes' in them."""
+
+    story = {
+        'stories_id': 1,
+        'media_id': 2,
+        'url': 'https://www.example.com/story',
+        'guid': 'https://www.example.com/story',
+        'title': 'Story title',
+        'description': 'Story description. ' * 20,
+        'publish_date': '2020-01-01 00:00:00',
+        'collect_date': '2020-01-01 00:00:00',
+        'full_text_rss': False,
+        'language': 'en',
+        'story_text': 'Story sentence. ' * 10000,
+        'ap_syndicated': None,
+    }
+    payloads = {
+        'story': story,
+        'sentences': ['Story sentence number %d.' % x for x in range(2000)],
+        'stories': [dict(story, stories_id=x) for x in range(200)],
+    }
+
+    iterations = 100
+
+    for name, payload in payloads.items():
+
+        start_time = time.time()
+        for _ in range(iterations):
+            assert decode_object_from_bytes_if_needed(payload) is payload
+        no_bytes_time = (time.time() - start_time) / iterations
+
+        # Same payload with a single 'bytes' object at the very end forces a copy
+        if isinstance(payload, dict):
+            payload_with_bytes = dict(payload, last=b'bytes')
+        else:
+            payload_with_bytes = payload + [b'bytes']
+
+        start_time = time.time()
+        for _ in range(iterations):
+            decode_object_from_bytes_if_needed(payload_with_bytes)
+        bytes_time = (time.time() - start_time) / iterations
+
+        log.info("Decoding %s: %.1f us without 'bytes', %.1f us with 'bytes'" % (
+            name, no_bytes_time * 1000000, bytes_time * 1000000,
+        ))
+
+        assert no_bytes_time <= bytes_time
+
 
 # noinspection SqlResolve,SpellCheckingInspection
 def test_convert_dbd_pg_arguments_to_psycopg2_format():
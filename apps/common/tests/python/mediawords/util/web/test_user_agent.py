@@ -319,6 +319,37 @@ class TestUserAgentTestCase(TestCase):
         assert urls_are_equal(url1=response.request().url(), url2=test_url)
         assert response.decoded_content() == 'Šaukštai po pietų.'
 
+    def test_get_iter_decoded_content(self):
+        """Incremental decoding of content."""
+
+        content = '𝘛𝘩𝘪𝘴 𝘪𝘴 𝘱𝘢𝘨𝘦 𝘈. ' * 100
+
+        pages = {
+            '/utf-8': {
+                'header': 'Content-Type: text/plain; charset=UTF-8',
+                'content': content,
+            },
+        }
+
+        hs = HashServer(port=self.__test_port, pages=pages)
+        hs.start()
+
+        ua = UserAgent()
+        test_url = '%s/utf-8' % self.__test_url
+        response = ua.get(test_url)
+
+        hs.stop()
+
+        assert response.is_success() is True
+        assert response.encoding().lower() == 'utf-8'
+        assert bytes(response.raw_data_view()) == content.encode('utf-8')
+
+        # Chunk size that splits multi-byte characters
+        chunks = list(response.iter_decoded_content(chunk_size=7))
+        assert len(chunks) > 1
+        assert ''.join(chunks) == content
+        assert response.decoded_content() == content
+
     def test_get_non_utf8_content_html(self):
         """Non-UTF-8 content where the content encoding is set in content and not the headers."""
 
@@ -1432,6 +1463,54 @@ class TestUserAgentTestCase(TestCase):
             assert response.request().url().endswith('/page-%02d' % x)
             assert response.decoded_content() == 'Page %02d.' % x
 
+    def test_parallel_get_iter(self):
+        """parallel_get_iter() yields responses as they finish."""
+
+        def __callback_slow(_: HashServer.Request) -> Union[str, bytes]:
+            r = ''
+            r += "HTTP/1.0 200 OK\r\n"
+            r += "Content-Type: text/plain\r\n"
+            r += "\r\n"
+            r += "Slow."
+
+            time.sleep(2)
+
+            return r
+
+        pages = {
+            '/slow': {'callback': __callback_slow},
+            '/fast': 'Fast.',
+            '/too-big': 'X' * 1024 * 1024,
+        }
+
+        urls = [
+            '%s/slow' % self.__test_url,
+            '%s/fast' % self.__test_url,
+            '%s/too-big' % self.__test_url,
+        ]
+
+        hs = HashServer(port=self.__test_port, pages=pages)
+        hs.start()
+
+        ua = UserAgent()
+
+        # parallel_get_iter() is expected to respect max. size
+        ua.set_max_size(1024)
+
+        url_responses = list(ua.parallel_get_iter(urls))
+
+        hs.stop()
+
+        assert len(url_responses) == len(urls)
+
+        # Slow page finishes last
+        assert url_responses[-1][0] == urls[0]
+        assert url_responses[-1][1].decoded_content() == 'Slow.'
+
+        url_responses = dict(url_responses)
+        assert url_responses[urls[1]].decoded_content() == 'Fast.'
+        assert len(url_responses[urls[2]].raw_data()) < 1024 * 1024
+
     def test_parallel_get_duplicate_removal(self):
         """parallel_get() with duplicate URLs."""
 
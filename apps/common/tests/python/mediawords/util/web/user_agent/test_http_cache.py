@@ -0,0 +1,226 @@
+import os
+import tempfile
+import time
+from typing import Union
+
+from mediawords.test.hash_server import HashServer
+from mediawords.util.network import random_unused_port
+from mediawords.util.web.user_agent import UserAgent
+from mediawords.util.web.user_agent.http_cache import HTTPCache, HTTPCacheEntry
+
+
+def test_http_cache_store_get():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = HTTPCache(directory=temp_dir)
+
+        assert cache.get('http://www.example.com/') is None
+
+        entry = HTTPCacheEntry(
+            url='http://www.example.com/',
+            code=200,
+            message='OK',
+            headers={'ETag': '"abc"', 'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'},
+            content=b"Hello!\nSecond line.",
+        )
+        cache.store(entry)
+
+        # Keyed by normalized URL
+        cached_entry = cache.get('HTTP://WWW.EXAMPLE.COM/#fragment')
+        assert cached_entry is not None
+        assert cached_entry.code() == 200
+        assert cached_entry.etag() == '"abc"'
+        assert cached_entry.last_modified() == 'Wed, 21 Oct 2015 07:28:00 GMT'
+        assert cached_entry.content() == b"Hello!\nSecond line."
+
+        # No caching headers
+        assert cached_entry.is_fresh() is False
+
+        cache.remove('http://www.example.com/')
+        assert cache.get('http://www.example.com/') is None
+
+
+def test_http_cache_entry_freshness():
+    entry = HTTPCacheEntry(url='http://a/', code=200, message='OK', headers={'Cache-Control': 'public, max-age=60'},
+                           content=b'')
+    assert entry.freshness_lifetime() == 60
+    assert entry.is_fresh() is True
+
+    entry = HTTPCacheEntry(url='http://a/', code=200, message='OK', headers={'Cache-Control': 'max-age=60'},
+                           content=b'', stored_at=time.time() - 120)
+    assert entry.is_fresh() is False
+
+    entry = HTTPCacheEntry(url='http://a/', code=200, message='OK', headers={'Cache-Control': 'no-cache, max-age=60'},
+                           content=b'')
+    assert entry.is_fresh() is False
+
+    entry = HTTPCacheEntry(url='http://a/', code=200, message='OK', headers={
+        'Date': 'Wed, 21 Oct 2015 07:28:00 GMT',
+        'Expires': 'Wed, 21 Oct 2015 07:38:00 GMT',
+    }, content=b'')
+    assert entry.freshness_lifetime() == 600
+
+
+def test_http_cache_ttl_and_eviction():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = HTTPCache(directory=temp_dir, ttl=60)
+
+        cache.store(HTTPCacheEntry(url='http://www.example.com/old', code=200, message='OK', headers={},
+                                   content=b'Old.', stored_at=time.time() - 120))
+        assert cache.get('http://www.example.com/old') is None
+
+        cache = HTTPCache(directory=temp_dir, max_size=1024 * 10)
+
+        for x in range(20):
+            cache.store(HTTPCacheEntry(url='http://www.example.com/%d' % x, code=200, message='OK', headers={},
+                                       content=b'x' * 1024))
+
+        total_size = sum(os.path.getsize(os.path.join(root, f))
+                         for root, _, files in os.walk(temp_dir) for f in files)
+        assert total_size <= 1024 * 10
+        assert cache.stats()['evictions'] > 0
+
+        # Most recently stored entry is still there
+        assert cache.get('http://www.example.com/19') is not None
+
+
+def test_user_agent_http_cache():
+    def __callback_etag(request: HashServer.Request) -> Union[str, bytes]:
+        if request.header('If-None-Match') == '"v1"':
+            return "HTTP/1.0 304 Not Modified\r\nETag: \"v1\"\r\n\r\n"
+
+        r = ''
+        r += "HTTP/1.0 200 OK\r\n"
+        r += "Content-Type: text/plain; charset=UTF-8\r\n"
+        r += "ETag: \"v1\"\r\n"
+        r += "\r\n"
+        r += "Fetched at %f" % time.time()
+        return r
+
+    def __callback_max_age(_: HashServer.Request) -> Union[str, bytes]:
+        r = ''
+        r += "HTTP/1.0 200 OK\r\n"
+        r += "Content-Type: text/plain; charset=UTF-8\r\n"
+        r += "Cache-Control: max-age=60\r\n"
+        r += "\r\n"
+        r += "Fetched at %f" % time.time()
+        return r
+
+    def __callback_no_store(_: HashServer.Request) -> Union[str, bytes]:
+        r = ''
+        r += "HTTP/1.0 200 OK\r\n"
+        r += "Content-Type: text/plain; charset=UTF-8\r\n"
+        r += "ETag: \"v1\"\r\n"
+        r += "Cache-Control: no-store\r\n"
+        r += "\r\n"
+        r += "Fetched at %f" % time.time()
+        return r
+
+    pages = {
+        '/etag': {'callback': __callback_etag},
+        '/max-age': {'callback': __callback_max_age},
+        '/no-store': {'callback': __callback_no_store},
+    }
+
+    hs = HashServer(port=0, pages=pages)
+    hs.start()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = HTTPCache(directory=temp_dir)
+
+        ua = UserAgent()
+        ua.set_http_cache(cache)
+
+        # Revalidated with a conditional request
+        first_response = ua.get(hs.page_url('/etag'))
+        assert first_response.is_success()
+        second_response = ua.get(hs.page_url('/etag'))
+        assert second_response.is_success()
+        assert second_response.code() == 200
+        assert second_response.decoded_content() == first_response.decoded_content()
+
+        assert cache.stats()['revalidations'] == 1
+
+        # Not cached
+        first_response = ua.get(hs.page_url('/no-store'))
+        time.sleep(0.01)
+        second_response = ua.get(hs.page_url('/no-store'))
+        assert second_response.decoded_content() != first_response.decoded_content()
+
+        # Fresh, doesn't get requested again
+        first_response = ua.get(hs.page_url('/max-age'))
+
+        hs.stop()
+
+        second_response = ua.get(hs.page_url('/max-age'))
+        assert second_response.is_success()
+        assert second_response.decoded_content() == first_response.decoded_content()
+
+        stats = cache.stats()
+        assert stats['hits'] == 1
+        assert stats['revalidations'] == 1
+        assert stats['misses'] == 4
+        assert stats['hit_rate'] == 2 / 6
+
+
+def test_user_agent_http_cache_redirected_not_modified():
+    """Test "304 Not Modified" after a redirect with entries that have only one of the validators."""
+
+    validators = {
+        'etag': ('ETag: "v1"', 'If-None-Match'),
+        'last-modified': ('Last-Modified: Wed, 01 Jan 2020 00:00:00 GMT', 'If-Modified-Since'),
+    }
+
+    def __callback_factory(validator_header: str, conditional_header: str, redirect_url: str):
+        def __callback(request: HashServer.Request) -> Union[str, bytes]:
+            if request.header(conditional_header):
+                if redirect_url:
+                    return "HTTP/1.0 302 Found\r\nLocation: %s\r\n\r\n" % redirect_url
+                return "HTTP/1.0 304 Not Modified\r\n%s\r\n\r\n" % validator_header
+
+            r = ''
+            r += "HTTP/1.0 200 OK\r\n"
+            r += "Content-Type: text/plain; charset=UTF-8\r\n"
+            r += "%s\r\n" % validator_header
+            r += "\r\n"
+            r += "Fetched at %f" % time.time()
+            return r
+
+        return __callback
+
+    port = random_unused_port()
+
+    pages = {}
+    for name, (validator_header, conditional_header) in validators.items():
+        pages['/%s' % name] = {'callback': __callback_factory(
+            validator_header=validator_header,
+            conditional_header=conditional_header,
+            redirect_url='http://localhost:%d/%s-target' % (port, name),
+        )}
+        pages['/%s-target' % name] = {'callback': __callback_factory(
+            validator_header=validator_header,
+            conditional_header=conditional_header,
+            redirect_url='',
+        )}
+
+    hs = HashServer(port=port, pages=pages)
+    hs.start()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = HTTPCache(directory=temp_dir)
+
+        ua = UserAgent()
+        ua.set_http_cache(cache)
+
+        for name in validators.keys():
+            first_response = ua.get(hs.page_url('/%s' % name))
+            assert first_response.is_success()
+
+            time.sleep(0.01)
+
+            # Redirected to a 304 which the validators weren't meant for, so should get refetched
+            second_response = ua.get(hs.page_url('/%s' % name))
+            assert second_response.is_success()
+            assert second_response.code() == 200
+            assert second_response.decoded_content() != first_response.decoded_content()
+
+    hs.stop()
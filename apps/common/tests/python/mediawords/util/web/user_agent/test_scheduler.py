@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+from mediawords.util.web.user_agent.scheduler import DomainScheduler, McDomainSchedulerException
+
+
+def test_domain_scheduler():
+    urls = [
+        'http://www.a.com/1',
+        'http://www.a.com/2',
+        'http://a.com/3',
+        'http://www.b.com/1',
+    ]
+
+    scheduler = DomainScheduler(urls=urls, requests_per_domain=2, per_domain_timeout=1)
+
+    assert scheduler.queue_depths() == {'a.com': 3, 'b.com': 1}
+
+    # Domains take turns
+    assert scheduler.next_url() == 'http://www.a.com/1'
+    assert scheduler.next_url() == 'http://www.b.com/1'
+    assert scheduler.next_url() == 'http://www.a.com/2'
+
+    assert scheduler.queue_depths() == {'a.com': 1}
+
+    # a.com is out of tokens until it gets refilled at a rate of 2 tokens per second
+    start_time = time.monotonic()
+    assert scheduler.next_url() == 'http://a.com/3'
+    assert time.monotonic() - start_time >= 0.4
+
+    assert scheduler.next_url() is None
+    assert scheduler.queue_depths() == {}
+
+
+def test_domain_scheduler_unlimited():
+    urls = ['http://www.a.com/%d' % x for x in range(100)]
+
+    scheduler = DomainScheduler(urls=urls, requests_per_domain=1, per_domain_timeout=0)
+
+    start_time = time.monotonic()
+    assert [scheduler.next_url() for _ in range(100)] == urls
+    assert time.monotonic() - start_time < 1
+
+    assert scheduler.next_url() is None
+
+
+def test_domain_scheduler_stop():
+    urls = ['http://www.a.com/1', 'http://www.a.com/2']
+
+    scheduler = DomainScheduler(urls=urls, requests_per_domain=1, per_domain_timeout=60)
+    assert scheduler.next_url() == 'http://www.a.com/1'
+
+    # Worker waiting for a token should return after stop()
+    next_urls = []
+    worker = threading.Thread(target=lambda: next_urls.append(scheduler.next_url()))
+    worker.start()
+
+    time.sleep(0.1)
+    scheduler.stop()
+    worker.join(timeout=5)
+
+    assert not worker.is_alive()
+    assert next_urls == [None]
+
+
+def test_domain_scheduler_invalid_arguments():
+    with pytest.raises(McDomainSchedulerException):
+        DomainScheduler(urls=None, requests_per_domain=1, per_domain_timeout=1)
+
+    with pytest.raises(McDomainSchedulerException):
+        DomainScheduler(urls=['http://www.a.com/'], requests_per_domain=0, per_domain_timeout=1)
+
+    with pytest.raises(McDomainSchedulerException):
+        DomainScheduler(urls=['http://www.a.com/'], requests_per_domain=1, per_domain_timeout=-1)
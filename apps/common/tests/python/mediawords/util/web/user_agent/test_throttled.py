@@ -8,6 +8,9 @@ from mediawords.db import connect_to_db
 from mediawords.test.hash_server import HashServer
 # noinspection PyProtectedMember
 from mediawords.util.web.user_agent.throttled import (
+    DomainThrottle,
+    LocalDomainThrottle,
+    PostgreSQLDomainThrottle,
     ThrottledUserAgent,
     McThrottledDomainException,
     _DEFAULT_DOMAIN_TIMEOUT,
@@ -70,3 +73,168 @@ def test_throttled_user_agent() -> None:
 
     ua = ThrottledUserAgent(db=db)
     assert ua.domain_timeout == _DEFAULT_DOMAIN_TIMEOUT
+
+
+class _CountingThrottle(DomainThrottle):
+    """Throttle which counts calls and locks domains for a fixed amount of time."""
+
+    def __init__(self):
+        self.calls = 0
+        self.__locked_until = {}
+
+    def acquire(self, domain: str, domain_timeout: int) -> float:
+        self.calls += 1
+
+        locked_for = self.__locked_until.get(domain, 0) - time.monotonic()
+        if locked_for > 0:
+            return locked_for
+
+        self.__locked_until[domain] = time.monotonic() + domain_timeout
+        return 0
+
+
+class _LastRequestThrottle(DomainThrottle):
+    """Throttle which counts calls and, like PostgreSQLDomainThrottle, locks domains relative to the last request."""
+
+    def __init__(self):
+        self.calls = 0
+        self.__last_request_at = {}
+
+    def acquire(self, domain: str, domain_timeout: int) -> float:
+        self.calls += 1
+
+        since_last_request = time.monotonic() - self.__last_request_at.get(domain, float('-inf'))
+        if since_last_request < domain_timeout:
+            return domain_timeout - since_last_request
+
+        self.__last_request_at[domain] = time.monotonic()
+        return 0
+
+
+def test_local_domain_throttle() -> None:
+    """Test that domains known to be locked don't get passed on to the backend."""
+
+    backend = _CountingThrottle()
+    throttle = LocalDomainThrottle(backend=backend)
+
+    assert throttle.acquire(domain='local-throttle-a.com', domain_timeout=1) == 0
+    assert backend.calls == 1
+
+    # Locked by this process, no need to ask the backend
+    for _ in range(10):
+        assert 0 < throttle.acquire(domain='local-throttle-a.com', domain_timeout=1) <= 1
+    assert backend.calls == 1
+
+    # Lock table is shared with other throttle objects
+    assert LocalDomainThrottle(backend=backend).acquire(domain='local-throttle-a.com', domain_timeout=1) > 0
+    assert backend.calls == 1
+
+    # Locked by someone else
+    other_backend = _CountingThrottle()
+    assert other_backend.acquire(domain='local-throttle-b.com', domain_timeout=1) == 0
+    throttle = LocalDomainThrottle(backend=other_backend)
+    assert throttle.acquire(domain='local-throttle-b.com', domain_timeout=1) > 0
+    assert throttle.acquire(domain='local-throttle-b.com', domain_timeout=1) > 0
+    assert other_backend.calls == 2
+
+    time.sleep(1)
+
+    assert throttle.acquire(domain='local-throttle-b.com', domain_timeout=1) == 0
+    assert other_backend.calls == 3
+
+
+def test_local_domain_throttle_mixed_timeouts() -> None:
+    """Test that the domain stays locked for the timeout of the caller and not of whoever locked it."""
+
+    throttle = LocalDomainThrottle()
+
+    assert throttle.acquire(domain='local-throttle-mixed.com', domain_timeout=360) == 0
+
+    # Zero timeout shouldn't get locked out by an earlier long timeout
+    assert throttle.acquire(domain='local-throttle-mixed.com', domain_timeout=0) == 0
+    assert throttle.acquire(domain='local-throttle-mixed.com', domain_timeout=0) == 0
+
+    assert 0 < throttle.acquire(domain='local-throttle-mixed.com', domain_timeout=1) <= 1
+
+    time.sleep(1)
+
+    assert throttle.acquire(domain='local-throttle-mixed.com', domain_timeout=1) == 0
+
+    # Short timeout shouldn't shorten a long timeout of a later caller
+    assert 359 < throttle.acquire(domain='local-throttle-mixed.com', domain_timeout=360) <= 360
+
+
+def test_local_domain_throttle_mixed_timeouts_backend() -> None:
+    """Test that backend's denial for a long timeout doesn't lock out callers with a shorter timeout."""
+
+    backend = _LastRequestThrottle()
+    assert backend.acquire(domain='local-throttle-mixed-b.com', domain_timeout=0) == 0
+
+    throttle = LocalDomainThrottle(backend=backend)
+    assert 359 < throttle.acquire(domain='local-throttle-mixed-b.com', domain_timeout=360) <= 360
+    assert backend.calls == 2
+
+    # Denied caller's timeout doesn't apply to the callers that follow
+    assert throttle.acquire(domain='local-throttle-mixed-b.com', domain_timeout=0) == 0
+    assert backend.calls == 3
+
+    # ...but the backend's last request time does
+    assert 0 < throttle.acquire(domain='local-throttle-mixed-b.com', domain_timeout=2) <= 2
+    assert backend.calls == 3
+
+    # Someone else requests the domain, and the backend denies a long timeout caller again
+    assert backend.acquire(domain='local-throttle-mixed-c.com', domain_timeout=0) == 0
+    assert 359 < throttle.acquire(domain='local-throttle-mixed-c.com', domain_timeout=360) <= 360
+    assert backend.calls == 5
+
+    # Known to have been requested within 360 seconds, no need to ask the backend
+    assert 359 < throttle.acquire(domain='local-throttle-mixed-c.com', domain_timeout=360) <= 360
+    assert backend.calls == 5
+
+    time.sleep(1)
+
+    # Known to have been requested more than a second ago, so backend gets asked
+    assert throttle.acquire(domain='local-throttle-mixed-c.com', domain_timeout=1) == 0
+    assert backend.calls == 6
+
+
+def test_postgresql_domain_throttle() -> None:
+    """Test PostgreSQL domain throttle."""
+
+    db = connect_to_db()
+
+    throttle = PostgreSQLDomainThrottle(db=db)
+
+    assert throttle.acquire(domain='pg-throttle.com', domain_timeout=10) == 0
+    assert 0 < throttle.acquire(domain='pg-throttle.com', domain_timeout=10) <= 10
+    assert throttle.acquire(domain='other-pg-throttle.com', domain_timeout=10) == 0
+
+
+def test_throttled_user_agent_max_wait() -> None:
+    """Test waiting for the domain to get unlocked."""
+
+    db = connect_to_db()
+
+    pages = {'/test': 'Hello!', }
+    hs = HashServer(port=0, pages=pages)
+    hs.start()
+
+    test_url = hs.page_url('/test')
+
+    throttle = _CountingThrottle()
+
+    ua = ThrottledUserAgent(db, domain_timeout=2, throttle=throttle)
+    assert ua.get(test_url).decoded_content() == 'Hello!'
+
+    # Won't wait for long enough
+    ua = ThrottledUserAgent(db, domain_timeout=2, throttle=throttle, max_wait=0.5)
+    with pytest.raises(McThrottledDomainException):
+        ua.get(test_url)
+
+    # Waits until the domain gets unlocked
+    start_time = time.monotonic()
+    ua = ThrottledUserAgent(db, domain_timeout=2, throttle=throttle, max_wait=5)
+    assert ua.get(test_url).decoded_content() == 'Hello!'
+    assert time.monotonic() - start_time >= 1
+
+    hs.stop()
@@ -1,11 +1,13 @@
 #!/usr/bin/env python3
 
 import time
+from typing import Any, List
 
-from mediawords.db import connect_to_db
-from mediawords.job import JobBroker
+from mediawords.db import connect_to_db, DatabaseHandler
+from mediawords.job import JobBroker, BatchJob
 from mediawords.util.log import create_logger
 from mediawords.util.perl import decode_object_from_bytes_if_needed
+from extract_and_vector.config import ExtractAndVectorConfig
 from extract_and_vector.dbi.stories.extractor_arguments import PyExtractorArguments
 from extract_and_vector.dbi.stories.extract import extract_and_process_story
 from extract_and_vector.story_vectors import medium_is_locked
@@ -29,8 +31,11 @@ class McExtractAndVectorException(Exception):
     pass
 
 
-def run_extract_and_vector(stories_id: int, use_cache: bool = False, use_existing: bool = False) -> None:
-    """Extract, vector and process a story."""
+def _extract_and_vector(db: DatabaseHandler,
+                        stories_id: int,
+                        use_cache: bool = False,
+                        use_existing: bool = False) -> None:
+    """Extract, vector and process a story using an existing database connection."""
 
     global _consecutive_requeues
 
@@ -42,8 +47,6 @@ def run_extract_and_vector(stories_id: int, use_cache: bool = False, use_existin
     if not stories_id:
         raise McExtractAndVectorException("'stories_id' is not set.")
 
-    db = connect_to_db()
-
     story = db.find_by_id(table='stories', object_id=stories_id)
     if not story:
         raise McExtractAndVectorException("Story with ID {} was not found.".format(stories_id))
@@ -61,7 +64,7 @@ def run_extract_and_vector(stories_id: int, use_cache: bool = False, use_existin
             )
             time.sleep(1)
 
-        JobBroker(queue_name=QUEUE_NAME).add_to_queue(stories_id=stories_id)
+        JobBroker(queue_name=QUEUE_NAME).requeue(stories_id=stories_id)
 
         return
 
@@ -83,6 +86,41 @@ def run_extract_and_vector(stories_id: int, use_cache: bool = False, use_existin
     log.info("Done extracting story {}.".format(stories_id))
 
 
+def run_extract_and_vector(stories_id: int, use_cache: bool = False, use_existing: bool = False) -> None:
+    """Extract, vector and process a story."""
+    db = connect_to_db()
+    _extract_and_vector(db=db, stories_id=stories_id, use_cache=use_cache, use_existing=use_existing)
+
+
+def run_extract_and_vector_batch(jobs: List[BatchJob]) -> List[Any]:
+    """Extract, vector and process a batch of stories using a single database connection."""
+
+    db = connect_to_db()
+
+    results = []
+    for job in jobs:
+        try:
+            _extract_and_vector(db, *job.args(), **job.kwargs())
+
+        except Exception as ex:
+            # Don't let a failed story's transaction affect the rest of the batch
+            if db.in_transaction():
+                db.rollback()
+            results.append(ex)
+
+        else:
+            results.append(None)
+
+    db.disconnect()
+
+    return results
+
+
 if __name__ == '__main__':
     app = JobBroker(queue_name=QUEUE_NAME)
-    app.start_worker(handler=run_extract_and_vector)
+
+    batch_size = ExtractAndVectorConfig.batch_size()
+    if batch_size:
+        app.start_batch_worker(handler=run_extract_and_vector_batch, batch_size=batch_size)
+    else:
+        app.start_worker(handler=run_extract_and_vector)
@@ -0,0 +1,13 @@
+from mediawords.util.config import env_value
+
+
+class ExtractAndVectorConfig(object):
+    """Extract and vector configuration."""
+
+    @staticmethod
+    def batch_size() -> int:
+        """Number of stories to extract using a single database connection; 0 if batch mode is disabled."""
+        value = env_value('MC_EXTRACT_AND_VECTOR_BATCH_SIZE', required=False, allow_empty_string=True)
+        if not value:
+            return 0
+        return max(int(value), 0)
@@ -1,10 +1,10 @@
 import re
-from typing import List, Dict
+from typing import Any, Dict, List, Tuple
 
 from mediawords.db import DatabaseHandler
 from mediawords.dbi.stories.ap import is_syndicated
 from mediawords.languages.factory import LanguageFactory
-from mediawords.util.identify_language import language_code_for_text, identification_would_be_reliable
+from mediawords.util.identify_language import language_code_for_text, language_codes_for_sentences
 from mediawords.util.log import create_logger
 from mediawords.util.perl import decode_object_from_bytes_if_needed
 
@@ -41,34 +41,31 @@ def medium_is_locked(db: DatabaseHandler, media_id: int) -> bool:
     return not got_lock
 
 
-def _get_db_escaped_story_sentence_dicts(
-        db: DatabaseHandler,
-        story: dict,
-        sentences: List[str],
-) -> List[Dict[str, str]]:
-    """Given a list of text sentences, return a list of sentences with properly escaped values for insertion."""
+def _get_story_sentence_dicts(story: dict, sentences: List[str]) -> List[Dict[str, Any]]:
+    """Given a list of text sentences, return a list of sentences with their language identified for insertion."""
     story = decode_object_from_bytes_if_needed(story)
     sentences = decode_object_from_bytes_if_needed(sentences)
 
     sentence_dicts = []
 
+    # Identify the language of each of the sentences
+    sentence_languages = language_codes_for_sentences(sentences=sentences, story_language_code=story['language'])
+
     sentence_num = 0
-    for sentence in sentences:
+    for sentence, (sentence_lang, identification_is_reliable) in zip(sentences, sentence_languages):
 
-        # Identify the language of each of the sentences
-        sentence_lang = language_code_for_text(sentence)
         if (sentence_lang or '') != (story['language'] or ''):
             # Mark the language as unknown if the results for the sentence are not reliable
-            if not identification_would_be_reliable(text=sentence):
+            if not identification_is_reliable:
                 sentence_lang = ''
 
         sentence_dicts.append({
-            'sentence': db.quote_varchar(sentence),
-            'language': db.quote_varchar(sentence_lang),
-            'sentence_number': str(sentence_num),
-            'stories_id': str(story['stories_id']),
-            'media_id': str(story['media_id']),
-            'publish_date': db.quote_timestamp(story['publish_date']),
+            'sentence': sentence,
+            'language': sentence_lang,
+            'sentence_number': sentence_num,
+            'stories_id': story['stories_id'],
+            'media_id': story['media_id'],
+            'publish_date': story['publish_date'],
         })
 
         sentence_num += 1
@@ -76,6 +73,13 @@ def _get_db_escaped_story_sentence_dicts(
     return sentence_dicts
 
 
+def _copy_text_value(value: Any) -> str:
+    """Return value escaped for COPY FROM in text format."""
+    if value is None:
+        return '\\N'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
 def _get_unique_sentences_in_story(sentences: List[str]) -> List[str]:
     """Get unique sentences from the list, maintaining the original order."""
     sentences = decode_object_from_bytes_if_needed(sentences)
@@ -105,36 +109,111 @@ def _insert_story_sentences(
 
     story = decode_object_from_bytes_if_needed(story)
     sentences = decode_object_from_bytes_if_needed(sentences)
+
+    return _insert_stories_sentences(
+        db=db,
+        stories_sentences=[(story, sentences)],
+        no_dedup_sentences=no_dedup_sentences,
+    )[0]
+
+
+def _insert_stories_sentences(
+        db: DatabaseHandler,
+        stories_sentences: List[Tuple[dict, List[str]]],
+        no_dedup_sentences: bool = False,
+) -> List[List[str]]:
+    """Insert sentences of one or more stories from the same medium into story_sentences, optionally skipping duplicate
+    sentences by setting is_dup = 't' to the found duplicates that are already in the table.
+
+    Sentences get streamed to a temporary table with COPY first, and only then the medium gets locked for as long as it
+    takes to deduplicate and insert them. Stories get deduplicated in order, so a sentence repeated in a later story
+    gets deduplicated against the earlier one.
+
+    Returns list of sentences that were inserted into the table for every story.
+    """
+
+    stories_sentences = decode_object_from_bytes_if_needed(stories_sentences)
     if isinstance(no_dedup_sentences, bytes):
         no_dedup_sentences = decode_object_from_bytes_if_needed(no_dedup_sentences)
     no_dedup_sentences = bool(int(no_dedup_sentences))
 
-    stories_id = story['stories_id']
-    media_id = story['media_id']
+    if not stories_sentences:
+        return []
 
-    # Story's publish date is the same for all the sentences, so we might as well pass it as a constant
-    escaped_story_publish_date = db.quote_date(story['publish_date'])
+    media_ids = set(story['media_id'] for story, _ in stories_sentences)
+    if len(media_ids) != 1:
+        raise McUpdateStorySentencesAndLanguageException(
+            "Stories to insert sentences for are expected to be from a single medium; got media IDs: {}".format(
+                sorted(media_ids)
+            )
+        )
+    media_id = media_ids.pop()
 
-    if len(sentences) == 0:
-        log.warning("Story sentences are empty for story {}.".format(stories_id))
-        return []
+    inserted_sentences = [[] for _ in stories_sentences]
 
-    if no_dedup_sentences:
-        log.debug("Won't de-duplicate sentences for story {} because 'no_dedup_sentences' is set.".format(stories_id))
+    # Story indexes and stories with sentences to insert
+    stories_to_insert = []
+
+    for story_index, (story, sentences) in enumerate(stories_sentences):
+        stories_id = story['stories_id']
 
+        if len(sentences) == 0:
+            log.warning("Story sentences are empty for story {}.".format(stories_id))
+            continue
+
+        if no_dedup_sentences:
+            log.debug("Won't de-duplicate sentences for story {} because 'no_dedup_sentences' is set.".format(
+                stories_id
+            ))
+        else:
+            # Limit to unique sentences within a story
+            sentences = _get_unique_sentences_in_story(sentences)
+
+        stories_to_insert.append((story_index, story, sentences,))
+
+    if not stories_to_insert:
+        return inserted_sentences
+
+    # Temporary table lives until the end of the session and gets reused by subsequent calls
+    db.query("""
+        CREATE TEMPORARY TABLE IF NOT EXISTS new_story_sentences (
+            stories_id          BIGINT      NOT NULL,
+            media_id            BIGINT      NOT NULL,
+            publish_date        TIMESTAMP   NOT NULL,
+            sentence_number     INT         NOT NULL,
+            sentence            TEXT        NOT NULL,
+            language            VARCHAR(3)  NULL
+        )
+    """)
+    db.query("TRUNCATE new_story_sentences")
+
+    # Identify languages and stream sentences to the database before locking the medium
+    with db.copy_from("""
+        COPY new_story_sentences (stories_id, media_id, publish_date, sentence_number, sentence, language)
+        FROM STDIN
+    """) as copy:
+        for _, story, sentences in stories_to_insert:
+            for sentence_dict in _get_story_sentence_dicts(story=story, sentences=sentences):
+                copy.put_line("\t".join(_copy_text_value(sentence_dict[column]) for column in [
+                    'stories_id',
+                    'media_id',
+                    'publish_date',
+                    'sentence_number',
+                    'sentence',
+                    'language',
+                ]))
+
+    if no_dedup_sentences:
         dedup_sentences_statement = """
 
             -- Nothing to deduplicate, return empty list
-            SELECT NULL
+            SELECT NULL AS sentence
             WHERE 1 = 0
 
         """
 
     else:
 
-        # Limit to unique sentences within a story
-        sentences = _get_unique_sentences_in_story(sentences)
-
         # Set is_dup = 't' to sentences already in the table, return those to be later skipped on INSERT of new
         # sentences
         dedup_sentences_statement = """
@@ -144,34 +223,21 @@ def _insert_story_sentences(
             SET is_dup = 't'
             FROM new_sentences
             WHERE half_md5(story_sentences.sentence) = half_md5(new_sentences.sentence)
-              AND week_start_date(story_sentences.publish_date::date) = week_start_date({})
+              AND week_start_date(story_sentences.publish_date::date)
+                = week_start_date(new_sentences.publish_date::date)
               AND story_sentences.media_id = new_sentences.media_id
             RETURNING story_sentences.sentence
 
-        """.format(escaped_story_publish_date)
-
-    # Convert to list of dicts (values escaped for insertion into database)
-    sentence_dicts = _get_db_escaped_story_sentence_dicts(db=db, story=story, sentences=sentences)
-
-    # Ordered list of columns
-    story_sentences_columns = sorted(sentence_dicts[0].keys())
-    str_story_sentences_columns = ', '.join(story_sentences_columns)
-
-    # List of sentences (in predefined column order)
-    new_sentences_sql = []
-    for sentence_dict in sentence_dicts:
-        new_sentence_sql = []
-        for column in story_sentences_columns:
-            new_sentence_sql.append(sentence_dict[column])
-        new_sentences_sql.append('({})'.format(', '.join(new_sentence_sql)))
-    str_new_sentences_sql = "\n{}".format(",\n".join(new_sentences_sql))
+        """
 
     sql = """
 
         -- noinspection SqlType,SqlResolve
-        WITH new_sentences ({str_story_sentences_columns}) AS (VALUES
-            -- New sentences to potentially insert
-            {str_new_sentences_sql}
+        WITH new_sentences AS (
+            -- New sentences of a single story to potentially insert
+            SELECT *
+            FROM new_story_sentences
+            WHERE stories_id = %(stories_id)s
         ),
         duplicate_sentences AS (
             -- Either a list of duplicate sentences already found in the table or an empty list if deduplication is
@@ -181,43 +247,43 @@ def _insert_story_sentences(
             -- if you are reextracting a story, DELETE its sentences from "story_sentences" before running this query.
             {dedup_sentences_statement}
         )
-        INSERT INTO story_sentences ({str_story_sentences_columns})
-        SELECT {str_story_sentences_columns}
+        INSERT INTO story_sentences (stories_id, media_id, publish_date, sentence_number, sentence, language)
+        SELECT stories_id, media_id, publish_date, sentence_number, sentence, language
         FROM new_sentences
         WHERE sentence NOT IN (
             -- Skip the ones for which we've just set is_dup = 't'
             SELECT sentence
             FROM duplicate_sentences
         )
+        ORDER BY sentence_number
         RETURNING story_sentences.sentence
 
-    """.format(
-        str_story_sentences_columns=str_story_sentences_columns,
-        str_new_sentences_sql=str_new_sentences_sql,
-        dedup_sentences_statement=dedup_sentences_statement,
-    )
+    """.format(dedup_sentences_statement=dedup_sentences_statement)
 
     log.debug("Adding advisory lock on media ID {}...".format(media_id))
     db.query("SELECT pg_advisory_lock(%(media_id)s)", {'media_id': media_id})
 
-    log.debug("Running sentence insertion + deduplication query:\n{}".format(sql))
-
     # Insert sentences
-    inserted_sentences = db.query(sql).flat()
+    for story_index, story, _ in stories_to_insert:
+        log.debug("Running sentence insertion + deduplication query for story {}...".format(story['stories_id']))
+        inserted_sentences[story_index] = db.query(sql, {'stories_id': story['stories_id']}).flat()
 
     log.debug("Removing advisory lock on media ID {}...".format(media_id))
     db.query("SELECT pg_advisory_unlock(%(media_id)s)", {'media_id': media_id})
 
-    db.query("""
-        UPDATE media_stats
-        SET num_sentences = num_sentences + %(inserted_sentence_count)s
-        WHERE media_id = %(media_id)s
-          AND stat_date = %(publish_date)s::date
-    """, {
-        'inserted_sentence_count': len(inserted_sentences),
-        'media_id': media_id,
-        'publish_date': story['publish_date'],
-    })
+    db.query("TRUNCATE new_story_sentences")
+
+    for story_index, story, _ in stories_to_insert:
+        db.query("""
+            UPDATE media_stats
+            SET num_sentences = num_sentences + %(inserted_sentence_count)s
+            WHERE media_id = %(media_id)s
+              AND stat_date = %(publish_date)s::date
+        """, {
+            'inserted_sentence_count': len(inserted_sentences[story_index]),
+            'media_id': media_id,
+            'publish_date': story['publish_date'],
+        })
 
     return inserted_sentences
 
@@ -320,6 +386,8 @@ def update_story_sentences_and_language(db: DatabaseHandler,
 
     story = decode_object_from_bytes_if_needed(story)
 
+    story = story.copy()  # To be able to safely modify it
+
     use_transaction = not db.in_transaction()
 
     if use_transaction:
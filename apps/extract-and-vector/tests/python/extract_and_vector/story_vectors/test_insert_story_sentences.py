@@ -1,6 +1,12 @@
+import pytest
+
 # noinspection PyProtectedMember
-from extract_and_vector.story_vectors import _insert_story_sentences
-from mediawords.test.db.create import create_test_story
+from extract_and_vector.story_vectors import (
+    McUpdateStorySentencesAndLanguageException,
+    _insert_story_sentences,
+    _insert_stories_sentences,
+)
+from mediawords.test.db.create import create_test_medium, create_test_feed, create_test_story
 from .setup_test_story_vectors import TestStoryVectors
 
 
@@ -87,3 +93,45 @@ class TestInsertStorySentences(TestStoryVectors):
 
         # Two sentences with no_dedup_sentences=False, plus three sentences with no_dedup_sentences=True
         assert len(db_sentences) == 5
+
+    def test_insert_stories_sentences(self):
+        test_story_2 = create_test_story(self.db, label='test story 2', feed=self.test_feed)
+
+        sentences = [
+            # Characters that have to be escaped for COPY
+            "Tab\there, backslash \\N there.",
+            "Line\nbreak.",
+        ]
+
+        inserted_sentences = _insert_stories_sentences(
+            db=self.db,
+            stories_sentences=[
+                (self.test_story, sentences),
+                (test_story_2, []),
+
+                # Duplicates of the first story's sentences within the same batch
+                (test_story_2, sentences + ['Something else.']),
+            ],
+        )
+
+        assert inserted_sentences == [sentences, [], ['Something else.']]
+
+        db_sentences = self.db.query("""
+            SELECT sentence, is_dup
+            FROM story_sentences
+            WHERE stories_id = %(stories_id)s
+            ORDER BY sentence_number
+        """, {'stories_id': self.test_story['stories_id']}).hashes()
+        assert [s['sentence'] for s in db_sentences] == sentences
+        assert [s['is_dup'] for s in db_sentences] == [True, True]
+
+        other_medium = create_test_medium(self.db, 'other medium')
+        other_feed = create_test_feed(self.db, 'other feed', other_medium)
+        other_story = create_test_story(self.db, label='other story', feed=other_feed)
+
+        # Stories have to be from the same medium
+        with pytest.raises(McUpdateStorySentencesAndLanguageException):
+            _insert_stories_sentences(
+                db=self.db,
+                stories_sentences=[(self.test_story, sentences), (other_story, sentences)],
+            )
@@ -1,6 +1,7 @@
 """Dealing with url domains within topics."""
 
 import re
+from typing import List
 
 from mediawords.db.handler import DatabaseHandler
 from mediawords.util.log import create_logger
@@ -63,6 +64,73 @@ def increment_domain_links(db: DatabaseHandler, topic_link: dict) -> None:
         )
 
 
+def increment_domain_links_for_topic_links(db: DatabaseHandler, topic_links: List[dict]) -> None:
+    """Same as increment_domain_links() but for multiple topic links at once.
+
+    Increments get summed up per domain, so there's a single upsert for every domain instead of one per link.
+    """
+    if not topic_links:
+        return
+
+    # Story ID -> story's domain
+    story_domains = {}
+
+    # (Topic ID, domain) -> self links to add
+    domain_increments = {}
+
+    for topic_link in topic_links:
+        stories_id = topic_link['stories_id']
+        if stories_id not in story_domains:
+            story = db.require_by_id('stories', stories_id)
+            story_domains[stories_id] = get_url_distinctive_domain(story['url'])
+        story_domain = story_domains[stories_id]
+
+        url_domain = get_url_distinctive_domain(topic_link['url'])
+
+        redirect_url = topic_link.get('redirect_url', topic_link['url'])
+        redirect_url_domain = get_url_distinctive_domain(redirect_url)
+
+        if story_domain not in (url_domain, redirect_url_domain):
+            continue
+
+        key = (topic_link['topics_id'], redirect_url_domain)
+        domain_increments[key] = domain_increments.get(key, 0) + 1
+
+    for (topics_id, domain), increment in domain_increments.items():
+
+        topic_domain = db.query(
+            """
+            insert into topic_domains (topics_id, domain, self_links)
+                values(%(topics_id)s, %(domain)s, %(increment)s)
+                on conflict (topics_id, md5(domain))
+                    do nothing
+                returning *
+            """,
+            {
+                'topics_id': topics_id,
+                'domain': domain,
+                'increment': increment,
+            }
+        ).hash()
+
+        # do this update separately instead of as an upsert because the upsert was occasionally deadlocking
+        if not topic_domain:
+            db.query(
+                """
+                update topic_domains set
+                        self_links = topic_domains.self_links + %(increment)s
+                    where
+                        topics_id = %(topics_id)s and
+                        domain = %(domain)s
+                """,
+                {
+                    'topics_id': topics_id,
+                    'domain': domain,
+                    'increment': increment,
+                }
+            )
+
+
 def skip_self_linked_domain_url(db: DatabaseHandler, topics_id: int, source_url: str, ref_url: str) -> bool:
     """Return true if the url should be skipped because it is a self linked domain within the topic.
 
@@ -90,6 +158,50 @@ def skip_self_linked_domain_url(db: DatabaseHandler, topics_id: int, source_url:
     return False
 
 
+def skip_self_linked_domain_urls(db: DatabaseHandler,
+                                 topics_id: int,
+                                 source_url: str,
+                                 ref_urls: List[str]) -> List[bool]:
+    """Same as skip_self_linked_domain_url() but for multiple urls linked from the same source url at once.
+
+    Return a list of booleans, one for every url in ref_urls, true if the url should be skipped.  Self links that don't
+    get skipped are assumed to get added (and counted in topic_domains.self_links) in order, so once their count
+    reaches MAX_SELF_LINKS, the remaining self links get skipped too.
+    """
+    source_domain = get_url_distinctive_domain(source_url)
+
+    skip = []
+
+    # Self links of the domain, fetched only once there's a self link
+    self_links = None
+
+    for ref_url in ref_urls:
+        ref_domain = get_url_distinctive_domain(ref_url)
+
+        if source_domain != ref_domain:
+            skip.append(False)
+            continue
+
+        if re.search(SKIP_SELF_LINK_RE, ref_url, flags=re.I):
+            skip.append(True)
+            continue
+
+        if self_links is None:
+            topic_domain = db.query(
+                "select * from topic_domains where topics_id = %(a)s and md5(domain) = md5(%(b)s)",
+                {'a': topics_id, 'b': ref_domain}).hash()
+            self_links = topic_domain['self_links'] if topic_domain else 0
+
+        if self_links >= MAX_SELF_LINKS:
+            skip.append(True)
+            continue
+
+        self_links += 1
+        skip.append(False)
+
+    return skip
+
+
 def skip_self_linked_domain(db: DatabaseHandler, topic_fetch_url: dict) -> bool:
     """Given a topic_fetch_url, return true if the url should be skipped because it is a self linked domain.
 
@@ -1,9 +1,46 @@
+from functools import lru_cache
+from typing import List, Optional, Union
+
 import re2
 
 from mediawords.db import DatabaseHandler
 from mediawords.db.exceptions.handler import McUpdateByIDException
 
 
+# Flags that topic patterns get compiled with
+__TOPIC_PATTERN_FLAGS = re2.I | re2.X | re2.S
+
+# Max. number of compiled topic patterns to keep around in a single process
+__COMPILED_TOPIC_PATTERN_CACHE_SIZE = 1024
+
+# Only check the first megabyte of the content
+__MAX_CONTENT_LENGTH = 1024 * 1024
+
+
+@lru_cache(maxsize=__COMPILED_TOPIC_PATTERN_CACHE_SIZE)
+def _compiled_topic_pattern(topics_id: Optional[int], pattern: str):
+    """Return compiled topic pattern.
+
+    Cache is keyed by both the topic ID and the pattern so that an updated topic pattern gets recompiled.
+    """
+    return re2.compile(pattern, __TOPIC_PATTERN_FLAGS)
+
+
+def _prepare_content(content: Optional[Union[str, bytes]]) -> Optional[str]:
+    if content is None:
+        return None
+
+    content = content[0:__MAX_CONTENT_LENGTH]
+
+    # for some reason I can't reproduce in dev, in production a small number of fields come from
+    # the database into the stories fields or the text value produced in the query below in _story_matches_topic
+    # as bytes objects, which re2.search chokes on
+    if isinstance(content, bytes):
+        content = content.decode('utf8', 'backslashreplace')
+
+    return content
+
+
 def content_matches_topic(content: str, topic: dict, assume_match: bool = False) -> bool:
     """Test whether the content matches the topic['pattern'] regex.
 
@@ -21,22 +58,40 @@ def content_matches_topic(content: str, topic: dict, assume_match: bool = False)
     if assume_match:
         return True
 
+    content = _prepare_content(content)
     if content is None:
         return False
 
-    content = content[0:1024 * 1024]
-
-    # for some reason I can't reproduce in dev, in production a small number of fields come from
-    # the database into the stories fields or the text value produced in the query below in _story_matches_topic
-    # as bytes objects, which re2.search chokes on
-    if isinstance(content, bytes):
-        content = content.decode('utf8', 'backslashreplace')
+    pattern = _compiled_topic_pattern(topic.get('topics_id', None), topic['pattern'])
 
-    r = re2.search(topic['pattern'], content, re2.I | re2.X | re2.S) is not None
+    r = pattern.search(content) is not None
 
     return r
 
 
+def matches_topic_many(contents: List[Optional[str]], topic: dict) -> List[bool]:
+    """Test whether each of the contents matches the topic['pattern'] regex.
+
+    Same as calling content_matches_topic() on every content, with the topic pattern looked up only once.
+
+    Arguments:
+    contents - list of text contents
+    topic - topic dict from db
+
+    Return:
+    list of booleans, True for every content that matches the topic pattern
+
+    """
+    pattern = _compiled_topic_pattern(topic.get('topics_id', None), topic['pattern'])
+
+    matches = []
+    for content in contents:
+        content = _prepare_content(content)
+        matches.append(content is not None and pattern.search(content) is not None)
+
+    return matches
+
+
 def try_update_topic_link_ref_stories_id(db: DatabaseHandler, topic_fetch_url: dict) -> None:
     """Update the given topic link to point to the given ref_stories_id.
 
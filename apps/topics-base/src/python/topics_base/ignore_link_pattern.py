@@ -1,3 +1,5 @@
+import re
+
 # ignore any list that match the below patterns.  the sites below are most social sharing button links of
 # various kinds, along with some content spam sites and a couple of sites that confuse the spider with too
 # many domain alternatives.
@@ -11,3 +13,7 @@ IGNORE_LINK_PATTERN = (
     r'(?:atomz.com)|(?:unionpedia.org)|(?:http://politicalgraveyard.com)|(?:https?://api\.[^\/]+)|'
     r'(?:www.rumormillnews.com)|(?:tvtropes.org/pmwiki)|(?:twitter.com/account/suspended)|'
     r'(?:feedsportal.com)')
+
+
+# Compiled (case insensitive) IGNORE_LINK_PATTERN
+IGNORE_LINK_REGEX = re.compile(IGNORE_LINK_PATTERN, flags=re.I)
@@ -0,0 +1,38 @@
+from .setup_test_domains import TestTMDomainsDB
+from mediawords.util.url import get_url_distinctive_domain
+from topics_base.domains import increment_domain_links_for_topic_links
+
+
+class TestIncrementDomainLinksForTopicLinks(TestTMDomainsDB):
+    """Run tests that require database access."""
+
+    def test_increment_domain_links_for_topic_links(self) -> None:
+        """Test increment_domain_links_for_topic_links()."""
+
+        nomatch_domain = 'no.match'
+        story_domain = get_url_distinctive_domain(self.story['url'])
+
+        topic_links = []
+        for url, redirect_url in [
+            (story_domain, nomatch_domain),
+            (story_domain, nomatch_domain),
+            (nomatch_domain, story_domain),
+            (nomatch_domain, nomatch_domain),
+        ]:
+            topic_links.append(self.db.create('topic_links', {
+                'topics_id': self.topic['topics_id'],
+                'stories_id': self.story['stories_id'],
+                'url': url,
+                'redirect_url': redirect_url,
+            }))
+
+        increment_domain_links_for_topic_links(self.db, topic_links)
+
+        assert self.get_topic_domain(self.topic, nomatch_domain)['self_links'] == 2
+        assert self.get_topic_domain(self.topic, story_domain)['self_links'] == 1
+
+        # Second batch should add up to existing counts
+        increment_domain_links_for_topic_links(self.db, topic_links)
+
+        assert self.get_topic_domain(self.topic, nomatch_domain)['self_links'] == 4
+        assert self.get_topic_domain(self.topic, story_domain)['self_links'] == 2
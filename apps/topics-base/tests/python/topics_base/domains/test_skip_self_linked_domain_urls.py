@@ -0,0 +1,37 @@
+from mediawords.util.url import get_url_distinctive_domain
+from .setup_test_domains import TestTMDomainsDB
+from topics_base.domains import skip_self_linked_domain_urls, MAX_SELF_LINKS
+
+
+class TestSkipSelfLinkedDomainURLs(TestTMDomainsDB):
+    """Run tests that require database access."""
+
+    def test_skip_self_linked_domain_urls(self) -> None:
+        """Test skip_self_linked_domain_urls()."""
+
+        story_domain = get_url_distinctive_domain(self.story['url'])
+
+        assert skip_self_linked_domain_urls(self.db, self.topic['topics_id'], self.story['url'], []) == []
+
+        other_url = 'http://other.domain/foo/bar'
+        search_url = 'http://%s/search' % story_domain
+        self_urls = ['http://%s/foo/bar%d' % (story_domain, i) for i in range(MAX_SELF_LINKS + 5)]
+
+        skip = skip_self_linked_domain_urls(
+            self.db,
+            self.topic['topics_id'],
+            self.story['url'],
+            [other_url, search_url] + self_urls,
+        )
+
+        assert skip == [False, True] + [False] * MAX_SELF_LINKS + [True] * 5
+
+        # Self links already counted in topic_domains should be taken into account
+        self.db.create('topic_domains', {
+            'topics_id': self.topic['topics_id'],
+            'domain': story_domain,
+            'self_links': MAX_SELF_LINKS - 1,
+        })
+
+        skip = skip_self_linked_domain_urls(self.db, self.topic['topics_id'], self.story['url'], self_urls[:3])
+        assert skip == [False, True, True]
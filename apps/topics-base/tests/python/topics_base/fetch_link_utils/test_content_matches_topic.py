@@ -1,4 +1,4 @@
-from topics_base.fetch_link_utils import content_matches_topic
+from topics_base.fetch_link_utils import content_matches_topic, matches_topic_many
 
 
 def test_content_matches_topic():
@@ -8,3 +8,14 @@ def test_content_matches_topic():
     assert content_matches_topic('FOO', {'topics_id': 1, 'pattern': ' foo '})
     assert not content_matches_topic('foo', {'topics_id': 1, 'pattern': 'bar'})
     assert content_matches_topic('foo', {'topics_id': 1, 'pattern': 'bar'}, assume_match=True)
+
+
+def test_matches_topic_many():
+    """Test matches_topic_many()."""
+    topic = {'topics_id': 1, 'pattern': ' foo '}
+    assert matches_topic_many([], topic) == []
+    assert matches_topic_many(['foo', 'bar', None, 'xFOOx', b'foo'], topic) == [True, False, False, True, True]
+
+    # Updated pattern of the same topic should get used
+    topic = {'topics_id': 1, 'pattern': 'bar'}
+    assert matches_topic_many(['foo', 'bar'], topic) == [False, True]
@@ -4,7 +4,7 @@ import re
 import traceback
 from typing import List
 
-from bs4 import BeautifulSoup
+from lxml import etree
 
 from mediawords.db import DatabaseHandler
 from mediawords.dbi.downloads.store import fetch_content
@@ -12,12 +12,68 @@ from mediawords.key_value_store.amazon_s3 import McAmazonS3StoreException
 from mediawords.util.extract_article_from_page import extract_article_html_from_page_html
 from mediawords.util.log import create_logger
 from mediawords.util.url import is_http_url, normalize_url_lossy
-from topics_base.domains import skip_self_linked_domain_url, increment_domain_links
-from topics_base.ignore_link_pattern import IGNORE_LINK_PATTERN
+from topics_base.domains import skip_self_linked_domain_urls, increment_domain_links_for_topic_links
+from topics_base.ignore_link_pattern import IGNORE_LINK_REGEX
 
 log = create_logger(__name__)
 
 
+class _LinkCollector(object):
+    """lxml parser target that collects href= attributes of all tags and src= attributes of iframes in a single pass."""
+
+    __slots__ = [
+        'hrefs',
+        'iframe_srcs',
+    ]
+
+    def __init__(self):
+        self.hrefs = []
+        self.iframe_srcs = []
+
+    def start(self, tag: str, attrib: dict) -> None:
+        href = attrib.get('href', None)
+        if href is not None:
+            self.hrefs.append(href)
+
+        if tag == 'iframe':
+            src = attrib.get('src', None)
+            if src is not None:
+                self.iframe_srcs.append(src)
+
+    def end(self, tag: str) -> None:
+        pass
+
+    def data(self, data: str) -> None:
+        pass
+
+    def comment(self, text: str) -> None:
+        pass
+
+    def close(self) -> '_LinkCollector':
+        return self
+
+
+def _collect_links(html: str) -> _LinkCollector:
+    """Parse html without building a tree, return href= and iframe src= attributes found in it."""
+    collector = _LinkCollector()
+
+    if not html:
+        return collector
+
+    parser = etree.HTMLParser(target=collector)
+    try:
+        parser.feed(html)
+        parser.close()
+    except etree.LxmlError as ex:
+        # Return whatever got collected before the parser gave up
+        log.warning("Unable to parse HTML: %s" % str(ex))
+
+    return collector
+
+
+_NYTIMES_WWW_REGEX = re.compile(r'(https)?://www[a-z0-9]+.nytimes', flags=re.I)
+
+
 def _get_links_from_html(html: str) -> List[str]:
     """Return a list of all links that appear in the html.
 
@@ -31,21 +87,38 @@ def _get_links_from_html(html: str) -> List[str]:
     list of string urls
 
     """
-    soup = BeautifulSoup(html, 'lxml')
-
     links = []
 
     # get everything with an href= element rather than just <a /> links
-    for tag in soup.find_all(href=True):
-        url = tag['href']
+    for url in _collect_links(html).hrefs:
 
-        if re.search(IGNORE_LINK_PATTERN, url, flags=re.I) is not None:
+        if IGNORE_LINK_REGEX.search(url) is not None:
             continue
 
         if not is_http_url(url):
             continue
 
-        url = re.sub(r'(https)?://www[a-z0-9]+.nytimes', r'\1://www.nytimes', url, flags=re.I)
+        url = _NYTIMES_WWW_REGEX.sub(r'\1://www.nytimes', url)
+
+        links.append(url)
+
+    return links
+
+
+def _get_youtube_embed_links_from_html(html: str) -> List[str]:
+    """Return every iframe src= attribute that includes the string 'youtube' in the html."""
+    links = []
+    for url in _collect_links(html).iframe_srcs:
+
+        if 'youtube' not in url:
+            continue
+
+        if not url.lower().startswith('http'):
+            url = 'http:' + url
+
+        url = url.strip()
+
+        url = url.replace('youtube-embed', 'youtube')
 
         links.append(url)
 
@@ -73,34 +146,11 @@ def _get_youtube_embed_links(db: DatabaseHandler, story: dict) -> List[str]:
 
     html = fetch_content(db, download)
 
-    soup = BeautifulSoup(html, 'lxml')
+    return _get_youtube_embed_links_from_html(html)
 
-    links = []
-    for tag in soup.find_all('iframe', src=True):
-        url = tag['src']
 
-        if 'youtube' not in url:
-            continue
-
-        if not url.lower().startswith('http'):
-            url = 'http:' + url
-
-        url = url.strip()
-
-        url = url.replace('youtube-embed', 'youtube')
-
-        links.append(url)
-
-    return links
-
-
-def _get_extracted_html(db: DatabaseHandler, story: dict) -> str:
-    """Get the extracted html for the story.
-
-    We don't store the extracted html of a story, so we have to get the first download assoicated with the story
-    and run the extractor on it.
-
-    """
+def _get_story_html(db: DatabaseHandler, story: dict) -> str:
+    """Get the raw html of the first successful content download of the story."""
     download = db.query(
         """
         with d as (
@@ -115,8 +165,23 @@ def _get_extracted_html(db: DatabaseHandler, story: dict) -> str:
         """,
         {'a': story['stories_id']}).hash()
 
-    html = fetch_content(db, download)
+    return fetch_content(db, download)
+
+
+def _get_extracted_html(db: DatabaseHandler, story: dict) -> str:
+    """Get the extracted html for the story.
 
+    We don't store the extracted html of a story, so we have to get the first download assoicated with the story
+    and run the extractor on it.
+
+    """
+    html = _get_story_html(db, story)
+
+    return _get_extracted_html_from_html(html)
+
+
+def _get_extracted_html_from_html(html: str) -> str:
+    """Run the extractor on the story's raw html, return the extracted html."""
     extract = extract_article_html_from_page_html(html)
     extracted_html = extract['extracted_html']
 
@@ -174,16 +239,18 @@ def _get_links_from_story(db: DatabaseHandler, story: dict) -> List[str]:
 
     """
     try:
-        extracted_html = _get_extracted_html(db, story)
+        # fetch the raw html once for both the extractor and the youtube embed links
+        html = _get_story_html(db, story)
+        extracted_html = _get_extracted_html_from_html(html)
 
         html_links = _get_links_from_html(extracted_html)
         text_links = _get_links_from_story_text(db, story)
-        youtube_links = _get_youtube_embed_links(db, story)
+        youtube_links = _get_youtube_embed_links_from_html(html)
 
         all_links = html_links + text_links + youtube_links
 
         link_lookup = {}
-        for url in filter(lambda x: re.search(IGNORE_LINK_PATTERN, x, flags=re.I) is None, all_links):
+        for url in filter(lambda x: IGNORE_LINK_REGEX.search(x) is None, all_links):
             link_lookup[normalize_url_lossy(url)] = url
 
         links = list(link_lookup.values())
@@ -232,19 +299,29 @@ def extract_links_for_topic_story(
         log.info("mining %s %s for topic %s .." % (story['title'], story['url'], topic['name']))
         links = _get_links_from_story(db, story)
 
-        for link in links:
-            if skip_self_linked_domain_url(db, topic['topics_id'], story['url'], link):
+        skip_links = skip_self_linked_domain_urls(db, topic['topics_id'], story['url'], links)
+
+        topic_links = []
+        for link, skip_link in zip(links, skip_links):
+            if skip_link:
                 log.debug("skipping self linked domain url...")
                 continue
 
-            topic_link = {
+            topic_links.append({
                 'topics_id': topic['topics_id'],
                 'stories_id': story['stories_id'],
                 'url': link
-            }
+            })
+
+        if topic_links:
+            db.query(
+                """
+                insert into topic_links (topics_id, stories_id, url)
+                    select %(a)s, %(b)s, unnest(%(c)s::text[])
+                """,
+                {'a': topic['topics_id'], 'b': story['stories_id'], 'c': [tl['url'] for tl in topic_links]})
 
-            db.create('topic_links', topic_link)
-            increment_domain_links(db, topic_link)
+            increment_domain_links_for_topic_links(db, topic_links)
 
         link_mine_error = ''
     except Exception as ex:
@@ -0,0 +1,69 @@
+import re
+import time
+from typing import List
+
+from bs4 import BeautifulSoup
+
+from mediawords.util.log import create_logger
+from mediawords.util.url import is_http_url
+from topics_base.ignore_link_pattern import IGNORE_LINK_PATTERN
+# noinspection PyProtectedMember
+from topics_extract_story_links.extract_story_links import _get_links_from_html, _get_youtube_embed_links_from_html
+
+log = create_logger(__name__)
+
+
+def _get_links_from_html_with_beautifulsoup(html: str) -> List[str]:
+    """Previous implementation of _get_links_from_html() + _get_youtube_embed_links() which parsed html twice."""
+    links = []
+
+    for tag in BeautifulSoup(html, 'lxml').find_all(href=True):
+        url = tag['href']
+        if re.search(IGNORE_LINK_PATTERN, url, flags=re.I) is not None:
+            continue
+        if not is_http_url(url):
+            continue
+        url = re.sub(r'(https)?://www[a-z0-9]+.nytimes', r'\1://www.nytimes', url, flags=re.I)
+        links.append(url)
+
+    for tag in BeautifulSoup(html, 'lxml').find_all('iframe', src=True):
+        url = tag['src']
+        if 'youtube' not in url:
+            continue
+        if not url.lower().startswith('http'):
+            url = 'http:' + url
+        links.append(url.strip().replace('youtube-embed', 'youtube'))
+
+    return links
+
+
+def test_get_links_from_html_benchmark():
+    """Report links per second extracted by the lxml parser target vs. BeautifulSoup."""
+
+    filename = '/opt/mediacloud/tests/data/html-strip/strip.html'
+    with open(filename, 'r', encoding='utf8') as fh:
+        html = fh.read()
+
+    html += '<iframe src="//www.youtube.com/embed/1234"></iframe>' * 10
+
+    expected_links = _get_links_from_html_with_beautifulsoup(html)
+    got_links = _get_links_from_html(html) + _get_youtube_embed_links_from_html(html)
+    assert got_links == expected_links
+
+    iterations = 20
+
+    start_time = time.time()
+    for _ in range(iterations):
+        _get_links_from_html_with_beautifulsoup(html)
+    beautifulsoup_time = time.time() - start_time
+
+    start_time = time.time()
+    for _ in range(iterations):
+        _get_links_from_html(html)
+        _get_youtube_embed_links_from_html(html)
+    lxml_time = time.time() - start_time
+
+    links_count = len(expected_links) * iterations
+    log.info("Extracting links: %.0f links/s with BeautifulSoup, %.0f links/s with lxml parser target" % (
+        links_count / beautifulsoup_time, links_count / lxml_time,
+    ))
@@ -63,7 +63,7 @@ def run_topics_fetch_link(topic_fetch_urls_id: int, domain_timeout: Optional[int
         if not fetch_topic_url_update_state(db=db,
                                             topic_fetch_urls_id=topic_fetch_urls_id,
                                             domain_timeout=domain_timeout):
-            JobBroker(queue_name=QUEUE_NAME).add_to_queue(topic_fetch_urls_id=topic_fetch_urls_id)
+            JobBroker(queue_name=QUEUE_NAME).requeue(topic_fetch_urls_id=topic_fetch_urls_id)
 
             _consecutive_requeues += 1
             if _consecutive_requeues > REQUEUES_UNTIL_SLEEP:
@@ -6,7 +6,7 @@ from mediawords.db import DatabaseHandler
 from mediawords.util.log import create_logger
 from mediawords.util.parse_json import encode_json, decode_json
 
-from topics_base.fetch_link_utils import content_matches_topic
+from topics_base.fetch_link_utils import matches_topic_many
 from topics_base.twitter_url import get_tweet_urls
 
 from topics_mine.posts import AbstractPostFetcher
@@ -143,7 +143,8 @@ def _store_posts_for_day(db: DatabaseHandler, topic_post_day: dict, posts: list)
     log.info("adding %d tweets for topic %s, day %s" % (len(posts), topics_id, topic_post_day['day']))
 
     topic = db.require_by_id('topics', topic_post_day['topics_id'])
-    posts = list(filter(lambda p: content_matches_topic(p['content'], topic), posts))
+    matches = matches_topic_many([p['content'] for p in posts], topic)
+    posts = [post for post, match in zip(posts, matches) if match]
 
     log.info("%d tweets remaining after match" % (len(posts)))
 